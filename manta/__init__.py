@@ -5,5 +5,7 @@
 from __future__ import absolute_import
 from .version import __version__
 from .client import MantaClient
+from .jobs import JobManager
 from .auth import PrivateKeySigner, SSHAgentSigner, CLISigner
+from .transport import Httplib2Transport, HTTPTransport
 from .errors import *
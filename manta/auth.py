@@ -7,13 +7,17 @@ import binascii
 import sys
 import io
 import os
+import json
 from os.path import expanduser
 import logging
 import base64
 import hashlib
 from getpass import getpass
 import re
+import socket
 import struct
+import threading
+from collections import deque
 from glob import glob
 
 from cryptography.hazmat.backends import default_backend
@@ -25,6 +29,7 @@ from cryptography.hazmat.primitives.asymmetric.utils import encode_dss_signature
 from paramiko import Agent
 from paramiko.message import Message
 
+from manta import appdirs
 from manta.errors import MantaError
 
 
@@ -56,6 +61,25 @@ ECDSA_ALGO_FROM_KEY_SIZE = {
     "521": ECDSA_SHA512_STR
 }
 
+# ssh-agent protocol message numbers.
+# https://tools.ietf.org/html/draft-miller-ssh-agent-02
+SSH_AGENT_FAILURE = 5
+SSH2_AGENTC_REQUEST_IDENTITIES = 11
+SSH2_AGENT_IDENTITIES_ANSWER = 12
+SSH2_AGENTC_SIGN_REQUEST = 13
+SSH2_AGENT_SIGN_RESPONSE = 14
+
+# Fingerprints of "~/.ssh/*.pub" keys are cached in this file so that
+# finding the key for a fingerprint doesn't mean reading and hashing every
+# public key on each process start. Entries are invalidated by the pub key
+# file's mtime and size. Set to None to disable.
+KEY_INDEX_PATH = os.path.join(
+    appdirs.user_cache_dir("python-manta-%s" % os.geteuid(), "Joyent",
+                           "keys"), "index.json")
+
+_agent_clients = {}  # socket path -> SSHAgentClient, see `get_agent_client`
+_agent_clients_lock = threading.Lock()
+
 
 #---- internal support stuff
 
@@ -118,6 +142,83 @@ def sha256_fingerprint_from_raw_ssh_pub_key(raw_key):
     h = h.rstrip().rstrip('=')  # drop newline and possible base64 padding
     return 'SHA256:' + h
 
+def _load_key_index():
+    """Load the pub key fingerprint index (see `KEY_INDEX_PATH`).
+
+    @returns {dict} mapping pub key path to a dict with: mtime, size,
+        type (the ssh key type), md5 and sha256 fingerprints.
+    """
+    if not KEY_INDEX_PATH:
+        return {}
+    try:
+        with io.open(KEY_INDEX_PATH, 'r') as f:
+            index = json.load(f)
+    except (IOError, OSError, ValueError):
+        return {}
+    if not isinstance(index, dict) or index.get("version") != 1:
+        return {}
+    return index.get("keys", {})
+
+
+def _save_key_index(keys):
+    if not KEY_INDEX_PATH:
+        return
+    content = json.dumps({"version": 1, "keys": keys}, indent=2)
+    tmp_path = "%s.%s.tmp" % (KEY_INDEX_PATH, os.getpid())
+    try:
+        index_dir = os.path.dirname(KEY_INDEX_PATH)
+        if not os.path.exists(index_dir):
+            os.makedirs(index_dir)
+        with io.open(tmp_path, 'wb') as f:
+            f.write(content.encode('utf-8'))
+        os.rename(tmp_path, KEY_INDEX_PATH)
+    except (IOError, OSError):
+        _, ex, _ = sys.exc_info()
+        log.debug("could not save key index '%s': %s", KEY_INDEX_PATH, ex)
+
+
+def _pub_key_index_entry(pub_key_path, index):
+    """Get the index entry for the given pub key file, (re)reading the file
+    if the entry is missing or stale.
+
+    @returns (entry, changed) {2-tuple} `entry` is None if the file cannot
+        be read.
+    """
+    try:
+        st = os.stat(pub_key_path)
+    except OSError:
+        # This can happen if the .pub file is a broken symlink.
+        log.debug("could not stat '%s', skip it", pub_key_path)
+        return None, False
+    entry = index.get(pub_key_path)
+    if (entry and entry.get("mtime") == st.st_mtime and
+            entry.get("size") == st.st_size):
+        return entry, False
+
+    try:
+        f = io.open(pub_key_path, 'r')
+    except IOError:
+        log.debug("could not open '%s', skip it", pub_key_path)
+        return None, False
+    try:
+        pub_key = f.read()
+    finally:
+        f.close()
+    try:
+        entry = {
+            "mtime": st.st_mtime,
+            "size": st.st_size,
+            "type": pub_key.split()[0],
+            "md5": fingerprint_from_ssh_pub_key(pub_key),
+            "sha256": sha256_fingerprint_from_ssh_pub_key(pub_key),
+        }
+    except (IndexError, ValueError, TypeError, binascii.Error):
+        log.debug("could not parse '%s', skip it", pub_key_path)
+        return None, False
+    index[pub_key_path] = entry
+    return entry, True
+
+
 def load_ssh_key(key_id, skip_priv_key=False):
     """
     Load a local ssh private key (in PEM format). PEM format is the OpenSSH
@@ -171,42 +272,45 @@ def load_ssh_key(key_id, skip_priv_key=False):
     fingerprint = key_id
 
     pub_key_glob = expanduser('~/.ssh/*.pub')
-    pub_key = None
-    for pub_key_path in glob(pub_key_glob):
-        try:
-            f = io.open(pub_key_path, 'r')
-        except IOError:
-            # This can happen if the .pub file is a broken symlink.
-            log.debug("could not open '%s', skip it", pub_key_path)
-            continue
-        try:
-            pub_key = f.read()
-        finally:
-            f.close()
+    pub_key_paths = glob(pub_key_glob)
+    index = _load_key_index()
+    index_changed = False
 
+    def matches(entry):
         # The MD5 fingerprint functions return the hexdigest without the hash
         # algorithm prefix ("MD5:"), and the SHA256 functions return the
         # fingerprint with the prefix ("SHA256:").  Ideally we'd want to
         # normalize these, but more importantly we don't want to break backwards
         # compatibility for either the SHA or MD5 users.
-        md5_fp = fingerprint_from_ssh_pub_key(pub_key)
-        sha256_fp = sha256_fingerprint_from_ssh_pub_key(pub_key)
-        if (sha256_fp == fingerprint or
-            md5_fp == fingerprint or
-            "MD5:" + md5_fp == fingerprint):
-
+        return (entry["sha256"] == fingerprint or
+                entry["md5"] == fingerprint or
+                "MD5:" + entry["md5"] == fingerprint)
+
+    # Try keys the index says match first, so that a warm index means
+    # just a `stat` of the matching key.
+    pub_key_paths.sort(key=lambda p: not (p in index and matches(index[p])))
+    for pub_key_path in pub_key_paths:
+        entry, changed = _pub_key_index_entry(pub_key_path, index)
+        index_changed = index_changed or changed
+        if entry and matches(entry):
             # if the user has given us sha256 fingerprint, canonicalize
             # it to the md5 fingerprint
-            fingerprint = md5_fp
+            fingerprint = entry["md5"]
             break
     else:
+        entry = None
+
+    if index_changed or set(index) - set(pub_key_paths):
+        _save_key_index(dict((p, e) for p, e in index.items()
+                             if p in pub_key_paths))
+    if entry is None:
         raise MantaError(
             "no '~/.ssh/*.pub' key found with fingerprint '%s'"
             % fingerprint)
 
     # XXX: pubkey should NOT be in PEM format.
     try:
-        algo = ALGO_FROM_SSH_KEY_TYPE[pub_key.split()[0]]
+        algo = ALGO_FROM_SSH_KEY_TYPE[entry["type"]]
     except KeyError:
         raise MantaError("Unsupported key type for: {}".format(key_id))
 
@@ -309,15 +413,17 @@ def ssh_key_info_from_key_data(key_id, priv_key=None):
     key_info["type"] = "ssh_key"
     return key_info
 
-def agent_key_info_from_key_id(key_id):
+def agent_key_info_from_key_id(key_id, agent=None):
     """Find a matching key in the ssh-agent.
 
     @param key_id {str} Either a private ssh key fingerprint, e.g.
         'b3:f0:a1:6c:18:3b:42:63:fd:6e:57:42:74:17:d4:bc', or the path to
         an ssh private key file (like ssh's IdentityFile config option).
+    @param agent {SSHAgentClient} Optional. The agent to use. Default is
+        the shared client for $SSH_AUTH_SOCK (see `get_agent_client`).
     @return {dict} with these keys:
         - type: "agent"
-        - agent_key: paramiko AgentKey
+        - agent_key: `SSHAgentKey` (or paramiko AgentKey)
         - fingerprint: key fingerprint
         - algorithm: "rsa-sha1"  Currently don't support DSA agent signing.
     """
@@ -330,7 +436,12 @@ def agent_key_info_from_key_id(key_id):
         fingerprint = key_id
 
     # Look for a matching fingerprint in the ssh-agent keys.
-    keys = Agent().get_keys()
+    if agent is None and not hasattr(socket, 'AF_UNIX'):
+        # No Unix sockets (e.g. Pageant on Windows): use paramiko's agent
+        # support.
+        keys = Agent().get_keys()
+    else:
+        keys = (agent or get_agent_client()).list_keys()
 
     for key in keys:
         raw_key = key.blob
@@ -391,9 +502,220 @@ def ssh_key_sign(key_info, message):
     return signed
 
 
+class _AgentConnectionError(Exception):
+    """The connection to the ssh-agent failed (internal)."""
+    pass
+
+
+class _AgentRequest(object):
+    """A request waiting on its response from the ssh-agent."""
+
+    def __init__(self):
+        self.done = False
+        self.response = None
+        self.error = None
+
+    def set(self, response):
+        self.response = response
+        self.done = True
+
+    def fail(self, error):
+        self.error = error
+        self.done = True
+
+
 #---- exports
 
 
+class SSHAgentKey(object):
+    """A key held by an ssh-agent. This quacks like paramiko's `AgentKey`.
+
+    @param agent {SSHAgentClient}
+    @param blob {bytes} The public key blob.
+    @param comment {str}
+    """
+
+    def __init__(self, agent, blob, comment=None):
+        self.agent = agent
+        self.blob = blob
+        self.comment = comment
+        self.name = Message(blob).get_text()
+
+    def asbytes(self):
+        return self.blob
+
+    def get_name(self):
+        return self.name
+
+    def sign_ssh_data(self, data, flags=0):
+        return self.agent.sign(self.blob, data, flags)
+
+
+class SSHAgentClient(object):
+    """An ssh-agent client that keeps a single connection open.
+
+    Requests from concurrent threads are pipelined on that one connection:
+    each request is written as soon as it is made and the agent's
+    responses, which come back in request order, are handed to the waiting
+    callers in turn. If the connection fails, pending requests are retried
+    (once) on a new connection.
+
+    @param socket_path {str} Optional. The agent's Unix socket path.
+        Default is $SSH_AUTH_SOCK. Tests can point this at a fake agent.
+    """
+
+    def __init__(self, socket_path=None):
+        self.socket_path = socket_path
+        self._sock = None
+        self._pending = deque()  # _AgentRequest's in the order sent
+        self._lock = threading.Lock()  # guards writes, _sock and _pending
+        self._read_lock = threading.Lock()  # held while reading a response
+
+    def _connect(self):
+        path = self.socket_path or os.environ.get('SSH_AUTH_SOCK')
+        if not path:
+            raise MantaError("no ssh-agent: SSH_AUTH_SOCK is not set")
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(path)
+        except socket.error:
+            _, ex, _ = sys.exc_info()
+            sock.close()
+            raise MantaError("could not connect to ssh-agent at '%s': %s" %
+                             (path, ex))
+        log.debug("connected to ssh-agent at '%s'", path)
+        return sock
+
+    def _reset(self, sock, error):
+        """Drop the given connection and fail its pending requests. The
+        caller must hold `self._lock`.
+        """
+        if self._sock is not sock:
+            return  # already reset
+        log.debug("ssh-agent connection error: %s", error)
+        self._sock = None
+        try:
+            sock.close()
+        except socket.error:
+            pass
+        while self._pending:
+            self._pending.popleft().fail(error)
+
+    def _recv_exactly(self, sock, n):
+        chunks = []
+        while n:
+            chunk = sock.recv(n)
+            if not chunk:
+                raise _AgentConnectionError("ssh-agent closed the connection")
+            chunks.append(chunk)
+            n -= len(chunk)
+        return b''.join(chunks)
+
+    def _request_once(self, msg):
+        with self._lock:
+            if self._sock is None:
+                self._sock = self._connect()
+            sock = self._sock
+            req = _AgentRequest()
+            try:
+                sock.sendall(struct.pack('>I', len(msg)) + msg)
+            except socket.error:
+                _, ex, _ = sys.exc_info()
+                self._reset(sock, ex)
+                raise _AgentConnectionError(ex)
+            self._pending.append(req)
+
+        # Read responses, in order, until ours has arrived. Only one thread
+        # reads at a time. It hands each response to the oldest request.
+        while not req.done:
+            with self._read_lock:
+                if req.done:
+                    break
+                try:
+                    size = struct.unpack('>I', self._recv_exactly(sock, 4))[0]
+                    response = self._recv_exactly(sock, size)
+                except (socket.error, _AgentConnectionError):
+                    _, ex, _ = sys.exc_info()
+                    with self._lock:
+                        self._reset(sock, ex)
+                    continue
+                with self._lock:
+                    if self._sock is not sock:
+                        # The connection was reset while we read: its
+                        # requests have been failed, and any pending now
+                        # are for a new connection. Drop the response.
+                        continue
+                    oldest = self._pending.popleft()
+                oldest.set(response)
+
+        if req.error is not None:
+            raise _AgentConnectionError(req.error)
+        return req.response
+
+    def request(self, msg):
+        """Send an ssh-agent request message and return the response
+        message (both without the length prefix).
+        """
+        try:
+            return self._request_once(msg)
+        except _AgentConnectionError:
+            _, ex, _ = sys.exc_info()
+            log.debug("retry ssh-agent request on a new connection: %s", ex)
+        try:
+            return self._request_once(msg)
+        except _AgentConnectionError:
+            _, ex, _ = sys.exc_info()
+            raise MantaError("ssh-agent request failed: %s" % ex)
+
+    def list_keys(self):
+        """List the keys held by the agent.
+
+        @returns {list} of `SSHAgentKey`
+        """
+        response = self.request(struct.pack('B',
+                                            SSH2_AGENTC_REQUEST_IDENTITIES))
+        msg = Message(response)
+        if msg.get_byte() != struct.pack('B', SSH2_AGENT_IDENTITIES_ANSWER):
+            raise MantaError("could not list ssh-agent keys")
+        keys = []
+        for i in range(msg.get_int()):
+            blob = msg.get_binary()
+            comment = msg.get_text()
+            keys.append(SSHAgentKey(self, blob, comment))
+        return keys
+
+    def sign(self, blob, data, flags=0):
+        """Sign `data` with the agent key with the given public key blob.
+
+        @returns {bytes} The signature blob (as for paramiko's
+            `AgentKey.sign_ssh_data`).
+        """
+        msg = Message()
+        msg.add_byte(struct.pack('B', SSH2_AGENTC_SIGN_REQUEST))
+        msg.add_string(blob)
+        msg.add_string(data)
+        msg.add_int(flags)
+        response = Message(self.request(msg.asbytes()))
+        if response.get_byte() != struct.pack('B', SSH2_AGENT_SIGN_RESPONSE):
+            raise MantaError("ssh-agent failed to sign")
+        return response.get_binary()
+
+    def close(self):
+        with self._lock:
+            if self._sock is not None:
+                self._reset(self._sock, "closed")
+
+
+def get_agent_client():
+    """Return the shared `SSHAgentClient` for the current $SSH_AUTH_SOCK."""
+    path = os.environ.get('SSH_AUTH_SOCK')
+    with _agent_clients_lock:
+        client = _agent_clients.get(path)
+        if client is None:
+            client = _agent_clients[path] = SSHAgentClient(path)
+    return client
+
+
 class Signer(object):
     """A virtual base class for python-manta request signing."""
 
@@ -407,6 +729,16 @@ class Signer(object):
         """
         raise NotImplementedError("this is a virtual base class")
 
+    def get_algorithm_and_fingerprint(self):
+        """Get the algorithm and fingerprint `sign` will use, without
+        signing anything. This is needed when they are part of the signed
+        string, as for pre-signed URLs.
+
+        @returns (algorithm, key-md5-fingerprint) {2-tuple}
+        """
+        key_info = self._get_key_info()
+        return (key_info["algorithm"], key_info["fingerprint"])
+
 
 class PrivateKeySigner(Signer):
     """Sign Manta requests with the given ssh private key.
@@ -455,17 +787,21 @@ class SSHAgentSigner(Signer):
     @param key_id {str} Either a private ssh key fingerprint, e.g.
         'b3:f0:a1:6c:18:3b:42:63:fd:6e:57:42:74:17:d4:bc', or the path to
         an ssh private key file (like ssh's IdentityFile config option).
+    @param agent {SSHAgentClient} Optional. Default is the shared client
+        for $SSH_AUTH_SOCK, which keeps a single connection to the agent.
     """
 
-    def __init__(self, key_id):
+    def __init__(self, key_id, agent=None):
         self.key_id = key_id
+        self.agent = agent
 
     _key_info_cache = None
 
     def _get_key_info(self):
         """Get key info appropriate for signing."""
         if self._key_info_cache is None:
-            self._key_info_cache = agent_key_info_from_key_id(self.key_id)
+            self._key_info_cache = agent_key_info_from_key_id(self.key_id,
+                                                              self.agent)
         return self._key_info_cache
 
     def sign(self, s):
@@ -492,10 +828,14 @@ class SSHAgentSigner(Signer):
 class CLISigner(Signer):
     """Sign Manta requests using the SSH agent (if available and has the
     required key) or loading keys from "~/.ssh/*".
+
+    @param key_id {str} See `SSHAgentSigner`.
+    @param agent {SSHAgentClient} Optional. See `SSHAgentSigner`.
     """
 
-    def __init__(self, key_id):
+    def __init__(self, key_id, agent=None):
         self.key_id = key_id
+        self.agent = agent
 
     _key_info_cache = None
 
@@ -510,7 +850,7 @@ class CLISigner(Signer):
 
         # First try the agent.
         try:
-            key_info = agent_key_info_from_key_id(self.key_id)
+            key_info = agent_key_info_from_key_id(self.key_id, self.agent)
         except MantaError:
             _, ex, _ = sys.exc_info()
             errors.append(ex)
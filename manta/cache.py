@@ -0,0 +1,118 @@
+# Copyright 2019 Joyent, Inc.  All rights reserved.
+"""A client-side cache of Manta metadata for `MantaClient`."""
+
+from __future__ import absolute_import
+import threading
+import time
+from collections import OrderedDict
+
+#---- globals
+
+# Max total size of the cached values. A directory listing counts as its
+# number of entries plus one, a single dirent as one.
+DEFAULT_MAXSIZE = 100000
+
+# Number of seconds for which a cached value is used.
+DEFAULT_TTL = 30
+
+#---- exports
+
+
+class MetadataCache(object):
+    """A thread-safe, size-bounded LRU cache whose entries expire after a
+    time-to-live. `MantaClient` uses it for directory listings and stats.
+
+    @param maxsize {int} Optional. The max total size of cached values,
+        where each value's size is given to `set`. The least recently used
+        values are evicted to keep within it. Default is `DEFAULT_MAXSIZE`.
+    @param ttl {float} Optional. Number of seconds after which a cached
+        value expires. Default is `DEFAULT_TTL`.
+    """
+
+    def __init__(self, maxsize=None, ttl=None):
+        self.maxsize = maxsize or DEFAULT_MAXSIZE
+        if ttl is None:
+            ttl = DEFAULT_TTL
+        self.ttl = ttl
+        self._items = OrderedDict()  # key -> (expiry, size, value), LRU first
+        self._size = 0
+        self._lock = threading.Lock()
+        self._stats = dict.fromkeys(
+            ["hits", "misses", "expirations", "evictions", "invalidations"], 0)
+
+    def _remove(self, key):
+        """Remove the given key. The caller must hold `self._lock`."""
+        _, size, _ = self._items.pop(key)
+        self._size -= size
+
+    def get(self, key, default=None):
+        """Get the cached value for `key`, or `default` if it isn't cached
+        or has expired.
+        """
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                self._stats["misses"] += 1
+                return default
+            if item[0] < time.time():
+                self._remove(key)
+                self._stats["expirations"] += 1
+                self._stats["misses"] += 1
+                return default
+            # Move to the most recently used end.
+            del self._items[key]
+            self._items[key] = item
+            self._stats["hits"] += 1
+            return item[2]
+
+    def set(self, key, value, size=1):
+        """Cache a value.
+
+        @param size {int} Optional. Default 1. The size the value counts
+            for towards `maxsize`. A value larger than `maxsize` isn't
+            cached.
+        """
+        with self._lock:
+            if key in self._items:
+                self._remove(key)
+            if size > self.maxsize:
+                return
+            self._items[key] = (time.time() + self.ttl, size, value)
+            self._size += size
+            while self._size > self.maxsize:
+                self._remove(next(iter(self._items)))
+                self._stats["evictions"] += 1
+
+    def invalidate(self, key):
+        """Drop the cached value for `key`, if any."""
+        with self._lock:
+            if key in self._items:
+                self._remove(key)
+                self._stats["invalidations"] += 1
+
+    def invalidate_matching(self, match):
+        """Drop the cached values for all keys for which `match(key)` is
+        true.
+        """
+        with self._lock:
+            keys = [k for k in self._items if match(k)]
+            for key in keys:
+                self._remove(key)
+            self._stats["invalidations"] += len(keys)
+
+    def clear(self):
+        """Drop all cached values."""
+        with self._lock:
+            self._items.clear()
+            self._size = 0
+
+    def stats(self):
+        """Return a dict of cache statistics: the number of "hits",
+        "misses", "expirations", "evictions" and "invalidations", plus the
+        current number of "entries" and their total "size".
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._items)
+            stats["size"] = self._size
+        return stats
@@ -6,31 +6,42 @@ import sys
 import logging
 import io
 import os
-from os.path import exists
 from posixpath import join as ujoin, dirname as udirname, basename as ubasename
 import json
-from pprint import pformat
 from operator import itemgetter
 import hashlib
+import mimetypes
 import datetime
 import base64
+import codecs
+import random
+import socket
+import threading
+import time
+from collections import deque
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 
 from . import appdirs
 from .version import __version__
 from . import errors
-
-import httplib2
+from .cache import MetadataCache
+from .transport import CHUNK_SIZE, Httplib2Transport, HTTPTransport, MantaHttp
 
 #---- Python version compat
 
 try:
     # Python 3
+    from http.client import HTTPException
     from urllib.parse import urlencode
     from urllib.parse import quote as urlquote
+    from urllib.parse import urlparse
 except ImportError:
     # Python 2
+    from httplib import HTTPException
     from urllib import urlencode
     from urllib import quote as urlquote
+    from urlparse import urlparse
 
 #---- globals
 
@@ -45,6 +56,49 @@ DEFAULT_HTTP_CACHE_DIR = appdirs.user_cache_dir("python-manta-%s" %
 DEFAULT_USER_AGENT = "python-manta/%s (%s) Python/%s" % (
     __version__, sys.platform, sys.version.split(None, 1)[0])
 
+# Default number of seconds for which a `MantaClient.sign_url` URL is valid.
+DEFAULT_SIGN_URL_EXPIRY = 3600
+
+# Size of the byte ranges fetched by a parallel `MantaClient.get`.
+DEFAULT_PART_SIZE = 16 * 1024 * 1024
+
+# A resumable `MantaClient.get` downloads to "<path>.part", recording the
+# object's etag, MD5 and size in "<path>.part.json".
+PARTIAL_SUFFIX = ".part"
+
+# Default number of concurrent requests for the `MantaClient` methods that
+# work on many paths (e.g. `mkdirs`). This matches the default connection
+# pool size.
+DEFAULT_CONCURRENCY = 10
+
+# Number of times to retry a request that fails with a transient error (see
+# `_is_transient_error`), and the delay in seconds before the first retry.
+# The delay doubles (with some random jitter) for each further retry.
+DEFAULT_RETRIES = 3
+RETRY_DELAY = 0.5
+
+# Number of keys per AddJobInputs request for
+# `MantaClient.add_job_inputs_from`.
+DEFAULT_JOB_INPUT_BATCH_SIZE = 1000
+
+# `MantaClient.wait_for_jobs` checks a job's status after `JOB_POLL_MIN`
+# seconds, then backs off by `JOB_POLL_BACKOFF` times (with some random
+# jitter) up to every `JOB_POLL_MAX` seconds.
+JOB_POLL_MIN = 0.25
+JOB_POLL_MAX = 10
+JOB_POLL_BACKOFF = 1.5
+# The max number of running jobs listed by one ListJobs request when
+# waiting on several jobs. If more are running, each job is checked alone.
+JOB_LIST_LIMIT = 1000
+
+# Max number of, and number of seconds to remember, the directories a
+# `MantaClient` has made or seen, for `mkdir(..., parents=True)`.
+KNOWN_DIRS_SIZE = 10000
+KNOWN_DIRS_TTL = 3600
+
+# Marks a `MantaClient.metadata_cache` miss (None is a cached "not found").
+_MISSING = object()
+
 #---- internal support stuff
 
 
@@ -59,44 +113,255 @@ def http_date(d=None):
     return d.strftime("%a, %d %b %Y %H:%M:%S GMT")
 
 
-def _indent(s, indent='    '):
-    return indent + indent.join(s.splitlines(True))
+def _md5_and_size(f, size=None):
+    """Read the given file-like object (up to `size` bytes, if given) and
+    return its MD5 hash object and the number of bytes read.
+    """
+    md5 = hashlib.md5()
+    n = 0
+    for chunk in _iter_file_chunks(f, size):
+        md5.update(chunk)
+        n += len(chunk)
+    return md5, n
+
+
+def _iter_file_chunks(f, size=None, md5=None):
+    """Generate bytes chunks read from the given file-like object, to EOF or
+    `size` bytes, without holding more than `CHUNK_SIZE` in memory.
+
+    @param size {int} Optional. The number of bytes to read. It is an error
+        if the file is shorter.
+    @param md5 {hashlib.md5 object} Optional. Updated with the chunks as
+        they are read.
+    """
+    remaining = size
+    while remaining is None or remaining > 0:
+        chunk = f.read(CHUNK_SIZE if remaining is None else
+                       min(CHUNK_SIZE, remaining))
+        if not chunk:
+            break
+        if not isinstance(chunk, bytes):
+            chunk = chunk.encode('utf-8')
+        if remaining is not None:
+            remaining -= len(chunk)
+        if md5 is not None:
+            md5.update(chunk)
+        yield chunk
+    if remaining:
+        raise errors.MantaError("file is short by %d bytes of the expected "
+                                "content length (%d bytes)" %
+                                (remaining, size))
+
+
+# Memo of interned JSON keys and (some) values. See `_iter_ndjson`.
+_interned = {}
+_INTERN_VALUES_FOR = frozenset(["type", "durability"])
+
+
+def _interned_dict(pairs):
+    intern = _interned.setdefault
+    d = {}
+    for k, v in pairs:
+        k = intern(k, k)
+        if k in _INTERN_VALUES_FOR:
+            v = intern(v, v)
+        d[k] = v
+    return d
+
+
+_json_decoder = json.JSONDecoder()
+_json_interning_decoder = json.JSONDecoder(object_pairs_hook=_interned_dict)
+
+
+def _iter_lines(chunks):
+    """Generate the non-blank lines of utf-8 text (without line endings),
+    as the bytes chunks arrive (e.g. from a streamed response body).
+
+    @param chunks {iterable} of bytes.
+    """
+    decode = codecs.getincrementaldecoder('utf-8')().decode
+    buf = u''
+    for chunk in chunks:
+        lines = (buf + decode(chunk)).split(u'\n')
+        buf = lines.pop()
+        for line in lines:
+            line = line.rstrip(u'\r')
+            if line.strip():
+                yield line
+    buf += decode(b'', True)
+    if buf.strip():
+        yield buf.rstrip(u'\r')
+
+
+def _iter_ndjson(chunks, what="entry", intern=False):
+    """Generate the objects decoded from newline-delimited JSON, as the
+    bytes chunks arrive (e.g. from a streamed response body).
+
+    @param chunks {iterable} of bytes.
+    @param what {str} Optional. What the objects are, for error messages.
+    @param intern {bool} Optional. Default false. If true, the keys and
+        common repeated values (e.g. "type") of the decoded objects are
+        shared between objects. This saves memory when holding many of them
+        (e.g. a large directory listing), but costs some decoding time.
+    """
+    json_decode = (_json_interning_decoder if intern else _json_decoder).decode
+    for line in _iter_lines(chunks):
+        try:
+            yield json_decode(line)
+        except ValueError:
+            raise errors.MantaError('invalid %s: %r' % (what, line))
+
 
+class _BodyIterator(object):
+    """An iterator over the items decoded from a streamed response body
+    (a `ResponseBody` or `ObjectStream`). The body, and so its connection,
+    is closed when the items run out, on an error, on `close()` or when
+    the iterator is dropped, whether or not iterating was started.
+    """
 
-class MantaHttp(httplib2.Http):
-    def _request(self, conn, host, absolute_uri, request_uri, method, body,
-                 headers, redirections, cachekey):
-        if log.isEnabledFor(logging.DEBUG):
-            if body is not None:
-                body_str = body.decode('utf-8', 'backslashreplace')
-            else:
-                body_str = '(none)'
-            if len(body_str) > 1024:
-                body_str = body_str[:1021] + '...'
-            log.debug("req: %s %s\n%s",
-                      method,
-                      request_uri,
-                      '\n'.join([
-                          _indent("host: " + host),
-                          _indent("headers: " + pformat(headers)),
-                          #_indent("cachekey: " + pformat(cachekey)), #XXX
-                          _indent("body: " + body_str)
-                      ]))
-
-        if 'location' in headers:
-            headers['location'] = urlquote(headers['location'])
-        res, content = httplib2.Http._request(self, conn, host, absolute_uri,
-                                              request_uri, method, body,
-                                              headers, redirections, cachekey)
-        if log.isEnabledFor(logging.DEBUG):
-            log.debug("res: %s %s\n%s", method, request_uri,
-                      _indent(pformat(res)))
-
-        return (res, content)
+    def __init__(self, body, items):
+        self._body = body
+        self._items = items
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            return next(self._items)
+        except:
+            self.close()
+            raise
+
+    next = __next__  # Python 2
+
+    def close(self):
+        if self._body is not None:
+            body, self._body = self._body, None
+            self._items.close()
+            body.close()
+
+    def __del__(self):
+        self.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def _iter_body_lines(body, what=None):
+    """Iterate over the lines of a streamed body (a `ResponseBody` or
+    `ObjectStream`), closing it when done.
+
+    @param what {str} Optional. If given, the body is newline-delimited
+        JSON of these (e.g. "job error entry") and the decoded objects
+        are generated.
+    @returns {_BodyIterator}
+    """
+    if what:
+        return _BodyIterator(body, _iter_ndjson(body, what))
+    return _BodyIterator(body, _iter_lines(body))
+
+
+def _dirent_key(dirent):
+    """The key for a directory entry: its name, or its id for an entry in
+    a jobs listing (GET /:account/jobs).
+    """
+    if "id" in dirent:
+        return dirent["id"]
+    return dirent["name"]
+
+
+def _dirent_from_head(name, res):
+    """Make a dirent (as in a directory listing) for the given name from the
+    headers of a HEAD response.
+    """
+    dirent = {"name": name}
+    content_type = res.get("content-type", "")
+    last_modified = res.get("last-modified")
+    if last_modified:
+        d = datetime.datetime.strptime(last_modified,
+                                       "%a, %d %b %Y %H:%M:%S GMT")
+        dirent["mtime"] = d.strftime("%Y-%m-%dT%H:%M:%S.000Z")
+    if content_type.endswith("type=directory"):
+        dirent["type"] = "directory"
+    else:
+        dirent["type"] = "object"
+        dirent["size"] = int(res.get("content-length", 0))
+        if "etag" in res:
+            dirent["etag"] = res["etag"]
+        if "durability-level" in res:
+            dirent["durability"] = int(res["durability-level"])
+        dirent["contentType"] = content_type
+    return dirent
+
+
+def _pwrite(fd, data, offset, lock):
+    """Write all of `data` to the file descriptor at the given offset.
+    `lock` serializes the seek and write where `os.pwrite` isn't available
+    (Python 2).
+    """
+    data = memoryview(data)
+    if hasattr(os, 'pwrite'):
+        while data:
+            n = os.pwrite(fd, data, offset)
+            data = data[n:]
+            offset += n
+    else:
+        with lock:
+            os.lseek(fd, offset, os.SEEK_SET)
+            while data:
+                n = os.write(fd, data)
+                data = data[n:]
+
+
+def _uri_component(s):
+    """Encode the given string like JavaScript's `encodeURIComponent`, as
+    used by Manta to build the string to sign for a pre-signed URL.
+    """
+    if not isinstance(s, bytes):
+        s = s.encode('utf-8')
+    return urlquote(s, safe="!~*'()")
 
 #---- exports
 
 
+def _is_transient_error(ex):
+    """Return true if the given exception from a Manta request is for a
+    failure that may well not happen again: a network error, or a 5xx or
+    429 ("Too Many Requests") response.
+    """
+    if isinstance(ex, errors.MantaAPIError):
+        status = int(ex.res["status"])
+        return status >= 500 or status == 429
+    elif isinstance(ex, HTTPException):
+        return True
+    # Not an error on a local file (which has a filename).
+    return (isinstance(ex, (socket.error, IOError)) and
+            getattr(ex, 'filename', None) is None)
+
+
+def _retry(retries, func, *args, **kwargs):
+    """Call `func(*args, **kwargs)`, retrying up to `retries` times if it
+    fails with a transient error.
+    """
+    attempt = 0
+    while True:
+        try:
+            return func(*args, **kwargs)
+        except Exception:
+            _, ex, _ = sys.exc_info()
+            if attempt >= retries or not _is_transient_error(ex):
+                raise
+            delay = RETRY_DELAY * 2 ** attempt * random.uniform(0.5, 1.5)
+            log.debug("%s failed (%s), retrying in %.1fs", func.__name__,
+                      ex, delay)
+            time.sleep(delay)
+            attempt += 1
+
+
 class RawMantaClient(object):
     """A raw client for accessing the Manta REST API. Here "raw" means that
     the API is limited to the strict set of endpoints in the REST API. No
@@ -114,10 +379,21 @@ class RawMantaClient(object):
         auth scheme.
     @param user_agent {str} Optional. User-Agent header string.
     @param cache_dir {str} Optional. A dir to use for HTTP caching. It will
-        be created as needed.
+        be created as needed. HTTP caching needs the `Httplib2Transport`,
+        so giving a `cache_dir` makes that the default transport.
     @param disable_ssl_certificate_validation {bool} Default false.
     @param verbose {bool} Optional. Default false. If true, then will log
         debugging info.
+    @param pool_size {int} Optional. The max number of concurrent
+        keep-alive connections to the Manta host. Requests check out a
+        connection from this pool, so a client can be shared between
+        threads. Default is `manta.pool.DEFAULT_POOL_SIZE`.
+    @param transport {manta.transport.Transport} Optional. The HTTP
+        transport to use. Default is an `HTTPTransport` (using
+        `disable_ssl_certificate_validation` and `pool_size`), which
+        streams request and response bodies rather than holding them in
+        memory. If `cache_dir` is given, the default is an
+        `Httplib2Transport` using it.
     """
 
     def __init__(self,
@@ -130,7 +406,9 @@ class RawMantaClient(object):
                  user_agent=None,
                  cache_dir=None,
                  disable_ssl_certificate_validation=False,
-                 verbose=False):
+                 verbose=False,
+                 pool_size=None,
+                 transport=None):
         assert account, 'account'
         if url.endswith('/'):
             self.url = url[:-1]
@@ -149,28 +427,63 @@ class RawMantaClient(object):
             log.setLevel(logging.DEBUG)
             import manta.auth
             manta.auth.log.setLevel(logging.DEBUG)
-
-    _http_cache = None
-
-    def _get_http(self):
-        if not self._http_cache:
-            if not exists(self.cache_dir):
-                os.makedirs(self.cache_dir)
-            self._http_cache = MantaHttp(
+            import manta.transport
+            manta.transport.log.setLevel(logging.DEBUG)
+        if transport is not None:
+            self.transport = transport
+        elif cache_dir:
+            self.transport = Httplib2Transport(
                 self.cache_dir,
-                disable_ssl_certificate_validation=self.
-                disable_ssl_certificate_validation)
-        return self._http_cache
+                disable_ssl_certificate_validation=disable_ssl_certificate_validation,
+                pool_size=pool_size)
+        else:
+            self.transport = HTTPTransport(
+                disable_ssl_certificate_validation=disable_ssl_certificate_validation,
+                pool_size=pool_size)
+        self._auth_cache = (None, None)  # (key, Authorization header value)
+        self._auth_lock = threading.Lock()
+
+    def close(self):
+        """Close idle connections to Manta."""
+        self.transport.close()
+
+    def _get_authorization(self, date):
+        """Return the "Authorization" header value for the given "Date"
+        header value.
+
+        Only the date is signed and it has a one-second resolution, so the
+        last result is cached. All requests made in the same second share a
+        single signing (which may be an ssh-agent round trip).
+        """
+        key = (date, self.account, self.subuser, self.signer,
+               getattr(self.signer, 'key_id', None))
+        with self._auth_lock:
+            cached_key, auth = self._auth_cache
+            if cached_key == key:
+                return auth
+            sigstr = 'date: ' + date
+            algorithm, fingerprint, signature = self.signer.sign(sigstr.encode(
+                'utf-8'))
+            auth = 'Signature keyId="/%s/keys/%s",algorithm="%s",signature="%s"'\
+                   % ('/'.join(filter(None, [self.account, self.subuser])),
+                      fingerprint, algorithm, signature.decode('utf-8'))
+            self._auth_cache = (key, auth)
+        return auth
 
     def _request(self,
                  path,
                  method="GET",
                  query=None,
                  body=None,
-                 headers=None):
+                 headers=None,
+                 stream=False):
         """Make a Manta request
 
         ...
+        @param stream {bool} Optional. Default false. If true, the response
+            body is not read. Instead a `manta.transport.ResponseBody` is
+            returned for `content`. The caller must read it to the end or
+            `close()` it.
         @returns (res, content)
         """
         assert path.startswith('/'), "bogus path: %r" % path
@@ -186,7 +499,6 @@ class RawMantaClient(object):
         if query:
             qpath += '?' + urlencode(query)
         url = self.url + qpath
-        http = self._get_http()
 
         ubody = body
         if body is not None and isinstance(body, dict):
@@ -199,14 +511,7 @@ class RawMantaClient(object):
             # Signature auth.
             if "Date" not in headers:
                 headers["Date"] = http_date()
-            sigstr = 'date: ' + headers["Date"]
-            algorithm, fingerprint, signature = self.signer.sign(sigstr.encode(
-                'utf-8'))
-            auth = 'Signature keyId="/%s/keys/%s",algorithm="%s",signature="%s"'\
-                   % ('/'.join(filter(None, [self.account, self.subuser])),
-                      fingerprint, algorithm, signature.decode('utf-8'))
-
-            headers["Authorization"] = auth
+            headers["Authorization"] = self._get_authorization(headers["Date"])
 
             if self.role:
                 headers['Role'] = self.role
@@ -217,7 +522,10 @@ class RawMantaClient(object):
         except:
             pass
 
-        return http.request(url, method, ubody, headers)
+        if stream:
+            return self.transport.stream(url, method, ubody, headers)
+        else:
+            return self.transport.request(url, method, ubody, headers)
 
     def put_directory(self, mdir):
         """PutDirectory
@@ -246,13 +554,31 @@ class RawMantaClient(object):
         res, dirents = self.list_directory2(mdir, limit=limit, marker=marker)
         return dirents
 
-    def list_directory2(self, mdir, limit=None, marker=None):
+    def list_directory2(self, mdir, limit=None, marker=None, intern=False):
         """A lower-level version of `list_directory` that returns the
         response object (which includes the headers).
 
         ...
+        @param intern {bool} Optional. Default false. Share the keys and
+            common values between the returned dirents, to save memory
+            when holding large listings.
         @returns (res, dirents) {2-tuple}
         """
+        res, dirents = self._list_directory_stream(mdir,
+                                                   limit=limit,
+                                                   marker=marker,
+                                                   intern=intern)
+        return res, list(dirents)
+
+    def _list_directory_stream(self, mdir, limit=None, marker=None,
+                               intern=False):
+        """ListDirectory, decoding the dirents as the response body
+        arrives.
+
+        @returns (res, dirents) {2-tuple} `dirents` is an iterator, which
+            must be run to completion, closed or dropped to release the
+            connection.
+        """
         log.debug('ListDirectory %r', mdir)
 
         query = {}
@@ -261,19 +587,13 @@ class RawMantaClient(object):
         if marker:
             query["marker"] = marker
 
-        res, content = self._request(mdir, "GET", query=query)
+        res, body = self._request(mdir, "GET", query=query, stream=True)
         if res["status"] != "200":
-            raise errors.MantaAPIError(res, content)
-        lines = content.splitlines(False)
-        dirents = []
-        for line in lines:
-            if not line.strip():
-                continue
-            try:
-                dirents.append(json.loads(line.decode("utf-8")))
-            except ValueError:
-                raise errors.MantaError('invalid directory entry: %r' % line)
-        return res, dirents
+            with body:
+                raise errors.MantaAPIError(res, body.read())
+
+        return res, _BodyIterator(
+            body, _iter_ndjson(body, "directory entry", intern))
 
     def head_directory(self, mdir):
         """HEAD method on ListDirectory
@@ -291,6 +611,20 @@ class RawMantaClient(object):
             raise errors.MantaAPIError(res, content)
         return res
 
+    def head_object(self, mpath):
+        """HEAD method on GetObject
+        https://apidocs.joyent.com/manta/api.html#GetObject
+
+        @param mpath {str} A manta path, e.g. '/trent/stor/myobj'.
+        @returns The response object, which acts as a dict with the headers
+            (e.g. "content-length", "etag" and "content-md5").
+        """
+        log.debug('HEAD GetObject %r', mpath)
+        res, content = self._request(mpath, "HEAD")
+        if res["status"] != "200":
+            raise errors.MantaAPIError(res, content)
+        return res
+
     def delete_directory(self, mdir):
         """DeleteDirectory
         https://apidocs.joyent.com/manta/api.html#DeleteDirectory
@@ -317,16 +651,25 @@ class RawMantaClient(object):
             client.put_object('/trent/stor/foo', 'foo\nbar\nbaz')
             client.put_object('/trent/stor/foo', path='path/to/foo.txt')
             client.put_object('/trent/stor/foo', file=open('path/to/foo.txt'),
-                              size=11)
+                              content_length=11)
 
         One of `content`, `path` or `file` is required.
 
+        A `path` or `file` is streamed, read in chunks of
+        `manta.transport.CHUNK_SIZE` bytes, rather than read into memory
+        (with a transport that streams request bodies, e.g.
+        `HTTPTransport`). If the file is seekable the "Content-MD5" and
+        length are calculated in a first pass over it. Otherwise it is sent
+        with chunked transfer-encoding (unless `content_length` is given)
+        and the MD5 calculated as it is sent is checked against the
+        "computed-md5" in Manta's response.
+
         @param mpath {str} Required. A manta path, e.g. '/trent/stor/myobj'.
         @param content {bytes}
         @param path {str}
         @param file {file-like object}
-        @param content_length {int} Not currently used. Expect this to be used
-            when streaming support is added.
+        @param content_length {int} Optional. The number of bytes of `path`
+            or `file` to upload. By default it is the rest of the file.
         @param content_type {string} Optional, but suggested. Default is
             'application/octet-stream'.
         @param durability_level {int} Optional. Default is 2. This tells
@@ -341,33 +684,56 @@ class RawMantaClient(object):
         if len(methods) != 1:
             raise errors.MantaError("exactly one of 'content', 'path' or "
                                     "'file' must be provided")
+        f = None
+        stream_md5 = None
         if content is not None:
-            pass
-        elif path:
-            f = io.open(path, 'rb')
             try:
-                content = f.read()
-            finally:
-                f.close()
+                # python 3
+                content_bytes = bytes(content, encoding='utf-8')
+            except:
+                # python 2
+                content_bytes = content
+
+            headers["Content-Length"] = str(len(content))
+            md5 = hashlib.md5(content_bytes)
+            headers["Content-MD5"] = base64.b64encode(md5.digest())
+            body = content
         else:
-            content = file.read()
+            if path:
+                f = io.open(path, 'rb')
+            else:
+                f = file
+            try:
+                start = f.tell()
+                f.seek(start)
+            except (AttributeError, IOError, OSError):
+                start = None
+            if start is not None:
+                md5, content_length = _md5_and_size(f, content_length)
+                f.seek(start)
+                headers["Content-MD5"] = base64.b64encode(md5.digest())
+            else:
+                stream_md5 = hashlib.md5()
+            if content_length is not None:
+                headers["Content-Length"] = str(content_length)
+            body = _iter_file_chunks(f, content_length, stream_md5)
 
         try:
-            # python 3
-            content_bytes = bytes(content, encoding='utf-8')
-        except:
-            # python 2
-            content_bytes = content
-
-        headers["Content-Length"] = str(len(content))
-        md5 = hashlib.md5(content_bytes)
-        headers["Content-MD5"] = base64.b64encode(md5.digest())
-        res, content = self._request(mpath,
-                                     "PUT",
-                                     body=content,
-                                     headers=headers)
+            res, content = self._request(mpath,
+                                         "PUT",
+                                         body=body,
+                                         headers=headers)
+        finally:
+            if path and f is not None:
+                f.close()
         if res["status"] != "204":
             raise errors.MantaAPIError(res, content)
+        if stream_md5 is not None and res.get("computed-md5"):
+            content_md5 = base64.b64encode(stream_md5.digest()).decode("utf-8")
+            if content_md5 != res["computed-md5"]:
+                raise errors.MantaError("content-md5 mismatch: sent %s, "
+                                        "Manta computed %s" %
+                                        (content_md5, res["computed-md5"]))
 
     def get_object(self, mpath, path=None, accept="*/*"):
         """GetObject
@@ -395,36 +761,69 @@ class RawMantaClient(object):
         """A lower-level version of `get_object` that returns the
         response object (which includes the headers).
 
+        If `path` is given the object is streamed to that file (see
+        `get_object_stream`). The file is removed if the download fails.
+
         ...
         @returns (res, content) {2-tuple} `content` is None if `path` was
             provided
         """
-        log.debug('GetObject %r', mpath)
-        headers = {"Accept": accept}
+        stream = self.get_object_stream(mpath, accept=accept)
+        with stream:
+            if path is None:
+                return (stream.res, stream.read())
+            try:
+                f = io.open(path, 'wb')
+                try:
+                    for chunk in stream:
+                        f.write(chunk)
+                finally:
+                    f.close()
+            except:
+                if os.path.exists(path):
+                    os.remove(path)
+                raise
+            return (stream.res, None)
 
-        res, content = self._request(mpath, "GET", headers=headers)
-        if res["status"] not in ("200", "304"):
-            raise errors.MantaAPIError(res, content)
-        if len(content) != int(res["content-length"]):
-            raise errors.MantaError("content-length mismatch: expected %d, "
-                                    "got %s" %
-                                    (res["content-length"], content))
-        if res.get("content-md5"):
-            md5 = hashlib.md5(content)
-            content_md5 = base64.b64encode(md5.digest()).decode("utf-8")
-            if content_md5 != res["content-md5"]:
-                raise errors.MantaError("content-md5 mismatch: expected %s, "
-                                        "got %s" %
-                                        (res["content-md5"], content_md5))
-        if path is not None:
-            f = io.open(path, 'wb')
+    def get_object_stream(self, mpath, accept="*/*", headers=None):
+        """GetObject, streaming the response body.
+
+        The returned `ObjectStream` checks the "content-length" and
+        "content-md5" response headers incrementally as the body is read:
+        a `MantaError` is raised on reaching the end of a body that doesn't
+        match. Use it as a context manager or `close()` it, to release the
+        connection if not reading to the end. E.g.:
+
+            with client.get_object_stream('/trent/stor/big') as stream:
+                for chunk in stream:
+                    out.write(chunk)
+
+        The body is only read incrementally from the network with a
+        transport that streams response bodies, e.g. `HTTPTransport`.
+
+        @param mpath {str} Required. A manta path, e.g. '/trent/stor/myobj'.
+        @param accept {str} Optional. Default is '*/*'. The Accept header
+            for content negotiation.
+        @param headers {dict} Optional. Extra request headers, e.g. "Range"
+            or "If-Match".
+        @returns {ObjectStream}
+        """
+        log.debug('GetObject %r (stream)', mpath)
+        req_headers = {"Accept": accept}
+        if headers:
+            req_headers.update(headers)
+
+        res, body = self._request(mpath,
+                                  "GET",
+                                  headers=req_headers,
+                                  stream=True)
+        if res["status"] not in ("200", "206", "304"):
             try:
-                f.write(content)
+                content = body.read()
             finally:
-                f.close()
-            return (res, None)
-        else:
-            return (res, content)
+                body.close()
+            raise errors.MantaAPIError(res, content)
+        return ObjectStream(res, body)
 
     def delete_object(self, mpath):
         """DeleteObject
@@ -575,69 +974,731 @@ class RawMantaClient(object):
         """GetJobOutput
         https://apidocs.joyent.com/manta/api.html#GetJobOutput
         """
-        log.debug("GetJobOutput %r", job_id)
-        path = "/%s/jobs/%s/live/out" % (self.account, job_id)
-        res, content = self._request(path, "GET")
-        if res["status"] != "200":
-            raise errors.MantaAPIError(res, content)
-        keys = content.splitlines(False)
-        return keys
+        return list(self.iter_job_output(job_id))
+
+    def iter_job_output(self, job_id):
+        """GetJobOutput, generating the keys as the response body arrives
+        rather than reading the whole list into memory (with a streaming
+        transport such as the default `HTTPTransport`; `Httplib2Transport`
+        reads the whole body first).
+
+        @returns {iterator} of keys, which must be run to completion,
+            closed or dropped to release the connection. The request is
+            sent (and an error status raised) before this returns.
+        """
+        log.debug("GetJobOutput %r (stream)", job_id)
+        return self._iter_job_live(job_id, "out")
 
     def get_job_input(self, job_id):
         """GetJobInput
         https://apidocs.joyent.com/manta/api.html#GetJobInput
         """
-        log.debug("GetJobInput", job_id)
-        path = "/%s/jobs/%s/live/in" % (self.account, job_id)
-        res, content = self._request(path, "GET")
-        if res["status"] != "200":
-            raise errors.MantaAPIError(res, content)
-        keys = content.splitlines(False)
-        return keys
+        return list(self.iter_job_input(job_id))
+
+    def iter_job_input(self, job_id):
+        """GetJobInput, generating the keys as the response body arrives.
+        See `iter_job_output`.
+        """
+        log.debug("GetJobInput %r (stream)", job_id)
+        return self._iter_job_live(job_id, "in")
 
     def get_job_failures(self, job_id):
         """GetJobFailures
         https://apidocs.joyent.com/manta/api.html#GetJobFailures
         """
-        log.debug("GetJobFailures %r", job_id)
-        path = "/%s/jobs/%s/live/fail" % (self.account, job_id)
-        res, content = self._request(path, "GET")
-        if res["status"] != "200":
-            raise errors.MantaAPIError(res, content)
-        keys = content.splitlines(False)
-        return keys
+        return list(self.iter_job_failures(job_id))
+
+    def iter_job_failures(self, job_id):
+        """GetJobFailures, generating the keys as the response body
+        arrives. See `iter_job_output`.
+        """
+        log.debug("GetJobFailures %r (stream)", job_id)
+        return self._iter_job_live(job_id, "fail")
 
     def get_job_errors(self, job_id):
         """GetJobErrors
         https://apidocs.joyent.com/manta/api.html#GetJobErrors
         """
-        log.debug("GetJobErrors %r", job_id)
-        path = "/%s/jobs/%s/live/err" % (self.account, job_id)
-        res, content = self._request(path, "GET")
+        return list(self.iter_job_errors(job_id))
+
+    def iter_job_errors(self, job_id):
+        """GetJobErrors, generating the error dicts as they are decoded
+        from the response body. See `iter_job_output`.
+        """
+        log.debug("GetJobErrors %r (stream)", job_id)
+        return self._iter_job_live(job_id, "err", "job error entry")
+
+    def _iter_job_live(self, job_id, name, what=None):
+        """Request the job's "live/`name`" list, raising on an error status
+        (before the returned generator is run).
+
+        @param what {str} Optional. If given, the list is newline-delimited
+            JSON of these. Else it is of keys.
+        @returns {_BodyIterator}
+        """
+        path = "/%s/jobs/%s/live/%s" % (self.account, job_id, name)
+        res, body = self._request(path, "GET", stream=True)
         if res["status"] != "200":
-            raise errors.MantaAPIError(res, content)
-        return self._job_errors_from_content(content)
+            with body:
+                raise errors.MantaAPIError(res, body.read())
+        return _iter_body_lines(body, what)
 
-    def _job_errors_from_content(self, content):
-        lines = content.splitlines(False)
-        errs = []
-        for line in lines:
-            if not line.strip():
-                continue
-            try:
-                errs.append(json.loads(line))
-            except ValueError:
-                raise errors.MantaError('invalid job error entry: %r' % line)
-        return errs
+
+class ObjectStream(object):
+    """A readable file-like object for a streamed GetObject response body
+    (see `RawMantaClient.get_object_stream`).
+
+    The "content-length" and (for a complete object) "content-md5" response
+    headers are checked incrementally as the body is read. On reaching the
+    end of the body a `MantaError` is raised if they don't match.
+
+    @ivar res The response. `res["etag"]` etc. for the response headers.
+    @ivar bytes_read {int} The number of body bytes read so far.
+    """
+
+    def __init__(self, res, body):
+        self.res = res
+        self.bytes_read = 0
+        self._body = body
+        self._verified = False
+        if "content-length" in res:
+            self._content_length = int(res["content-length"])
+        else:
+            self._content_length = None
+        # The "content-md5" of a partial ("206") response is the MD5 of the
+        # whole object, not of the returned range.
+        if res.get("content-md5") and res["status"] != "206":
+            self._md5 = hashlib.md5()
+        else:
+            self._md5 = None
+
+    def _verify(self):
+        if self._verified:
+            return
+        self._verified = True
+        if (self._content_length is not None and
+                self.bytes_read != self._content_length):
+            raise errors.MantaError("content-length mismatch: expected %d, "
+                                    "got %d" %
+                                    (self._content_length, self.bytes_read))
+        if self._md5 is not None:
+            content_md5 = base64.b64encode(self._md5.digest()).decode("utf-8")
+            if content_md5 != self.res["content-md5"]:
+                raise errors.MantaError("content-md5 mismatch: expected %s, "
+                                        "got %s" %
+                                        (self.res["content-md5"], content_md5))
+
+    def read(self, size=-1):
+        """Read up to `size` bytes, or to the end of the body if `size` is
+        negative. Returns an empty bytes at the end of the body.
+        """
+        if size == 0:
+            return b''
+        if size is None or size < 0:
+            chunk = self._body.read()
+        else:
+            chunk = self._body.read(size)
+        if chunk:
+            self.bytes_read += len(chunk)
+            if self._md5 is not None:
+                self._md5.update(chunk)
+        if not chunk or size is None or size < 0:
+            self._verify()
+        return chunk
+
+    def __iter__(self):
+        while True:
+            chunk = self.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+
+    def close(self):
+        self._body.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class _TreeRemover(object):
+    """The engine for `MantaClient.rmr`.
+
+    Directories are listed a page at a time on one thread pool, and the
+    objects in each page deleted on another. At most `2 * concurrency`
+    object deletes are queued, to hold back the listings. A count of the
+    unfinished entries (plus one while it is being listed) is kept for each
+    directory, and the directory is deleted when that reaches zero. If
+    anything under a directory couldn't be removed, it is left in place.
+    """
+
+    def __init__(self, client, concurrency, retries, callback):
+        self.client = client
+        self.retries = retries
+        self.callback = callback
+        self.failures = []
+        self.lock = threading.Lock()
+        self.done = threading.Event()
+        self.stopped = False
+        self.slots = threading.Semaphore(2 * concurrency)
+        self.listers = ThreadPoolExecutor(concurrency)
+        self.deleters = ThreadPoolExecutor(concurrency)
+        self.counts = {}  # mdir -> number of unfinished entries
+        self.failed = set()  # dirs with something that couldn't be removed
+
+    def run(self, mdir):
+        self.root = mdir
+        self.counts[mdir] = 1
+        self.listers.submit(self.list_dir, mdir)
+        try:
+            # Wait with a timeout so that a ^C is handled on Python 2.
+            while not self.done.wait(1):
+                pass
+        finally:
+            self.stopped = True
+            self.listers.shutdown(wait=False)
+            self.deleters.shutdown(wait=False)
+        return self.failures
+
+    def fail(self, mpath, ex):
+        log.debug("rmr: could not remove %s: %s", mpath, ex)
+        with self.lock:
+            self.failures.append((mpath, ex))
+        if self.callback:
+            self.callback(mpath, ex)
+
+    def list_dir(self, mdir):
+        failed = False
+        try:
+            for page in self.client._iter_ls_pages(mdir, self.retries):
+                for dirent in page:
+                    if self.stopped:
+                        return
+                    mpath = ujoin(mdir, dirent["name"])
+                    with self.lock:
+                        self.counts[mdir] += 1
+                    if dirent["type"] == "directory":
+                        with self.lock:
+                            self.counts[mpath] = 1
+                        self.listers.submit(self.list_dir, mpath)
+                    else:
+                        self.slots.acquire()
+                        self.deleters.submit(self.delete, mpath, False)
+        except errors.MantaResourceNotFoundError:
+            pass  # Already removed.
+        except Exception:
+            _, ex, _ = sys.exc_info()
+            self.fail(mdir, ex)
+            failed = True
+        self.entry_done(mdir, failed)
+
+    def delete(self, mpath, is_dir):
+        failed = False
+        try:
+            if not self.stopped:
+                try:
+                    _retry(self.retries, self.client.delete_object, mpath)
+                except errors.MantaAPIError:
+                    _, ex, _ = sys.exc_info()
+                    if getattr(ex, 'code', None) != 'ResourceNotFound':
+                        raise
+                if self.callback:
+                    self.callback(mpath, None)
+        except Exception:
+            _, ex, _ = sys.exc_info()
+            self.fail(mpath, ex)
+            failed = True
+        finally:
+            if not is_dir:
+                self.slots.release()
+        if mpath == self.root:
+            self.done.set()
+        else:
+            self.entry_done(udirname(mpath), failed)
+
+    def entry_done(self, mdir, failed=False):
+        """Note that an entry of `mdir` (or its listing) is finished."""
+        with self.lock:
+            if failed:
+                self.failed.add(mdir)
+            self.counts[mdir] -= 1
+            if self.counts[mdir]:
+                return
+            del self.counts[mdir]
+            failed = mdir in self.failed
+            self.failed.discard(mdir)
+        if self.stopped:
+            self.done.set()
+        elif not failed:
+            self.deleters.submit(self.delete, mdir, True)
+        elif mdir == self.root:
+            self.done.set()
+        else:
+            self.entry_done(udirname(mdir), True)
+
+
+class _Progress(object):
+    """Progress counts for a transfer of many files (`MantaClient.put_tree`
+    and `get_tree`), passed to the caller's callback as a dict.
+    """
+
+    def __init__(self, files_total=0, bytes_total=0):
+        self.files_total = files_total
+        self.bytes_total = bytes_total
+        self.files_done = 0
+        self.bytes_done = 0
+        self.start = time.time()
+        self.lock = threading.Lock()
+
+    def expect(self, nbytes):
+        """Count one more file of `nbytes` bytes to transfer."""
+        with self.lock:
+            self.files_total += 1
+            self.bytes_total += nbytes
+
+    def add(self, nbytes):
+        """Count one more file of `nbytes` bytes, returning the stats."""
+        with self.lock:
+            self.files_done += 1
+            self.bytes_done += nbytes
+            return self.stats()
+
+    def stats(self):
+        elapsed = time.time() - self.start
+        return {
+            "files_done": self.files_done,
+            "files_total": self.files_total,
+            "bytes_done": self.bytes_done,
+            "bytes_total": self.bytes_total,
+            "elapsed": elapsed,
+            "bytes_per_sec": self.bytes_done / elapsed if elapsed else 0.0,
+        }
+
+
+class _ByteBudget(object):
+    """Limits the total size of the transfers in flight (for
+    `MantaClient.put_tree` and `get_tree`). A transfer larger than the
+    whole budget is allowed when nothing else is in flight.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.in_flight = 0
+        self.cond = threading.Condition(threading.Lock())
+
+    def acquire(self, nbytes):
+        with self.cond:
+            while self.in_flight and self.in_flight + nbytes > self.max_bytes:
+                self.cond.wait()
+            self.in_flight += nbytes
+
+    def release(self, nbytes):
+        with self.cond:
+            self.in_flight -= nbytes
+            self.cond.notify_all()
+
+
+class _JobWaiter(object):
+    """Waits on a set of jobs for `MantaClient.wait_for_jobs`. More jobs
+    can be added with `add` while waiting (e.g. between the jobs generated
+    by `wait`) without resetting the backoff of the others, as
+    `manta.JobManager` does.
+    """
+
+    def __init__(self, client, job_ids=(), timeout=None, concurrency=None):
+        self.client = client
+        self.timeout = timeout
+        self.concurrency = concurrency
+        # job id -> (time of the next check, current poll interval)
+        self.pending = {}
+        for job_id in job_ids:
+            self.add(job_id)
+
+    def add(self, job_id):
+        """Start waiting on the given job, first checking it soon."""
+        self.pending[job_id] = (time.time() + JOB_POLL_MIN, JOB_POLL_MIN)
+
+    def wait(self):
+        """Generate each job's final status as it finishes, until none are
+        pending. See `MantaClient.wait_for_jobs`.
+        """
+        client = self.client
+        timeout = self.timeout
+        pending = self.pending
+        start = time.time()
+
+        def backoff(job_id, now):
+            interval = min(pending[job_id][1] * JOB_POLL_BACKOFF, JOB_POLL_MAX)
+            pending[job_id] = (now + interval * random.uniform(0.8, 1.2),
+                               interval)
+
+        def get_job(job_id):
+            return _retry(DEFAULT_RETRIES, client.get_job, job_id)
+
+        executor = None
+        try:
+            while pending:
+                now = time.time()
+                if timeout is not None and now - start >= timeout:
+                    raise errors.MantaError(
+                        "timed out waiting for job%s %s (%ds)" %
+                        ("s" if len(pending) > 1 else "",
+                         ", ".join(sorted(pending)), timeout))
+                next_check = min(t for t, _ in pending.values())
+                if next_check > now:
+                    if timeout is not None:
+                        next_check = min(next_check, start + timeout)
+                    time.sleep(next_check - now)
+                    continue
+
+                due = [j for j, (t, _) in pending.items() if t <= now]
+                if len(pending) > 1:
+                    running = _retry(DEFAULT_RETRIES, client.list_jobs,
+                                     state="running", limit=JOB_LIST_LIMIT)
+                    # Else the list may be truncated.
+                    if len(running) < JOB_LIST_LIMIT:
+                        running = set(j["name"] for j in running)
+                        for job_id in due:
+                            if job_id in running:
+                                backoff(job_id, now)
+                        # Only check the due jobs that aren't running. Jobs
+                        # still queued aren't listed either, so they are
+                        # backed off like running ones rather than checked
+                        # on every round.
+                        due = [j for j in due if j not in running]
+
+                if len(due) > 1:
+                    if executor is None:
+                        executor = ThreadPoolExecutor(self.concurrency or
+                                                      DEFAULT_CONCURRENCY)
+                    jobs = executor.map(get_job, due)
+                else:
+                    jobs = [get_job(j) for j in due]
+                for job_id, job in zip(due, jobs):
+                    if job["state"] == "done":
+                        del pending[job_id]
+                        yield job
+                    else:
+                        backoff(job_id, now)
+        finally:
+            if executor is not None:
+                executor.shutdown(wait=True)
 
 
 class MantaClient(RawMantaClient):
     """A Manta client that builds on `RawMantaClient` to provide some
     API sugar.
+
+    It takes the arguments of `RawMantaClient`, plus:
+
+    @param metadata_cache {bool|manta.cache.MetadataCache} Optional.
+        Default true. The cache for `ls` listings and `stat` results, so
+        repeated lookups of the same paths don't each cost a request.
+        Cached values expire after a TTL (see `manta.cache.DEFAULT_TTL`),
+        and the paths this client writes or deletes are invalidated, but
+        changes made by *other* clients aren't seen until a value expires.
+        True means a `MetadataCache` with the default size and TTL. False
+        disables caching. The cache's `stats()` gives hit/miss counts.
     """
-    get = RawMantaClient.get_object
-    put = RawMantaClient.put_object
-    rm = RawMantaClient.delete_object
+
+    def __init__(self, *args, **kwargs):
+        metadata_cache = kwargs.pop("metadata_cache", True)
+        RawMantaClient.__init__(self, *args, **kwargs)
+        if metadata_cache is True:
+            metadata_cache = MetadataCache()
+        self.metadata_cache = metadata_cache or None
+        # Directories this client has made or seen made, so `mkdir -p` of
+        # them (or their subdirs) needn't check with Manta.
+        self._known_dirs = (MetadataCache(maxsize=KNOWN_DIRS_SIZE,
+                                          ttl=KNOWN_DIRS_TTL)
+                            if self.metadata_cache else None)
+
+    def _cache_get(self, key):
+        """Return the cached metadata for `key`, or `_MISSING`."""
+        if self.metadata_cache is None:
+            return _MISSING
+        return self.metadata_cache.get(key, _MISSING)
+
+    def _invalidate_metadata(self, mpath, removed=False):
+        """Drop cached metadata for a path that this client is changing:
+        its stat and its parent's listing, plus its own listing and
+        known-directory status if it is being `removed`.
+        """
+        cache = self.metadata_cache
+        if cache is None:
+            return
+        cache.invalidate(("stat", mpath))
+        cache.invalidate(("ls", udirname(mpath)))
+        if removed:
+            cache.invalidate(("ls", mpath))
+            self._known_dirs.invalidate(mpath)
+
+    def _is_known_dir(self, mdir):
+        return (self._known_dirs is not None and
+                self._known_dirs.get(mdir) is not None)
+
+    def _add_known_dir(self, mdir):
+        """Note that `mdir`, and so all its parent dirs, exists."""
+        if self._known_dirs is None:
+            return
+        while len(mdir.split('/')) > 3:
+            self._known_dirs.set(mdir, True)
+            mdir = udirname(mdir)
+
+    def _forget_missing_dirs(self, mpath):
+        """Call when a request on `mpath` fails. If it failed because a
+        parent directory doesn't exist (e.g. removed by another client),
+        stop treating any of its parents as known.
+        """
+        _, ex, _ = sys.exc_info()
+        if (self._known_dirs is not None and
+                getattr(ex, 'code', None) == 'DirectoryDoesNotExist'):
+            mdir = udirname(mpath)
+            while len(mdir.split('/')) > 3:
+                self._known_dirs.invalidate(mdir)
+                mdir = udirname(mdir)
+
+    def put_directory(self, mdir):
+        try:
+            RawMantaClient.put_directory(self, mdir)
+        except errors.MantaAPIError:
+            self._forget_missing_dirs(mdir)
+            raise
+        finally:
+            self._invalidate_metadata(mdir)
+        self._add_known_dir(mdir)
+    put_directory.__doc__ = RawMantaClient.put_directory.__doc__
+
+    def delete_directory(self, mdir):
+        try:
+            return RawMantaClient.delete_directory(self, mdir)
+        finally:
+            self._invalidate_metadata(mdir, removed=True)
+    delete_directory.__doc__ = RawMantaClient.delete_directory.__doc__
+
+    def put_object(self, mpath, *args, **kwargs):
+        try:
+            return RawMantaClient.put_object(self, mpath, *args, **kwargs)
+        except errors.MantaAPIError:
+            self._forget_missing_dirs(mpath)
+            raise
+        finally:
+            self._invalidate_metadata(mpath)
+    put_object.__doc__ = RawMantaClient.put_object.__doc__
+
+    def delete_object(self, mpath):
+        try:
+            return RawMantaClient.delete_object(self, mpath)
+        finally:
+            self._invalidate_metadata(mpath, removed=True)
+    delete_object.__doc__ = RawMantaClient.delete_object.__doc__
+
+    def put_snaplink(self, link_path, object_path):
+        try:
+            return RawMantaClient.put_snaplink(self, link_path, object_path)
+        except errors.MantaAPIError:
+            self._forget_missing_dirs(link_path)
+            raise
+        finally:
+            self._invalidate_metadata(link_path)
+    put_snaplink.__doc__ = RawMantaClient.put_snaplink.__doc__
+
+    put = put_object
+    rm = delete_object
+
+    def get(self, mpath, path=None, accept="*/*", parallel=None,
+            resume=False):
+        """Get an object: `get_object` with the option of a parallel,
+        ranged download or a resumable download.
+
+        @param mpath {str} Required. A manta path, e.g. '/trent/stor/myobj'.
+        @param path {str} Optional. If given, the retrieved object will be
+            written to the given file path instead of the content being
+            returned. Required with `parallel`.
+        @param accept {str} Optional. Default is '*/*'. The Accept header
+            for content negotiation.
+        @param parallel {int} Optional. If greater than one, download the
+            object to `path` as byte ranges (of `DEFAULT_PART_SIZE`) fetched
+            on up to this many concurrent connections. The ranges are
+            fetched with "If-Match" on the object's etag and written in
+            place in the file, then the file's MD5 is checked against the
+            object's "content-md5". An object without an etag is fetched
+            with a single GET. A single stream to Manta can be much slower
+            than the local network.
+        @param resume {bool} Optional. Default false. If true, download to
+            "`path`.part" (recording the object's etag in
+            "`path`.part.json"), renaming it to `path` when complete. If a
+            previous download was interrupted, it continues from the end of
+            the partial file with a "Range" request guarded by "If-Match"
+            on the etag (starting over if the object has since changed, or
+            has no etag). Requires `path`.
+        @returns {str|None} None if `path` is provided, else the object
+            content.
+        """
+        if (parallel and parallel > 1) or resume:
+            if path is None:
+                raise errors.MantaError("a parallel or resumable get "
+                                        "requires a 'path'")
+            if resume:
+                if parallel and parallel > 1:
+                    raise errors.MantaError("cannot both resume and do a "
+                                            "parallel get")
+                return self._get_object_resume(mpath, path, accept)
+            return self._get_object_ranges(mpath, path, parallel,
+                                           accept=accept)
+        return self.get_object(mpath, path=path, accept=accept)
+
+    def _get_object_resume(self, mpath, path, accept="*/*"):
+        """Download the object to `path` via a partial file, continuing a
+        previous download if there is one. See `get`.
+        """
+        part_path = path + PARTIAL_SUFFIX
+        info_path = part_path + ".json"
+        info = None
+        if os.path.exists(part_path) and os.path.exists(info_path):
+            try:
+                with io.open(info_path, 'r') as f:
+                    info = json.load(f)
+            except (IOError, OSError, ValueError):
+                info = None
+            if not (info and info.get("mpath") == mpath and info.get("etag")):
+                info = None
+
+        stream = None
+        offset = 0
+        md5 = hashlib.md5()
+        if info:
+            # Continue the MD5 over the bytes we already have.
+            with io.open(part_path, 'rb') as f:
+                md5, offset = _md5_and_size(f)
+            if offset > info["size"]:
+                info = None
+            elif offset < info["size"]:
+                log.debug('GetObject %r: resume from byte %d', mpath, offset)
+                headers = {"Range": "bytes=%d-" % offset,
+                           "If-Match": info["etag"]}
+                try:
+                    stream = self.get_object_stream(mpath, accept=accept,
+                                                    headers=headers)
+                except errors.MantaAPIError:
+                    _, ex, _ = sys.exc_info()
+                    if ex.res["status"] != "412":
+                        raise
+                    log.debug('GetObject %r: object changed, start over',
+                              mpath)
+                    info = None
+                else:
+                    if stream.res["status"] != "206":
+                        stream.close()
+                        stream = None
+                        info = None
+        if not info:
+            offset = 0
+            md5 = hashlib.md5()
+            stream = self.get_object_stream(mpath, accept=accept)
+            info = {
+                "mpath": mpath,
+                "etag": stream.res.get("etag"),
+                "content-md5": stream.res.get("content-md5"),
+                "size": int(stream.res["content-length"]),
+            }
+            with io.open(info_path, 'wb') as f:
+                f.write(json.dumps(info).encode('utf-8'))
+
+        if stream is not None:
+            with stream:
+                with io.open(part_path, 'ab' if offset else 'wb') as f:
+                    for chunk in stream:
+                        md5.update(chunk)
+                        f.write(chunk)
+                        offset += len(chunk)
+
+        content_md5 = base64.b64encode(md5.digest()).decode("utf-8")
+        if offset != info["size"]:
+            error = "content-length mismatch: expected %d, got %d" % (
+                info["size"], offset)
+        elif info["content-md5"] and content_md5 != info["content-md5"]:
+            error = "content-md5 mismatch: expected %s, got %s" % (
+                info["content-md5"], content_md5)
+        else:
+            error = None
+        if error:
+            os.remove(part_path)
+            os.remove(info_path)
+            raise errors.MantaError(error)
+        if os.path.exists(path):
+            os.remove(path)  # `os.rename` won't replace a file on Windows
+        os.rename(part_path, path)
+        os.remove(info_path)
+
+    def _get_object_ranges(self, mpath, path, parallel, part_size=None,
+                           accept="*/*"):
+        """Download the object to `path` as byte ranges on `parallel`
+        concurrent connections. See `get`.
+        """
+        res = self.head_object(mpath)
+        size = int(res["content-length"])
+        part_size = part_size or DEFAULT_PART_SIZE
+        etag = res.get("etag")
+        if size <= part_size or not etag:
+            # Without an etag the ranges can't be guarded against the
+            # object changing between them.
+            if not etag:
+                log.debug('GetObject %r: no etag, using a single GET', mpath)
+            self.get_object2(mpath, path=path, accept=accept)
+            return
+        ranges = [(start, min(start + part_size, size) - 1)
+                  for start in range(0, size, part_size)]
+        log.debug('GetObject %r: %d ranges on %d connections', mpath,
+                  len(ranges), parallel)
+
+        fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_TRUNC |
+                     getattr(os, 'O_BINARY', 0), 0o666)
+        lock = threading.Lock()
+
+        def get_range(byte_range):
+            start, end = byte_range
+            headers = {"Range": "bytes=%d-%d" % byte_range, "If-Match": etag}
+            with self.get_object_stream(mpath, accept=accept,
+                                        headers=headers) as stream:
+                if stream.res["status"] != "206":
+                    raise errors.MantaError(
+                        "%s: expected a partial (206) response for bytes "
+                        "%d-%d, got %s" % (mpath, start, end,
+                                           stream.res["status"]))
+                offset = start
+                for chunk in stream:
+                    _pwrite(fd, chunk, offset, lock)
+                    offset += len(chunk)
+
+        try:
+            try:
+                os.ftruncate(fd, size)
+                with ThreadPoolExecutor(max_workers=parallel) as executor:
+                    futures = [executor.submit(get_range, r) for r in ranges]
+                    try:
+                        for future in futures:
+                            future.result()
+                    except:
+                        for future in futures:
+                            future.cancel()
+                        raise
+            finally:
+                os.close(fd)
+            if res.get("content-md5"):
+                with io.open(path, 'rb') as f:
+                    md5, _ = _md5_and_size(f)
+                content_md5 = base64.b64encode(md5.digest()).decode("utf-8")
+                if content_md5 != res["content-md5"]:
+                    raise errors.MantaError("content-md5 mismatch: expected "
+                                            "%s, got %s" %
+                                            (res["content-md5"], content_md5))
+        except:
+            if os.path.exists(path):
+                os.remove(path)
+            raise
 
     def ln(self, object_path, link_path):
         """Create a Manta link.
@@ -653,7 +1714,59 @@ class MantaClient(RawMantaClient):
         """
         return self.put_snaplink(link_path, object_path)
 
-    def walk(self, mtop, topdown=True):
+    def sign_url(self, mpath, method="GET", expires=None):
+        """Return a pre-signed URL for the given Manta path.
+
+        Anyone with the URL can make the given request (without Manta
+        credentials) until it expires, e.g. with `curl`. See
+        https://apidocs.joyent.com/manta/api.html#signed-urls
+
+        @param mpath {str} A manta path, e.g. '/trent/stor/myobj'.
+        @param method {str} Optional. The HTTP method the URL is for.
+            Default "GET".
+        @param expires {int} Optional. The time (in seconds since the
+            epoch) at which the URL expires. Default is
+            `DEFAULT_SIGN_URL_EXPIRY` seconds from now.
+        @returns {str} The signed URL.
+        """
+        assert mpath.startswith('/'), "bogus path: %r" % mpath
+        if not self.signer:
+            raise errors.MantaError("cannot sign URL: no signer")
+        if expires is None:
+            expires = time.time() + DEFAULT_SIGN_URL_EXPIRY
+
+        algorithm, fingerprint = self.signer.get_algorithm_and_fingerprint()
+        query = {
+            "algorithm": algorithm.upper(),
+            "expires": str(int(expires)),
+            "keyId": "/%s/keys/%s" % ('/'.join(filter(
+                None, [self.account, self.subuser])), fingerprint),
+        }
+        if self.role:
+            query["role"] = self.role
+        query_str = '&'.join('%s=%s' % (_uri_component(k), _uri_component(v))
+                             for k, v in sorted(query.items()))
+
+        if not isinstance(mpath, bytes):
+            mpath = mpath.encode('utf-8')
+        qpath = urlquote(mpath)
+        sigstr = '\n'.join([method.upper(), urlparse(self.url).netloc, qpath,
+                            query_str])
+        _, _, signature = self.signer.sign(sigstr.encode('utf-8'))
+        if isinstance(signature, bytes):
+            signature = signature.decode('utf-8')
+        return '%s%s?%s&signature=%s' % (self.url, qpath, query_str,
+                                         _uri_component(signature))
+
+    def walk(self,
+             mtop,
+             topdown=True,
+             concurrency=None,
+             ordered=True,
+             max_depth=None,
+             prune=None,
+             retries=None,
+             onerror=None):
         """`os.walk(path)` for a directory in Manta.
 
         A somewhat limited form in that some of the optional args to
@@ -674,26 +1787,134 @@ class MantaClient(RawMantaClient):
               ...])
             ...
 
+        As with `os.walk`, when walking top-down the caller can remove
+        entries from `dirents` to not descend into them.
+
         @param mtop {Manta dir}
+        @param topdown {bool} Optional. Default true.
+        @param concurrency {int} Optional. If greater than one, list
+            directories on up to this many concurrent connections. Only
+            supported top-down. Directories are listed ahead of the caller,
+            but no more than `2 * concurrency` listings are held at a time.
+        @param ordered {bool} Optional. Default true. For a concurrent walk,
+            whether to yield directories in the same order as a sequential
+            walk. If false they are yielded as their listings complete,
+            which keeps all the connections busy.
+        @param max_depth {int} Optional. Don't descend more than this many
+            levels below `mtop`. E.g. 0 means just list `mtop`.
+        @param prune {callable} Optional. `prune(dirpath, dirent)` is called
+            for each subdirectory. If it returns true, that directory is not
+            descended into.
+        @param retries {int} Optional. Default 0. The max number of retries
+            for a ListDirectory request failing with a transient error.
+        @param onerror {callable} Optional. As for `os.walk`, called as
+            `onerror(dirpath, error)` for a directory that can't be listed,
+            which is then skipped. By default the error is raised.
         """
-        dirents = self.ls(mtop)
-
+        if concurrency and concurrency > 1:
+            if not topdown:
+                raise errors.MantaError("a concurrent walk must be top-down")
+            return self._walk_concurrent(mtop, concurrency, ordered,
+                                         max_depth, prune, retries, onerror)
+        return self._walk(mtop, topdown, max_depth, prune, retries, onerror,
+                          0)
+
+    def _walk_list_dir(self, mdir, retries=None):
+        if retries:
+            dirents = [d for page in self._iter_ls_pages(mdir, retries)
+                       for d in page]
+        else:
+            dirents = self.iter_ls(mdir)
         mdirs, mnondirs = [], []
-        for dirent in sorted(dirents.values(), key=itemgetter("name")):
+        for dirent in sorted(dirents, key=itemgetter("name")):
             if dirent["type"] == "directory":
                 mdirs.append(dirent)
             else:
                 mnondirs.append(dirent)
+        return mdirs, mnondirs
+
+    def _walk_subdirs(self, mdir, depth, mdirs, max_depth, prune):
+        """The paths of the subdirs of `mdir` (at `depth`) to descend into."""
+        if max_depth is not None and depth >= max_depth:
+            return []
+        return [ujoin(mdir, d["name"]) for d in mdirs
+                if not (prune and prune(mdir, d))]
+
+    def _walk(self, mtop, topdown, max_depth, prune, retries, onerror,
+              depth):
+        try:
+            mdirs, mnondirs = self._walk_list_dir(mtop, retries)
+        except Exception:
+            if onerror is None:
+                raise
+            onerror(mtop, sys.exc_info()[1])
+            return
 
         if topdown:
             yield mtop, mdirs, mnondirs
-        for mdir in mdirs:
-            mpath = ujoin(mtop, mdir["name"])
-            for x in self.walk(mpath, topdown):
+        for mpath in self._walk_subdirs(mtop, depth, mdirs, max_depth, prune):
+            for x in self._walk(mpath, topdown, max_depth, prune, retries,
+                                onerror, depth + 1):
                 yield x
         if not topdown:
             yield mtop, mdirs, mnondirs
 
+    def _walk_concurrent(self, mtop, concurrency, ordered, max_depth, prune,
+                         retries, onerror):
+        """A top-down `walk` listing directories on a thread pool.
+
+        Directories still to be listed are kept on a stack of
+        `[dirpath, depth, future]` in sequential walk order (the next at the
+        end). Listings are submitted from the top of the stack, with at
+        most `max_pending` submitted and not yet yielded: this bounds the
+        memory used for listings when the caller is slower than Manta.
+        """
+        max_pending = 2 * concurrency
+        stack = [[mtop, 0, None]]
+        in_flight = {}  # future -> stack entry
+        executor = ThreadPoolExecutor(max_workers=concurrency)
+
+        def submit():
+            for entry in reversed(stack):
+                if len(in_flight) >= max_pending:
+                    break
+                if entry[2] is None:
+                    entry[2] = executor.submit(self._walk_list_dir, entry[0],
+                                               retries)
+                    in_flight[entry[2]] = entry
+
+        try:
+            while stack:
+                submit()
+                if ordered:
+                    entry = stack.pop()
+                else:
+                    done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    entry = in_flight[done.pop()]
+                    # Submitted entries are near the top of the stack.
+                    for i in range(len(stack) - 1, -1, -1):
+                        if stack[i] is entry:
+                            del stack[i]
+                            break
+                dirpath, depth, future = entry
+                del in_flight[future]
+                try:
+                    mdirs, mnondirs = future.result()
+                except Exception:
+                    if onerror is None:
+                        raise
+                    onerror(dirpath, sys.exc_info()[1])
+                    continue
+                yield dirpath, mdirs, mnondirs
+                subdirs = self._walk_subdirs(dirpath, depth, mdirs, max_depth,
+                                             prune)
+                for mpath in reversed(subdirs):
+                    stack.append([mpath, depth + 1, None])
+        finally:
+            for future in in_flight:
+                future.cancel()
+            executor.shutdown(wait=False)
+
     def ls(self, mdir, limit=None, marker=None):
         """List a directory.
 
@@ -703,13 +1924,17 @@ class MantaClient(RawMantaClient):
           one request (1000).
         - This returns a dict mapping name to dirent as a convenience.
           Note that that makes this inappropriate for streaming a huge
-          listing. A streaming-appropriate `ls` will be a separate method
-          if/when that is added.
+          listing. Use `iter_ls` for that.
+        - The listing is kept in the `metadata_cache`. Callers get their
+          own copy of the dirents.
 
         @param mdir {str} A manta directory, e.g. '/trent/stor/a-dir'.
         @returns {dict} A mapping of names to their directory entry (dirent).
         """
         assert limit is None and marker is None, "not yet implemented"
+        cached = self._cache_get(("ls", mdir))
+        if cached is not _MISSING:
+            return dict((k, dict(v)) for k, v in cached.items())
         dirents = {}
 
         if limit or marker:
@@ -718,31 +1943,89 @@ class MantaClient(RawMantaClient):
                 dirents[entry["name"]] = entry
 
         else:
-            marker = None
-            while True:
-                res, entries = self.list_directory2(mdir, marker=marker)
-                if marker:
-                    entries.pop(0)  # first one is a repeat (the marker)
-                if not entries:
-                    # Only the marker was there, we've got them all.
-                    break
-                for entry in entries:
-                    if "id" in entry:  # GET /:account/jobs
-                        dirents[entry["id"]] = entry
-                    else:
-                        dirents[entry["name"]] = entry
-                if marker is None:
-                    # See if got all results in one go (quick out).
-                    result_set_size = int(res.get("result-set-size", 0))
-                    if len(entries) == result_set_size:
-                        break
-                if "id" in entries[-1]:
-                    marker = entries[-1]["id"]  # jobs
-                else:
-                    marker = entries[-1]["name"]
+            for entry in self.iter_ls(mdir, intern=True):
+                dirents[_dirent_key(entry)] = entry
 
+        if self.metadata_cache is not None:
+            self.metadata_cache.set(("ls", mdir), dirents,
+                                    size=len(dirents) + 1)
+            dirents = dict((k, dict(v)) for k, v in dirents.items())
         return dirents
 
+    def iter_ls(self, mdir, marker=None, intern=False):
+        """Generate the entries of a directory, as each page (one
+        ListDirectory request) arrives.
+
+        Unlike `ls` this doesn't build the whole listing in memory, so it is
+        appropriate for huge directories. Entries are generated in Manta's
+        listing order (by name).
+
+        @param mdir {str} A manta directory, e.g. '/trent/stor/a-dir'.
+        @param marker {str} Optional. Resume a listing *after* the entry
+            with this name, e.g. the name of the last dirent handled by an
+            earlier, interrupted listing.
+        @param intern {bool} Optional. Default false. See `list_directory2`.
+        @returns {generator} of directory entries (dirents).
+        """
+        first_page = marker is None
+        while True:
+            res, entries = self._list_directory_stream(mdir,
+                                                       marker=marker,
+                                                       intern=intern)
+            count = 0
+            last_key = None
+            with entries:
+                for i, entry in enumerate(entries):
+                    key = _dirent_key(entry)
+                    if i == 0 and key == marker:
+                        # The listing starts *at* the marker, which we've
+                        # had. (It may be gone, e.g. if deleted while
+                        # listing.)
+                        continue
+                    count += 1
+                    last_key = key
+                    yield entry
+            if not count:
+                # Only the marker was there, we've got them all.
+                break
+            if first_page:
+                # See if got all results in one go (quick out).
+                first_page = False
+                result_set_size = int(res.get("result-set-size", 0))
+                if count == result_set_size:
+                    break
+            marker = last_key
+
+    def _iter_ls_pages(self, mdir, retries=0):
+        """Generate the entries of a directory a page (a list of dirents)
+        at a time. Unlike with `iter_ls`, no connection is held while the
+        caller handles a page, and each ListDirectory is retried on a
+        transient error.
+
+        @raises {MantaResourceNotFoundError} If `mdir` doesn't exist.
+        """
+        marker = None
+        while True:
+            try:
+                res, entries = _retry(retries, self.list_directory2, mdir,
+                                      marker=marker, intern=True)
+            except errors.MantaAPIError:
+                _, ex, _ = sys.exc_info()
+                if getattr(ex, 'code', None) == 'ResourceNotFound':
+                    raise errors.MantaResourceNotFoundError(
+                        "%s: no such directory" % mdir)
+                raise
+            if entries and marker is not None and (
+                    _dirent_key(entries[0]) == marker):
+                entries = entries[1:]
+            if not entries:
+                break
+            yield entries
+            if marker is None and (
+                    len(entries) == int(res.get("result-set-size", 0))):
+                break
+            marker = _dirent_key(entries[-1])
+
     def mkdir(self, mdir, parents=False):
         """Make a directory.
 
@@ -751,14 +2034,16 @@ class MantaClient(RawMantaClient):
 
         @param mdir {str} A manta path, e.g. '/trent/stor/mydir'.
         @param parents {bool} Optional. Default false. Like 'mkdir -p', this
-            will create parent dirs as necessary.
+            will create parent dirs as necessary. Directories this client
+            has already made (or seen) are remembered, so making them, or
+            their subdirs, again doesn't check each parent with Manta.
         """
         assert mdir.startswith('/'), "%s: invalid manta path" % mdir
         parts = mdir.split('/')
         assert len(parts) > 3, "%s: cannot create top-level dirs" % mdir
         if not parents:
             self.put_directory(mdir)
-        else:
+        elif not self._is_known_dir(mdir):
             # Find the first non-existant dir: binary search. Because
             # PutDirectory doesn't error on 'mkdir .../already-exists' we
             # don't have a way to detect a miss on `start`. So basically we
@@ -781,6 +2066,10 @@ class MantaClient(RawMantaClient):
             #       i=7 -> d: /trent/stor/builds/a/b/c
             end = len(parts) + 1
             start = 3  # Index of the first possible dir to create.
+            for idx in range(len(parts) - 1, start, -1):
+                if self._is_known_dir('/'.join(parts[:idx])):
+                    start = idx
+                    break
             while start < end - 1:
                 idx = int((end - start) // 2 + start)
                 d = '/'.join(parts[:idx])
@@ -800,6 +2089,487 @@ class MantaClient(RawMantaClient):
                 d = '/'.join(parts[:i])
                 self.put_directory(d)
 
+    def mkdirs(self, mdirs, concurrency=None):
+        """Make the given directories, and their parent dirs as necessary,
+        i.e. 'mkdir -p' on each of them.
+
+        The directories (including parents) are made a level of the tree at
+        a time, shallowest first, with the directories of one level made
+        concurrently. Directories this client already knows of are skipped.
+
+        @param mdirs {iterable} Manta directory paths, e.g. all the
+            directories of a tree about to be uploaded.
+        @param concurrency {int} Optional. The max number of concurrent
+            PutDirectory requests. Default is `DEFAULT_CONCURRENCY`.
+        """
+        levels = {}
+        for mdir in mdirs:
+            assert mdir.startswith('/'), "%s: invalid manta path" % mdir
+            parts = mdir.rstrip('/').split('/')
+            assert len(parts) > 3, "%s: cannot create top-level dirs" % mdir
+            for idx in range(4, len(parts) + 1):
+                levels.setdefault(idx, set()).add('/'.join(parts[:idx]))
+
+        executor = ThreadPoolExecutor(concurrency or DEFAULT_CONCURRENCY)
+        try:
+            for idx in sorted(levels):
+                futures = [executor.submit(self.put_directory, d)
+                           for d in sorted(levels[idx])
+                           if not self._is_known_dir(d)]
+                for future in futures:
+                    future.result()
+        finally:
+            executor.shutdown(wait=True)
+
+    def rmr(self, mpath, concurrency=None, retries=None, callback=None):
+        """Remove the given directory and everything under it, or the given
+        object, like 'rm -r'.
+
+        Directory listings are streamed and the objects in them deleted
+        concurrently. Each directory is deleted as soon as it is empty.
+        Requests failing with a transient error (see `DEFAULT_RETRIES`) are
+        retried. Other failures don't stop the removal: they are returned,
+        and the directories holding a path that failed are left in place.
+
+        @param mpath {str} A manta path, e.g. '/trent/stor/mydir'.
+        @param concurrency {int} Optional. The max number of concurrent
+            deletes (and, separately, listings). Default is
+            `DEFAULT_CONCURRENCY`.
+        @param retries {int} Optional. The max number of retries for a
+            request failing with a transient error. Default is
+            `DEFAULT_RETRIES`.
+        @param callback {callable} Optional. Called (from a worker thread)
+            as `callback(mpath, error)` for each removed path, with `error`
+            None, and for each path that couldn't be removed or listed.
+        @returns {list} The `(mpath, error)` for each failure. Empty if
+            everything was removed.
+        @raises {MantaResourceNotFoundError} If `mpath` doesn't exist.
+        """
+        if retries is None:
+            retries = DEFAULT_RETRIES
+        if self.type(mpath) != "directory":
+            try:
+                _retry(retries, self.delete_object, mpath)
+            except errors.MantaAPIError:
+                _, ex, _ = sys.exc_info()
+                if getattr(ex, 'code', None) == 'ResourceNotFound':
+                    raise errors.MantaResourceNotFoundError(
+                        "%s: no such object or directory" % mpath)
+                if callback:
+                    callback(mpath, ex)
+                return [(mpath, ex)]
+            if callback:
+                callback(mpath, None)
+            return []
+        remover = _TreeRemover(self, concurrency or DEFAULT_CONCURRENCY,
+                               retries, callback)
+        return remover.run(mpath)
+
+    def cpr(self, src, dst, concurrency=None, retries=None, callback=None):
+        """Copy the given directory tree, or object, like 'cp -R'. Objects
+        are copied with snaplinks, so this doesn't copy any data.
+
+        The source tree is walked concurrently (see `walk`) while, on a pool
+        of threads, each destination directory is made ahead of its
+        subdirectories and objects, and the objects are linked. Requests
+        (including the listings) failing with a transient error are
+        retried. Other failures don't stop the copy: they are returned, and
+        nothing under a directory that couldn't be listed or made is
+        copied.
+
+        @param src {str} The manta path of the directory (or object) to
+            copy, e.g. '/trent/stor/adir'.
+        @param dst {str} The manta path to copy it to, e.g.
+            '/trent/stor/bdir' to copy '/trent/stor/adir/foo.txt' to
+            '/trent/stor/bdir/foo.txt'. Its parent dirs are made as
+            necessary.
+        @param concurrency {int} Optional. The max number of concurrent
+            requests. Default is `DEFAULT_CONCURRENCY`.
+        @param retries {int} Optional. The max number of retries for a
+            request failing with a transient error. Default is
+            `DEFAULT_RETRIES`.
+        @param callback {callable} Optional. Called, possibly from a worker
+            thread, as `callback(src_path, dst_path, error)` for each
+            directory made and object linked, with `error` None, and for
+            each failure.
+        @returns {list} The `(src_path, error)` for each failure. Empty if
+            everything was copied.
+        @raises {MantaResourceNotFoundError} If `src` doesn't exist.
+        """
+        return self._copy_tree(src, dst, False, concurrency, retries,
+                               callback)
+
+    def mv(self, src, dst, concurrency=None, retries=None, callback=None):
+        """Move the given directory tree, or object. This is `cpr` followed
+        by deleting the source.
+
+        Each source object is deleted as soon as its snaplink at `dst` has
+        been made, and never before. So if a move is interrupted (or an
+        object fails to be linked), every object is still at the source or
+        already at the destination: re-running the same `mv` completes it.
+        The source directories are deleted, deepest first, once everything
+        has been moved out of them.
+
+        The arguments and return value are as for `cpr`. The `callback` is
+        also called as `callback(src_dir, None, error)` if a source
+        directory can't be deleted.
+        """
+        return self._copy_tree(src, dst, True, concurrency, retries,
+                               callback)
+
+    def _copy_tree(self, src, dst, move, concurrency, retries, callback):
+        """The engine for `cpr` (and `mv` if `move` is true)."""
+        src = src.rstrip('/')
+        dst = dst.rstrip('/')
+        concurrency = concurrency or DEFAULT_CONCURRENCY
+        if retries is None:
+            retries = DEFAULT_RETRIES
+        failures = []
+        lock = threading.Lock()
+
+        def report(a, b, ex):
+            if ex is not None:
+                log.debug("could not %s %s to %s: %s",
+                          "move" if move else "copy", a, b, ex)
+                with lock:
+                    failures.append((a, ex))
+            if callback:
+                callback(a, b, ex)
+
+        def link(a, b):
+            try:
+                _retry(retries, self.put_snaplink, b, a)
+                if move:
+                    try:
+                        _retry(retries, self.delete_object, a)
+                    except errors.MantaAPIError:
+                        _, ex, _ = sys.exc_info()
+                        # Already deleted by an earlier, failed try.
+                        if getattr(ex, 'code', None) != 'ResourceNotFound':
+                            raise
+            except Exception:
+                _, ex, _ = sys.exc_info()
+                report(a, b, ex)
+            else:
+                report(a, b, None)
+
+        src_type = self.type(src)
+        if src_type is None:
+            raise errors.MantaResourceNotFoundError(
+                "%s: no such object or directory" % src)
+        elif src_type != "directory":
+            link(src, dst)
+            return failures
+
+        self.mkdirp(dst)
+        report(src, dst, None)
+        executor = ThreadPoolExecutor(concurrency)
+        # At most `2 * concurrency` links are queued, to hold back the walk.
+        slots = threading.Semaphore(2 * concurrency)
+
+        def link_in_slot(a, b):
+            try:
+                link(a, b)
+            finally:
+                slots.release()
+
+        src_dirs = []
+        mkdirs = {}  # src dir -> future for making its dst dir
+        try:
+            for dirpath, dirents, objents in self.walk(
+                    src, concurrency=concurrency, ordered=False,
+                    retries=retries,
+                    onerror=lambda d, ex: report(d, dst + d[len(src):], ex)):
+                dst_dir = dst + dirpath[len(src):]
+                if dirpath != src:
+                    try:
+                        mkdirs.pop(dirpath).result()
+                    except Exception:
+                        _, ex, _ = sys.exc_info()
+                        report(dirpath, dst_dir, ex)
+                        dirents[:] = []
+                        continue
+                    report(dirpath, dst_dir, None)
+                src_dirs.append(dirpath)
+                for dirent in dirents:
+                    mkdirs[ujoin(dirpath, dirent["name"])] = executor.submit(
+                        _retry, retries, self.put_directory,
+                        ujoin(dst_dir, dirent["name"]))
+                for objent in objents:
+                    slots.acquire()
+                    executor.submit(link_in_slot,
+                                    ujoin(dirpath, objent["name"]),
+                                    ujoin(dst_dir, objent["name"]))
+        finally:
+            executor.shutdown(wait=True)
+
+        if move:
+            # Leave the dirs holding anything that couldn't be moved.
+            keep = set()
+            for mpath, _ in failures:
+                while len(mpath) > len(src):
+                    keep.add(mpath)
+                    mpath = udirname(mpath)
+                keep.add(src)
+            levels = {}
+            for mdir in src_dirs:
+                if mdir not in keep:
+                    levels.setdefault(mdir.count('/'), []).append(mdir)
+
+            def rmdir(mdir):
+                try:
+                    _retry(retries, self.delete_directory, mdir)
+                except Exception:
+                    _, ex, _ = sys.exc_info()
+                    report(mdir, None, ex)
+
+            executor = ThreadPoolExecutor(concurrency)
+            try:
+                for depth in sorted(levels, reverse=True):
+                    wait([executor.submit(rmdir, d) for d in levels[depth]])
+            finally:
+                executor.shutdown(wait=True)
+        return failures
+
+    def put_tree(self,
+                 path,
+                 mdir,
+                 concurrency=None,
+                 retries=None,
+                 max_bytes_in_flight=None,
+                 content_type=None,
+                 durability_level=None,
+                 order="largest",
+                 callback=None):
+        """Upload the given local directory tree, like 'cp -r PATH MDIR'.
+
+        The local tree is scanned, then the Manta directories are made (see
+        `mkdirs`) and the files uploaded on a pool of threads. Requests
+        failing with a transient error are retried. Other failures don't
+        stop the upload: they are returned.
+
+        @param path {str} A local directory.
+        @param mdir {str} The manta directory to upload it to, e.g.
+            '/trent/stor/adir' to upload "PATH/foo.txt" to
+            '/trent/stor/adir/foo.txt'. Its parent dirs are made as
+            necessary.
+        @param concurrency {int} Optional. The max number of concurrent
+            uploads. Default is `DEFAULT_CONCURRENCY`. Note that requests
+            wait for a free connection if this is more than the client's
+            `pool_size`.
+        @param retries {int} Optional. The max number of retries for a
+            request failing with a transient error. Default is
+            `DEFAULT_RETRIES`.
+        @param max_bytes_in_flight {int} Optional. The max total size of
+            the files being uploaded at once (a file larger than this is
+            uploaded on its own). By default only `concurrency` limits the
+            uploads. Set it with a transport that doesn't stream request
+            bodies (e.g. `Httplib2Transport`), which holds each file being
+            uploaded in memory.
+        @param content_type {str} Optional. The content type for all the
+            files. By default it is guessed from each file's name.
+        @param durability_level {int} Optional. See `put_object`.
+        @param order {str} Optional. The order in which to upload the
+            files. "largest" (the default) is largest first, so that big
+            uploads don't trail on after all the rest. "interleave"
+            alternates between the largest and smallest remaining files,
+            to mix bandwidth-bound and round-trip-bound uploads. None is
+            the order of the local directory walk.
+        @param callback {callable} Optional. Called (from a worker thread)
+            as `callback(file_path, mpath, error, stats)` after each file
+            is uploaded, with `error` None, or fails. `stats` is a dict
+            with the progress so far: "files_done", "files_total",
+            "bytes_done", "bytes_total", "elapsed" (seconds) and
+            "bytes_per_sec".
+        @returns {list} The `(file_path, error)` for each failure. Empty
+            if everything was uploaded.
+        """
+        concurrency = concurrency or DEFAULT_CONCURRENCY
+        if retries is None:
+            retries = DEFAULT_RETRIES
+        mdir = mdir.rstrip('/')
+        mdirs = [mdir]
+        files = []  # (size, local path, manta path)
+        for dirpath, dirnames, filenames in os.walk(path):
+            reldir = os.path.relpath(dirpath, path)
+            mdirpath = mdir
+            if reldir != os.curdir:
+                mdirpath = ujoin(mdir, *reldir.split(os.sep))
+            for dirname in dirnames:
+                mdirs.append(ujoin(mdirpath, dirname))
+            for filename in filenames:
+                file_path = os.path.join(dirpath, filename)
+                files.append((os.path.getsize(file_path), file_path,
+                              ujoin(mdirpath, filename)))
+
+        if order is not None:
+            files.sort(key=itemgetter(0), reverse=True)
+        if order == "interleave":
+            files = [files[i // 2] if i % 2 == 0 else files[-(i // 2) - 1]
+                     for i in range(len(files))]
+        elif order not in (None, "largest"):
+            raise ValueError("invalid put_tree order: %r" % order)
+
+        self.mkdirp(mdir)
+        self.mkdirs(mdirs, concurrency=concurrency)
+
+        progress = _Progress(len(files), sum(f[0] for f in files))
+        failures = []
+        lock = threading.Lock()
+        budget = max_bytes_in_flight and _ByteBudget(max_bytes_in_flight)
+
+        def upload(size, file_path, mpath):
+            try:
+                _retry(retries, self.put_object, mpath,
+                       path=file_path,
+                       content_type=(content_type or
+                                     mimetypes.guess_type(file_path)[0] or
+                                     "application/octet-stream"),
+                       durability_level=durability_level)
+            except Exception:
+                _, ex, _ = sys.exc_info()
+                log.debug("could not upload %s to %s: %s", file_path, mpath,
+                          ex)
+                with lock:
+                    failures.append((file_path, ex))
+                stats = progress.add(0)
+            else:
+                ex = None
+                stats = progress.add(size)
+            finally:
+                if budget:
+                    budget.release(size)
+            if callback:
+                callback(file_path, mpath, ex, stats)
+
+        executor = ThreadPoolExecutor(concurrency)
+        futures = []
+        try:
+            for f in files:
+                if budget:
+                    budget.acquire(f[0])
+                futures.append(executor.submit(upload, *f))
+            wait(futures)
+        finally:
+            # Don't start any more uploads if interrupted.
+            for future in futures:
+                future.cancel()
+            executor.shutdown(wait=True)
+        return failures
+
+    def get_tree(self,
+                 mdir,
+                 path,
+                 concurrency=None,
+                 retries=None,
+                 max_bytes_in_flight=None,
+                 parallel=None,
+                 resume=False,
+                 callback=None):
+        """Download the given Manta directory tree, like 'cp -r MDIR PATH'.
+
+        The tree is walked concurrently (see `walk`) while its objects are
+        downloaded, each streamed straight to its file, on a pool of
+        threads. Local dirs are made as the walk reaches them. Requests
+        (including the listings) failing with a transient error are
+        retried. Other failures don't stop the download: they are returned,
+        and nothing under a directory that couldn't be listed is
+        downloaded.
+
+        @param mdir {str} A manta directory, e.g. '/trent/stor/adir'.
+        @param path {str} The local directory to download it to, e.g.
+            "bdir" to download '/trent/stor/adir/foo.txt' to
+            "bdir/foo.txt". It is made if necessary.
+        @param concurrency {int} Optional. The max number of concurrent
+            downloads. Default is `DEFAULT_CONCURRENCY`.
+        @param retries {int} Optional. The max number of retries for a
+            request failing with a transient error. Default is
+            `DEFAULT_RETRIES`.
+        @param max_bytes_in_flight {int} Optional. The max total size of
+            the objects being downloaded at once (an object larger than
+            this is downloaded on its own). By default only `concurrency`
+            limits the downloads.
+        @param parallel {int} Optional. See `get`.
+        @param resume {bool} Optional. Default false. See `get`. With this
+            a re-run of an interrupted `get_tree` continues the partial
+            downloads.
+        @param callback {callable} Optional. Called (from a worker thread)
+            as `callback(mpath, file_path, error, stats)` after each object
+            is downloaded, with `error` None, or fails (including a
+            directory failing to be listed). `stats` is a dict with the
+            progress so far, as for `put_tree`. The totals grow as the walk
+            finds more objects.
+        @returns {list} The `(mpath, error)` for each failure. Empty if
+            everything was downloaded.
+        """
+        concurrency = concurrency or DEFAULT_CONCURRENCY
+        if retries is None:
+            retries = DEFAULT_RETRIES
+        mdir = mdir.rstrip('/')
+        progress = _Progress()
+        failures = []
+        lock = threading.Lock()
+        # At most `2 * concurrency` downloads are queued, to hold back the
+        # walk.
+        slots = threading.Semaphore(2 * concurrency)
+        budget = max_bytes_in_flight and _ByteBudget(max_bytes_in_flight)
+
+        def download(mpath, file_path, size):
+            try:
+                _retry(retries, self.get, mpath, file_path,
+                       parallel=parallel, resume=resume)
+            except Exception:
+                _, ex, _ = sys.exc_info()
+                log.debug("could not download %s to %s: %s", mpath,
+                          file_path, ex)
+                with lock:
+                    failures.append((mpath, ex))
+                stats = progress.add(0)
+            else:
+                ex = None
+                stats = progress.add(size)
+            finally:
+                if budget:
+                    budget.release(size)
+                slots.release()
+            if callback:
+                callback(mpath, file_path, ex, stats)
+
+        def local_dir_for(dirpath):
+            reldir = dirpath[len(mdir) + 1:]
+            return os.path.join(path, *reldir.split('/'))
+
+        def list_failed(dirpath, ex):
+            log.debug("could not list %s: %s", dirpath, ex)
+            with lock:
+                failures.append((dirpath, ex))
+            if callback:
+                with progress.lock:
+                    stats = progress.stats()
+                callback(dirpath, local_dir_for(dirpath), ex, stats)
+
+        executor = ThreadPoolExecutor(concurrency)
+        try:
+            for dirpath, dirents, objents in self.walk(
+                    mdir, concurrency=concurrency, ordered=False,
+                    retries=retries, onerror=list_failed):
+                local_dir = local_dir_for(dirpath)
+                if not os.path.isdir(local_dir):
+                    os.makedirs(local_dir)
+                for objent in objents:
+                    size = objent.get("size", 0)
+                    progress.expect(size)
+                    slots.acquire()
+                    if budget:
+                        budget.acquire(size)
+                    executor.submit(download,
+                                    ujoin(dirpath, objent["name"]),
+                                    os.path.join(local_dir, objent["name"]),
+                                    size)
+        finally:
+            executor.shutdown(wait=True)
+        return failures
+
     def mkdirp(self, mdir):
         """A convenience wrapper around mkdir a la `mkdir -p`, i.e. always
         create parent dirs as necessary.
@@ -809,7 +2579,17 @@ class MantaClient(RawMantaClient):
         return self.mkdir(mdir, parents=True)
 
     def stat(self, mpath):
-        """Return available dirent info for the given Manta path."""
+        """Return available dirent info for the given Manta path.
+
+        This is a single HEAD request on the path, its response headers
+        mapped to the dirent fields of a directory listing (with an added
+        "contentType" for objects). The "mtime" only has a one-second
+        resolution. If the HEAD fails other than with a 404 (e.g. it isn't
+        allowed) this falls back to listing the parent directory.
+
+        Results, including "not found", are kept in the `metadata_cache`. A
+        cached listing of the parent directory is used if there is one.
+        """
         parts = mpath.split('/')
         if len(parts) == 0:
             raise errors.MantaError("cannot stat empty manta path: %r" % mpath)
@@ -818,12 +2598,33 @@ class MantaClient(RawMantaClient):
                                     mpath)
         mparent = udirname(mpath)
         name = ubasename(mpath)
-        dirents = self.ls(mparent)
-        if name in dirents:
-            return dirents[name]
-        else:
+
+        dirent = self._cache_get(("stat", mpath))
+        if dirent is _MISSING:
+            siblings = self._cache_get(("ls", mparent))
+            if siblings is not _MISSING:
+                dirent = siblings.get(name)
+        if dirent is _MISSING:
+            dirent = self._stat(mpath, mparent, name)
+            if self.metadata_cache is not None:
+                self.metadata_cache.set(("stat", mpath), dirent)
+        if dirent is None:
             raise errors.MantaResourceNotFoundError(
                 "%s: no such object or directory" % mpath)
+        return dict(dirent)
+
+    def _stat(self, mpath, mparent, name):
+        """Uncached `stat`. Returns None if the path doesn't exist."""
+        log.debug('HEAD %r (stat)', mpath)
+        res, content = self._request(mpath, "HEAD")
+        if res["status"] == "200":
+            return _dirent_from_head(name, res)
+        elif res["status"] == "404":
+            return None
+        log.debug('HEAD %r failed (status %s), list parent dir', mpath,
+                  res["status"])
+
+        return self.ls(mparent).get(name)
 
     def type(self, mpath):
         """Return the manta type for the given manta path.
@@ -838,11 +2639,211 @@ class MantaClient(RawMantaClient):
             return None
         except errors.MantaAPIError:
             _, ex, _ = sys.exc_info()
-            if ex.code in ('ResourceNotFound', 'DirectoryDoesNotExist'):
+            if getattr(ex, 'code', None) in ('ResourceNotFound',
+                                             'DirectoryDoesNotExist'):
                 return None
             else:
                 raise
 
+    def add_job_inputs_from(self,
+                            job_id,
+                            keys,
+                            batch_size=None,
+                            retries=None,
+                            end=False):
+        """Add the keys from the given iterable (e.g. a generator listing
+        them) as inputs to a job, in batches (AddJobInputs requests) sent
+        as the keys are produced.
+
+        Batches are sent from a background thread, so producing the next
+        batch overlaps with sending the last, and the job starts on the
+        first inputs before the last are produced. At most two batches are
+        queued. A batch failing with a transient error is retried (which
+        may add some of its keys twice, if the failed request was in fact
+        handled). Any other failure stops the adding and is raised.
+
+        @param job_id {str} The job id.
+        @param keys {iterable} The manta paths of the input objects.
+        @param batch_size {int} Optional. The max number of keys per
+            request. Default is `DEFAULT_JOB_INPUT_BATCH_SIZE`.
+        @param retries {int} Optional. The max number of retries for a
+            batch failing with a transient error. Default is
+            `DEFAULT_RETRIES`.
+        @param end {bool} Optional. Default false. If true, end the job's
+            input (`end_job_input`) after adding the keys.
+        @returns {int} The number of keys added.
+        """
+        batch_size = batch_size or DEFAULT_JOB_INPUT_BATCH_SIZE
+        if retries is None:
+            retries = DEFAULT_RETRIES
+        failures = []
+        counts = []
+        slots = threading.Semaphore(2)
+
+        def send(batch):
+            try:
+                if not failures:
+                    _retry(retries, self.add_job_inputs, job_id, batch)
+                    counts.append(len(batch))
+            except Exception:
+                failures.append(sys.exc_info()[1])
+            finally:
+                slots.release()
+
+        executor = ThreadPoolExecutor(1)
+        try:
+            batch = []
+            for key in keys:
+                batch.append(key)
+                if len(batch) >= batch_size:
+                    slots.acquire()
+                    if failures:
+                        break
+                    executor.submit(send, batch)
+                    batch = []
+            else:
+                if batch:
+                    slots.acquire()
+                    executor.submit(send, batch)
+        finally:
+            executor.shutdown(wait=True)
+        if failures:
+            raise failures[0]
+        if end:
+            _retry(retries, self.end_job_input, job_id)
+        return sum(counts)
+
+    def wait_for_job(self, job_id, timeout=None):
+        """Wait for the given job to be done, returning its final status
+        (as from `get_job`). See `wait_for_jobs`.
+
+        @param job_id {str} The job id.
+        @param timeout {float} Optional. Max number of seconds to wait.
+            By default this waits indefinitely.
+        @raises {MantaError} If `timeout` expires.
+        """
+        for job in self.wait_for_jobs([job_id], timeout=timeout):
+            return job
+
+    def wait_for_jobs(self, job_ids, timeout=None, concurrency=None):
+        """Wait for the given jobs to be done, generating each one's final
+        status (as from `get_job`) as it finishes.
+
+        Manta doesn't provide a way to block on a job, so this polls. A
+        job's status is first checked soon after the call (`JOB_POLL_MIN`)
+        and then less and less often (up to every `JOB_POLL_MAX` seconds,
+        with random jitter so that many waiters don't poll in step). When
+        waiting on several jobs, each check is one ListJobs request for the
+        running jobs, then concurrent GetJob requests for just the due jobs
+        that aren't running. Requests failing with a transient error are
+        retried.
+
+        @param job_ids {list} The job ids.
+        @param timeout {float} Optional. Max number of seconds to wait for
+            all of the jobs. By default this waits indefinitely.
+        @param concurrency {int} Optional. The max number of concurrent
+            GetJob requests. Default is `DEFAULT_CONCURRENCY`.
+        @returns {generator} of job status dicts.
+        @raises {MantaError} If `timeout` expires.
+        """
+        return _JobWaiter(self, job_ids, timeout, concurrency).wait()
+
+    def tail_job_output(self,
+                        job_id,
+                        concurrency=None,
+                        retries=None,
+                        fetch=True,
+                        timeout=None):
+        """Generate a job's output keys as they appear, while the job is
+        still running, until the job is done.
+
+        The job's output list is polled, soon after a new output appears
+        and less and less often while none do (as for `wait_for_jobs`).
+        Each poll streams the list and keeps only the keys past those
+        already seen.
+        The content of new outputs is prefetched on up to `concurrency`
+        connections, so the outputs of early phases can be processed before
+        the job finishes. At most `2*concurrency` fetched outputs are held
+        in memory ahead of the caller. Requests failing with a transient
+        error are retried; any other failure is raised.
+
+        @param job_id {str} The job id.
+        @param concurrency {int} Optional. The max number of concurrent
+            output fetches. Default is `DEFAULT_CONCURRENCY`.
+        @param retries {int} Optional. The max number of retries for a
+            request failing with a transient error. Default is
+            `DEFAULT_RETRIES`.
+        @param fetch {bool} Optional. Default true. If false, the output
+            contents are not fetched (and None is generated for them).
+        @param timeout {float} Optional. Max number of seconds to wait for
+            the job. By default this waits indefinitely.
+        @returns {generator} of (<key>, <content>) in output order, where
+            `content` is the output object's bytes.
+        @raises {MantaError} If `timeout` expires.
+        """
+        concurrency = concurrency or DEFAULT_CONCURRENCY
+        if retries is None:
+            retries = DEFAULT_RETRIES
+        start = time.time()
+        num_seen = 0  # the number of output keys already queued
+        queued = deque()  # keys not yet being fetched
+        fetches = deque()  # (key, future) in output order
+        done = False
+        next_poll = start
+        interval = JOB_POLL_MIN
+
+        def get_content(key):
+            return _retry(retries, self.get_object2, key)[1]
+
+        def get_new_outputs():
+            # A job's output list only grows, so the keys already seen are
+            # the first `num_seen` in it and are skipped as it streams in.
+            return list(islice(self.iter_job_output(job_id), num_seen, None))
+
+        executor = ThreadPoolExecutor(concurrency) if fetch else None
+        try:
+            while True:
+                now = time.time()
+                if not done and next_poll <= now:
+                    # Check the state first: once the job is done its
+                    # output list is complete.
+                    job = _retry(retries, self.get_job, job_id)
+                    done = job["state"] == "done"
+                    new = _retry(retries, get_new_outputs)
+                    num_seen += len(new)
+                    queued.extend(new)
+                    log.debug("job %s: %d new outputs", job_id, len(new))
+                    if new:
+                        interval = JOB_POLL_MIN
+                    else:
+                        interval = min(interval * JOB_POLL_BACKOFF,
+                                       JOB_POLL_MAX)
+                    next_poll = now + interval * random.uniform(0.8, 1.2)
+
+                while queued and len(fetches) < 2 * concurrency:
+                    key = queued.popleft()
+                    fetches.append((key, executor.submit(get_content, key)
+                                    if executor else None))
+                if fetches:
+                    key, future = fetches.popleft()
+                    yield key, (future.result() if future else None)
+                    continue
+                if done:
+                    break
+
+                if timeout is not None:
+                    if now - start >= timeout:
+                        raise errors.MantaError(
+                            "timed out waiting for job %s (%ds)" %
+                            (job_id, timeout))
+                    next_poll = min(next_poll, start + timeout)
+                time.sleep(max(next_poll - now, 0))
+        finally:
+            if executor is not None:
+                for _, future in fetches:
+                    future.cancel()
+                executor.shutdown(wait=True)
+
     def get_job(self, job_id):
         """GetJob
             https://apidocs.joyent.com/manta/api.html#GetJob
@@ -863,73 +2864,57 @@ class MantaClient(RawMantaClient):
             except ValueError:
                 raise errors.MantaError('invalid job data: %r' % content)
 
-    def get_job_input(self, job_id):
-        """GetJobInput
-            https://apidocs.joyent.com/manta/api.html#GetJobInput
-        with the added sugar that it will retrieve the archived job if it has
-        been archived, per:
+    def iter_job_input(self, job_id):
+        """GetJobInput, streamed (see `RawMantaClient.iter_job_input`)
+        with the added sugar that it will stream the archived job's keys if
+        it has been archived, per:
             https://apidocs.joyent.com/manta/jobs-reference.html#job-completion-and-archival
         """
-        try:
-            return RawMantaClient.get_job_input(self, job_id)
-        except errors.MantaAPIError as ex:
-            if ex.res.status != 404:
-                raise
-            # Job was archived, try to retrieve the archived data.
-            mpath = "/%s/jobs/%s/in.txt" % (self.account, job_id)
-            content = self.get_object(mpath)
-            keys = content.splitlines(False)
-            return keys
+        return self._iter_job_archived(
+            job_id, "in", RawMantaClient.iter_job_input)
 
-    def get_job_output(self, job_id):
-        """GetJobOutput
-            https://apidocs.joyent.com/manta/api.html#GetJobOutput
-        with the added sugar that it will retrieve the archived job if it has
-        been archived, per:
+    def iter_job_output(self, job_id):
+        """GetJobOutput, streamed (see `RawMantaClient.iter_job_output`)
+        with the added sugar that it will stream the archived job's keys if
+        it has been archived, per:
             https://apidocs.joyent.com/manta/jobs-reference.html#job-completion-and-archival
         """
-        try:
-            return RawMantaClient.get_job_output(self, job_id)
-        except errors.MantaAPIError as ex:
-            if ex.res.status != 404:
-                raise
-            # Job was archived, try to retrieve the archived data.
-            mpath = "/%s/jobs/%s/out.txt" % (self.account, job_id)
-            content = self.get_object(mpath)
-            keys = content.splitlines(False)
-            return keys
+        return self._iter_job_archived(
+            job_id, "out", RawMantaClient.iter_job_output)
 
-    def get_job_failures(self, job_id):
-        """GetJobFailures
-            https://apidocs.joyent.com/manta/api.html#GetJobFailures
-        with the added sugar that it will retrieve the archived job if it has
-        been archived, per:
+    def iter_job_failures(self, job_id):
+        """GetJobFailures, streamed (see `RawMantaClient.iter_job_failures`)
+        with the added sugar that it will stream the archived job's keys if
+        it has been archived, per:
             https://apidocs.joyent.com/manta/jobs-reference.html#job-completion-and-archival
         """
-        try:
-            return RawMantaClient.get_job_failures(self, job_id)
-        except errors.MantaAPIError as ex:
-            if ex.res.status != 404:
-                raise
-            # Job was archived, try to retrieve the archived data.
-            mpath = "/%s/jobs/%s/fail.txt" % (self.account, job_id)
-            content = self.get_object(mpath)
-            keys = content.splitlines(False)
-            return keys
+        return self._iter_job_archived(
+            job_id, "fail", RawMantaClient.iter_job_failures)
 
-    def get_job_errors(self, job_id):
-        """GetJobErrors
-            https://apidocs.joyent.com/manta/api.html#GetJobErrors
-        with the added sugar that it will retrieve the archived job if it has
-        been archived, per:
+    def iter_job_errors(self, job_id):
+        """GetJobErrors, streamed (see `RawMantaClient.iter_job_errors`)
+        with the added sugar that it will stream the archived job's errors
+        if it has been archived, per:
             https://apidocs.joyent.com/manta/jobs-reference.html#job-completion-and-archival
         """
+        return self._iter_job_archived(
+            job_id, "err", RawMantaClient.iter_job_errors, "job error entry")
+
+    def _iter_job_archived(self, job_id, name, iter_live, what=None):
+        """Stream one of the job's lists with `iter_live`, falling back to
+        the archived "/$account/jobs/$job_id/`name`.txt" object if the job
+        has been archived (its live list is a 404).
+
+        @param name {str} The list name: "in", "out", "fail" or "err".
+        @param iter_live {function} The `RawMantaClient.iter_job_*` method.
+        @param what {str} Optional. As for `_iter_job_live`.
+        @returns {_BodyIterator}
+        """
         try:
-            return RawMantaClient.get_job_errors(self, job_id)
+            return iter_live(self, job_id)
         except errors.MantaAPIError as ex:
             if ex.res.status != 404:
                 raise
-            # Job was archived, try to retrieve the archived data.
-            mpath = "/%s/jobs/%s/err.txt" % (self.account, job_id)
-            content = self.get_object(mpath)
-            return self._job_errors_from_content(content)
+            # Job was archived, stream the archived "$name.txt".
+            mpath = "/%s/jobs/%s/%s.txt" % (self.account, job_id, name)
+            return _iter_body_lines(self.get_object_stream(mpath), what)
@@ -32,7 +32,12 @@ class MantaAPIError(MantaError):
 
     def __init__(self, res, content):
         self.res = res
-        if res['content-type'] == 'application/json':
+        self.code = None
+        if not content:
+            # E.g. the response to a HEAD request has no body.
+            self.body = None
+            message = "HTTP status %s (no response body)" % res['status']
+        elif res['content-type'] == 'application/json':
             self.body = json.loads(content.decode('utf-8'))
             self.code = self.body["code"]
             message = "(%(code)s) %(message)s" % self.body
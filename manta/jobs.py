@@ -0,0 +1,140 @@
+# Copyright 2019 Joyent, Inc.  All rights reserved.
+"""Running many Manta jobs at once."""
+
+from __future__ import absolute_import
+import sys
+import logging
+
+from . import errors
+from .client import DEFAULT_RETRIES, _JobWaiter, _retry
+
+#---- globals
+
+log = logging.getLogger("manta.jobs")
+
+# Max number of a `JobManager`'s jobs running at once.
+DEFAULT_MAX_JOBS = 10
+
+#---- exports
+
+
+class JobManager(object):
+    """Run many Manta jobs, at most `max_jobs` of them at once, e.g.:
+
+        manager = manta.JobManager(client, max_jobs=20)
+        specs = ({"phases": [{"exec": "wc"}], "inputs": keys}
+                 for keys in key_groups)
+        for result in manager.run(specs):
+            print(result["id"], result["outputs"])
+
+    The running jobs are waited on together (see
+    `MantaClient.wait_for_jobs`), so they share status polling rather
+    than each being polled separately. New jobs join the same wait, so
+    starting one doesn't reset the polling backoff of the others. If
+    running is interrupted (an exception, including KeyboardInterrupt, or
+    the caller closing the generator) the outstanding jobs are cancelled.
+    A manager runs one set of jobs at a time.
+
+    @param client {MantaClient} The client to use.
+    @param max_jobs {int} Optional. The max number of jobs running at
+        once. Default is `DEFAULT_MAX_JOBS`.
+    @param gather {bool} Optional. Default true. If true, a finished job's
+        outputs, failures and errors are gathered into its result.
+    """
+
+    def __init__(self, client, max_jobs=None, gather=True):
+        self.client = client
+        self.max_jobs = max_jobs or DEFAULT_MAX_JOBS
+        self.gather = gather
+        self.running = {}  # job id -> job spec
+        self._in_run = False
+
+    def run(self, specs):
+        """Submit the given jobs, starting each when fewer than `max_jobs`
+        are running, and generate each job's result as it finishes.
+
+        @param specs {iterable} of job spec dicts, with keys: "phases"
+            (required, as for `create_job`), "inputs" (an iterable of
+            input keys, added as for `add_job_inputs_from`) and "name".
+        @returns {generator} of job result dicts, with keys: "id", "name",
+            "job" (the final status, as from `get_job`) and, if gathering,
+            "outputs", "failures" (lists of keys) and "errors" (a list of
+            error dicts).
+        @raises {MantaError} If this manager is already running jobs.
+        """
+        if self._in_run:
+            raise errors.MantaError("JobManager is already running jobs")
+        self._in_run = True
+        specs = iter(specs)
+        waiter = _JobWaiter(self.client)
+        jobs = waiter.wait()
+        try:
+            self._start_jobs(specs, waiter)
+            for job in jobs:
+                spec = self.running.pop(job["id"])
+                yield self._result(job, spec)
+                # Start the next jobs before waiting further.
+                self._start_jobs(specs, waiter)
+        except:
+            self.cancel()
+            raise
+        finally:
+            jobs.close()
+            self._in_run = False
+
+    def _start_jobs(self, specs, waiter):
+        while len(self.running) < self.max_jobs:
+            try:
+                spec = next(specs)
+            except StopIteration:
+                break
+            job_id = self.submit(spec)
+            self.running[job_id] = spec
+            waiter.add(job_id)
+
+    def submit(self, spec):
+        """Create a job and add its inputs (the job is cancelled if adding
+        them fails). This doesn't count towards `max_jobs`: `run` uses it.
+
+        @param spec {dict} A job spec. See `run`.
+        @returns {str} The job id.
+        """
+        job_id = self.client.create_job(spec["phases"], name=spec.get("name"))
+        log.debug("created job %s", job_id)
+        try:
+            self.client.add_job_inputs_from(job_id,
+                                            spec.get("inputs", []),
+                                            end=True)
+        except:
+            self._cancel_job(job_id)
+            raise
+        return job_id
+
+    def cancel(self):
+        """Cancel the running jobs.
+
+        @returns {list} The ids of the cancelled jobs.
+        """
+        job_ids = sorted(self.running)
+        for job_id in job_ids:
+            self._cancel_job(job_id)
+            del self.running[job_id]
+        return job_ids
+
+    def _cancel_job(self, job_id):
+        log.debug("cancel job %s", job_id)
+        try:
+            self.client.cancel_job(job_id)
+        except errors.MantaError:
+            _, ex, _ = sys.exc_info()
+            log.warning("could not cancel job %s: %s", job_id, ex)
+
+    def _result(self, job, spec):
+        job_id = job["id"]
+        result = {"id": job_id, "name": spec.get("name"), "job": job}
+        if self.gather:
+            for key, get in [("outputs", self.client.get_job_output),
+                             ("failures", self.client.get_job_failures),
+                             ("errors", self.client.get_job_errors)]:
+                result[key] = _retry(DEFAULT_RETRIES, get, job_id)
+        return result
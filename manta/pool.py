@@ -0,0 +1,249 @@
+# Copyright 2019 Joyent, Inc.  All rights reserved.
+"""HTTP connection pooling for the Manta client."""
+
+from __future__ import absolute_import
+import sys
+import logging
+import select
+import threading
+import time
+from contextlib import contextmanager
+
+from .errors import MantaError
+
+#---- Python version compat
+
+try:
+    # Python 3
+    from urllib.parse import urlparse
+except ImportError:
+    # Python 2
+    from urlparse import urlparse
+
+#---- globals
+
+log = logging.getLogger("manta.pool")
+
+# Max number of connections (checked out plus idle) per host.
+DEFAULT_POOL_SIZE = 10
+
+# Number of seconds an idle connection is kept around for reuse.
+DEFAULT_MAX_IDLE = 60
+
+#---- internal support stuff
+
+
+def sock_is_stale(sock):
+    """Return true if the given idle socket can no longer be reused.
+
+    An idle keep-alive connection should have nothing to read. If it is
+    readable then the server has either closed it (EOF) or sent data we
+    weren't expecting. Either way it is no good for another request.
+    """
+    try:
+        readable, _, _ = select.select([sock], [], [], 0)
+    except (ValueError, select.error, OSError, IOError):
+        # E.g. the socket has already been closed.
+        return True
+    return bool(readable)
+
+#---- exports
+
+
+class ConnectionPool(object):
+    """A bounded, thread-safe pool of reusable connections to a single host.
+
+    Connections are checked out with `get()` and must be returned with
+    `put()` (or use the `connection()` context manager). At most `maxsize`
+    connections exist at any one time: `get()` blocks when they are all
+    checked out.
+
+    @param factory {callable} Called with no arguments to create a new
+        connection.
+    @param maxsize {int} Optional. Max number of connections (checked out
+        plus idle). Default is `DEFAULT_POOL_SIZE`.
+    @param max_idle {float} Optional. Idle connections unused for longer
+        than this many seconds are closed instead of being reused. Default
+        is `DEFAULT_MAX_IDLE`.
+    @param check {callable} Optional. `check(conn)` is called on an idle
+        connection before it is handed out again. It should return false if
+        the connection is no longer usable.
+    @param close {callable} Optional. `close(conn)` is used to close
+        connections. Default is to call `conn.close()`.
+    """
+
+    def __init__(self,
+                 factory,
+                 maxsize=None,
+                 max_idle=None,
+                 check=None,
+                 close=None):
+        self.factory = factory
+        self.maxsize = maxsize or DEFAULT_POOL_SIZE
+        if max_idle is None:
+            max_idle = DEFAULT_MAX_IDLE
+        self.max_idle = max_idle
+        self._check = check
+        self._close = close
+        self._idle = []  # list of (last-used-time, conn), most recent last
+        self._num_out = 0
+        self._closed = False
+        self._cond = threading.Condition(threading.Lock())
+
+    def _close_conn(self, conn):
+        try:
+            if self._close:
+                self._close(conn)
+            else:
+                conn.close()
+        except Exception:
+            _, ex, _ = sys.exc_info()
+            log.debug("error closing pooled connection: %s", ex)
+
+    def _pop_expired(self):
+        """Remove and return idle connections past `max_idle`. The caller
+        must hold `self._cond`.
+        """
+        cutoff = time.time() - self.max_idle
+        expired = [c for t, c in self._idle if t < cutoff]
+        if expired:
+            self._idle = [(t, c) for t, c in self._idle if t >= cutoff]
+        return expired
+
+    def get(self, timeout=None):
+        """Check out a connection, creating one if necessary.
+
+        @param timeout {float} Optional. Max number of seconds to wait for
+            a connection if `maxsize` are already checked out. By default
+            this waits indefinitely.
+        @raises {MantaError} If `timeout` expires.
+        """
+        if timeout is not None:
+            deadline = time.time() + timeout
+        conn = None
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise MantaError("connection pool is closed")
+                expired = self._pop_expired()
+                if self._idle:
+                    _, conn = self._idle.pop()
+                    break
+                elif self._num_out + len(self._idle) < self.maxsize:
+                    break
+                elif timeout is not None:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        raise MantaError("timed out waiting for a pooled "
+                                         "connection (%d in use)" %
+                                         self._num_out)
+                    self._cond.wait(remaining)
+                else:
+                    self._cond.wait()
+            self._num_out += 1
+
+        for c in expired:
+            log.debug("close idle connection %r", c)
+            self._close_conn(c)
+        if conn is not None and self._check and not self._check(conn):
+            log.debug("close stale connection %r", conn)
+            self._close_conn(conn)
+            conn = None
+        if conn is None:
+            try:
+                conn = self.factory()
+            except:
+                with self._cond:
+                    self._num_out -= 1
+                    self._cond.notify()
+                raise
+        return conn
+
+    def put(self, conn, discard=False):
+        """Return a connection checked out with `get()` to the pool.
+
+        @param discard {bool} Optional. Default false. If true, the
+            connection is closed rather than kept for reuse. Use this when
+            a request on it failed part way.
+        """
+        with self._cond:
+            self._num_out -= 1
+            if not (discard or self._closed):
+                self._idle.append((time.time(), conn))
+                conn = None
+            self._cond.notify()
+        if conn is not None:
+            self._close_conn(conn)
+
+    @contextmanager
+    def connection(self):
+        """A context manager for checking out a connection. The connection
+        is discarded if the `with` block raises.
+        """
+        conn = self.get()
+        try:
+            yield conn
+        except:
+            self.put(conn, discard=True)
+            raise
+        else:
+            self.put(conn)
+
+    def clear(self):
+        """Close all idle connections."""
+        with self._cond:
+            idle, self._idle = self._idle, []
+        for _, conn in idle:
+            self._close_conn(conn)
+
+    def close(self):
+        """Close all idle connections and refuse further checkouts.
+        Connections currently checked out are closed when returned.
+        """
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self.clear()
+
+
+class PoolManager(object):
+    """Keep a `ConnectionPool` per (scheme, host, port).
+
+    @param factory {callable} `factory(scheme, host, port)` is called to
+        create a new connection for the given host.
+    @param ... Other keyword arguments are passed to each `ConnectionPool`.
+    """
+
+    def __init__(self, factory, **pool_kwargs):
+        self.factory = factory
+        self.pool_kwargs = pool_kwargs
+        self._pools = {}
+        self._lock = threading.Lock()
+
+    def pool(self, scheme, host, port=None):
+        key = (scheme, host, port)
+        with self._lock:
+            pool = self._pools.get(key)
+            if pool is None:
+                pool = self._pools[key] = ConnectionPool(
+                    lambda: self.factory(scheme, host, port),
+                    **self.pool_kwargs)
+        return pool
+
+    def pool_for_url(self, url):
+        u = urlparse(url)
+        return self.pool(u.scheme, u.hostname, u.port)
+
+    def clear(self):
+        """Close all idle connections in all pools."""
+        with self._lock:
+            pools = list(self._pools.values())
+        for pool in pools:
+            pool.clear()
+
+    def close(self):
+        with self._lock:
+            pools = list(self._pools.values())
+            self._pools = {}
+        for pool in pools:
+            pool.close()
@@ -0,0 +1,442 @@
+# Copyright 2019 Joyent, Inc.  All rights reserved.
+"""HTTP transports for the Manta client.
+
+A transport does the HTTP work for `RawMantaClient._request`. Two are
+provided:
+
+- `HTTPTransport`: the default, a thin layer over the standard library's
+  `http.client`. No caching, but request and response bodies can be
+  streamed.
+- `Httplib2Transport`: built on httplib2. It supports an on-disk HTTP
+  cache, but buffers complete request and response bodies in memory.
+  `MantaClient` uses it when given a `cache_dir`.
+"""
+
+from __future__ import absolute_import
+import sys
+import logging
+import io
+import os
+from os.path import exists
+from pprint import pformat
+import socket
+import ssl
+
+import httplib2
+
+from .pool import PoolManager, sock_is_stale
+
+#---- Python version compat
+
+try:
+    # Python 3
+    import http.client as httplib
+    from urllib.parse import urlparse
+    from urllib.parse import quote as urlquote
+    text_type = str
+except ImportError:
+    # Python 2
+    import httplib
+    from urlparse import urlparse
+    from urllib import quote as urlquote
+    text_type = unicode
+
+#---- globals
+
+log = logging.getLogger("manta.transport")
+
+# Size of chunks read from (or sent for) streamed bodies.
+CHUNK_SIZE = 65536
+
+#---- internal support stuff
+
+
+def _indent(s, indent='    '):
+    return indent + indent.join(s.splitlines(True))
+
+
+def _log_request(method, request_uri, host, headers, body):
+    if isinstance(body, bytes):
+        body_str = body.decode('utf-8', 'backslashreplace')
+    elif body is None:
+        body_str = '(none)'
+    elif isinstance(body, text_type):
+        body_str = body
+    else:
+        body_str = '(streamed)'
+    if len(body_str) > 1024:
+        body_str = body_str[:1021] + '...'
+    log.debug("req: %s %s\n%s", method, request_uri, '\n'.join([
+        _indent("host: " + host),
+        _indent("headers: " + pformat(headers)),
+        _indent("body: " + body_str)
+    ]))
+
+
+class MantaHttp(httplib2.Http):
+    def _request(self, conn, host, absolute_uri, request_uri, method, body,
+                 headers, redirections, cachekey):
+        if log.isEnabledFor(logging.DEBUG):
+            _log_request(method, request_uri, host, headers, body)
+
+        if 'location' in headers:
+            headers['location'] = urlquote(headers['location'])
+        res, content = httplib2.Http._request(self, conn, host, absolute_uri,
+                                              request_uri, method, body,
+                                              headers, redirections, cachekey)
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("res: %s %s\n%s", method, request_uri,
+                      _indent(pformat(res)))
+
+        return (res, content)
+
+
+def _close_http(http):
+    """Close all connections held by the given `httplib2.Http`."""
+    for conn in list(http.connections.values()):
+        conn.close()
+    http.connections.clear()
+
+
+def _check_http(http):
+    """Health check for a pooled `httplib2.Http`: drop any of its kept-alive
+    connections that the server has since closed, so that the next request
+    opens a fresh one rather than failing on a dead socket.
+    """
+    for key, conn in list(http.connections.items()):
+        if conn.sock is not None and sock_is_stale(conn.sock):
+            log.debug("drop stale connection to %s", key)
+            conn.close()
+            del http.connections[key]
+    return True
+
+
+def _check_conn(conn):
+    """Health check for a pooled `HTTPConnection`."""
+    return conn.sock is None or not sock_is_stale(conn.sock)
+
+
+class Response(dict):
+    """An HTTP response, compatible with the httplib2 `Response` used by
+    `Httplib2Transport`: a dict of lowercase header names to values (plus
+    a string "status" key) with `status` and `reason` attributes.
+    """
+
+    def __init__(self, res):
+        for k, v in res.getheaders():
+            k = k.lower()
+            if k in self:
+                self[k] += ', ' + v
+            else:
+                self[k] = v
+        self.status = res.status
+        self['status'] = str(res.status)
+        self.reason = res.reason
+        self.version = res.version
+
+
+#---- exports
+
+
+class ResponseBody(object):
+    """A read-only, file-like response body returned by `Transport.stream`.
+
+    Iterating over it yields chunks of up to `CHUNK_SIZE` bytes, each as
+    soon as it arrives (where the response supports `read1`). Read it to
+    the end (or `close()` it) to release the underlying connection.
+    """
+
+    def __init__(self, fp, release=None):
+        self._fp = fp
+        self._release = release
+
+    def _done(self, discard):
+        if self._release is not None:
+            release, self._release = self._release, None
+            release(discard)
+
+    def read(self, size=-1):
+        return self._read(size, False)
+
+    def read1(self, size=-1):
+        """Read up to `size` bytes, returning what is already available
+        rather than waiting for all of them (if the response allows).
+        """
+        return self._read(size, True)
+
+    def _read(self, size, read1):
+        if self._release is None and self._fp is None:
+            return b''
+        try:
+            if size is None or size < 0:
+                data = self._fp.read()
+            elif read1 and hasattr(self._fp, "read1"):
+                data = self._fp.read1(size)
+            else:
+                data = self._fp.read(size)
+        except:
+            self._done(True)
+            raise
+        if not data or size is None or size < 0:
+            self._done(False)
+        return data
+
+    def __iter__(self):
+        while True:
+            chunk = self.read1(CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+
+    def close(self):
+        """Release the connection. If the body was not fully read, the
+        connection is closed rather than reused.
+        """
+        if self._release is not None:
+            self._done(True)
+        self._fp = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+
+
+class Transport(object):
+    """A virtual base class for python-manta HTTP transports."""
+
+    def request(self, url, method="GET", body=None, headers=None):
+        """Make an HTTP request and read the whole response.
+
+        @param url {str} The full URL.
+        @param method {str} The HTTP method.
+        @param body {bytes|str|file-like} Optional. The request body.
+        @param headers {dict} Optional. Request headers.
+        @returns (res, content) {2-tuple} `res` is a dict-like response
+            object of (lowercase) headers with a `status` attribute.
+        """
+        raise NotImplementedError("this is a virtual base class")
+
+    def stream(self, url, method="GET", body=None, headers=None):
+        """Make an HTTP request, but do not read the response body.
+
+        @returns (res, body) {2-tuple} `body` is a `ResponseBody`.
+        """
+        raise NotImplementedError("this is a virtual base class")
+
+    def close(self):
+        """Close idle connections."""
+        pass
+
+
+class Httplib2Transport(Transport):
+    """A transport using a pool of httplib2 `Http` objects.
+
+    Streamed request bodies are read into memory and `stream()` returns an
+    in-memory body: httplib2 always reads the full response.
+
+    @param cache_dir {str} A dir to use for HTTP caching. It will be created
+        as needed.
+    @param disable_ssl_certificate_validation {bool} Default false.
+    @param pool_size {int} Optional. The max number of concurrent
+        connections per host. Default is `manta.pool.DEFAULT_POOL_SIZE`.
+    """
+
+    def __init__(self,
+                 cache_dir,
+                 disable_ssl_certificate_validation=False,
+                 pool_size=None):
+        self.cache_dir = cache_dir
+        self.disable_ssl_certificate_validation = disable_ssl_certificate_validation
+        self._file_cache = None
+        self._pools = PoolManager(self._new_http,
+                                  maxsize=pool_size,
+                                  check=_check_http,
+                                  close=_close_http)
+
+    def _new_http(self, scheme, host, port):
+        """Create a `MantaHttp` for the connection pool. Each pooled
+        `MantaHttp` only ever talks to the one host, so it holds a single
+        keep-alive connection. They all share the one HTTP cache.
+        """
+        if self._file_cache is None:
+            if not exists(self.cache_dir):
+                try:
+                    os.makedirs(self.cache_dir)
+                except OSError:
+                    # Possibly created by another thread in the interim.
+                    if not exists(self.cache_dir):
+                        raise
+            self._file_cache = httplib2.FileCache(self.cache_dir)
+        return MantaHttp(
+            self._file_cache,
+            disable_ssl_certificate_validation=self.
+            disable_ssl_certificate_validation)
+
+    def request(self, url, method="GET", body=None, headers=None):
+        if body is not None and hasattr(body, 'read'):
+            body = body.read()
+        elif body is not None and not isinstance(body, (bytes, text_type)):
+            body = b''.join(body)
+        with self._pools.pool_for_url(url).connection() as http:
+            return http.request(url, method, body, headers)
+
+    def stream(self, url, method="GET", body=None, headers=None):
+        res, content = self.request(url, method, body, headers)
+        return res, ResponseBody(io.BytesIO(content or b''))
+
+    def close(self):
+        self._pools.clear()
+
+
+class HTTPTransport(Transport):
+    """A thin transport using a pool of `http.client` connections.
+
+    Request bodies can be bytes, str (sent UTF-8 encoded), a file-like
+    object or an iterable of bytes chunks. The latter two are streamed: with
+    a known "Content-Length" if given in the headers, else with chunked
+    transfer-encoding.
+
+    @param disable_ssl_certificate_validation {bool} Default false.
+    @param ca_certs {str} Optional. Path to a file of CA certificates.
+    @param timeout {float} Optional. Socket timeout in seconds.
+    @param pool_size {int} Optional. The max number of concurrent
+        connections per host. Default is `manta.pool.DEFAULT_POOL_SIZE`.
+    """
+
+    def __init__(self,
+                 disable_ssl_certificate_validation=False,
+                 ca_certs=None,
+                 timeout=None,
+                 pool_size=None):
+        self.disable_ssl_certificate_validation = disable_ssl_certificate_validation
+        self.ca_certs = ca_certs
+        self.timeout = timeout
+        self._ssl_context = None
+        self._pools = PoolManager(self._new_conn,
+                                  maxsize=pool_size,
+                                  check=_check_conn)
+
+    def _new_conn(self, scheme, host, port):
+        if scheme == 'https':
+            if self._ssl_context is None:
+                ctx = ssl.create_default_context(cafile=self.ca_certs)
+                if self.disable_ssl_certificate_validation:
+                    ctx.check_hostname = False
+                    ctx.verify_mode = ssl.CERT_NONE
+                self._ssl_context = ctx
+            return httplib.HTTPSConnection(host,
+                                           port,
+                                           timeout=self.timeout,
+                                           context=self._ssl_context)
+        elif scheme == 'http':
+            return httplib.HTTPConnection(host, port, timeout=self.timeout)
+        else:
+            raise ValueError("unsupported URL scheme: %r" % scheme)
+
+    def _send(self, conn, method, request_uri, body, headers):
+        headers = dict(headers or {})
+        lower_names = dict((k.lower(), k) for k in headers)
+        if 'location' in lower_names:
+            k = lower_names['location']
+            headers[k] = urlquote(headers[k])
+
+        if isinstance(body, text_type):
+            body = body.encode('utf-8')
+        chunked = False
+        if isinstance(body, bytes):
+            if 'content-length' not in lower_names:
+                headers['Content-Length'] = str(len(body))
+        elif body is not None:
+            if hasattr(body, 'read'):
+                fp = body
+                body = iter(lambda: fp.read(CHUNK_SIZE), b'')
+            else:
+                body = iter(body)
+            if 'content-length' not in lower_names:
+                chunked = True
+                headers['Transfer-Encoding'] = 'chunked'
+        elif method in ('PUT', 'POST') and 'content-length' not in lower_names:
+            headers['Content-Length'] = '0'
+
+        conn.putrequest(method, request_uri, skip_accept_encoding=True)
+        for k, v in headers.items():
+            conn.putheader(k, v)
+        conn.endheaders()
+        if isinstance(body, bytes):
+            conn.send(body)
+        elif body is not None:
+            for chunk in body:
+                if isinstance(chunk, text_type):
+                    chunk = chunk.encode('utf-8')
+                if not chunk:
+                    continue
+                if chunked:
+                    conn.send(b'%x\r\n' % len(chunk) + chunk + b'\r\n')
+                else:
+                    conn.send(chunk)
+            if chunked:
+                conn.send(b'0\r\n\r\n')
+        return conn.getresponse()
+
+    def _start(self, url, method, body, headers):
+        """Send the request and read the response status and headers.
+
+        @returns (pool, conn, res) {3-tuple}
+        """
+        u = urlparse(url)
+        request_uri = u.path or '/'
+        if u.query:
+            request_uri += '?' + u.query
+        if log.isEnabledFor(logging.DEBUG):
+            _log_request(method, request_uri, u.netloc, headers, body)
+
+        pool = self._pools.pool_for_url(url)
+        replayable = body is None or isinstance(body, (bytes, text_type))
+        while True:
+            conn = pool.get()
+            reused = conn.sock is not None
+            try:
+                res = self._send(conn, method, request_uri, body, headers)
+            except (socket.error, httplib.HTTPException):
+                pool.put(conn, discard=True)
+                if reused and replayable:
+                    # The server likely closed the kept-alive connection
+                    # between requests. Retry on a fresh one.
+                    _, ex, _ = sys.exc_info()
+                    log.debug("retry %s %s on a new connection (%s)", method,
+                              request_uri, ex)
+                    continue
+                raise
+            except:
+                pool.put(conn, discard=True)
+                raise
+            break
+
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("res: %s %s\n%s", method, request_uri,
+                      _indent("%s %s\n%s" % (res.status, res.reason,
+                                             pformat(res.getheaders()))))
+        return pool, conn, res
+
+    def request(self, url, method="GET", body=None, headers=None):
+        pool, conn, res = self._start(url, method, body, headers)
+        try:
+            content = res.read()
+        except:
+            pool.put(conn, discard=True)
+            raise
+        pool.put(conn, discard=res.will_close)
+        return Response(res), content
+
+    def stream(self, url, method="GET", body=None, headers=None):
+        pool, conn, res = self._start(url, method, body, headers)
+
+        def release(discard):
+            pool.put(conn, discard=discard or res.will_close)
+
+        return Response(res), ResponseBody(res, release)
+
+    def close(self):
+        self._pools.clear()
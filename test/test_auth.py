@@ -5,12 +5,21 @@
 
 from __future__ import absolute_import
 
-from os.path import abspath, curdir
+from os.path import abspath, curdir, join
+import base64
+import os
+import shutil
+import socket
+import struct
+import tempfile
+import threading
+import time
 from cryptography.hazmat.backends import default_backend
 from cryptography.hazmat.primitives import serialization
 from cryptography.hazmat.primitives.hashes import SHA1, SHA256, SHA384, SHA512
 from cryptography.hazmat.primitives.asymmetric import padding, ec
-import base64
+from cryptography.hazmat.primitives.asymmetric.utils import decode_dss_signature
+from paramiko.message import Message
 
 import manta
 import unittest
@@ -137,6 +146,118 @@ def _sign_message(self, key_name, message='signme'):
 
     return
 
+
+class FakeSSHAgent(object):
+    """A minimal ssh-agent, serving the given private key files on a Unix
+    socket, for testing `manta.auth.SSHAgentClient`.
+
+    @param key_files {list} Private key paths (with a ".pub" alongside).
+    @param max_requests {int} Optional. If given, close each connection
+        after this many requests.
+    """
+
+    def __init__(self, key_files, max_requests=None):
+        self.keys = []
+        for path in key_files:
+            with open(path + '.pub') as f:
+                blob = base64.b64decode(f.read().split()[1])
+            with open(path, 'rb') as f:
+                priv = serialization.load_pem_private_key(
+                    f.read(), password=None, backend=default_backend())
+            self.keys.append((blob, priv))
+        self.max_requests = max_requests
+        self.num_connections = 0
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = join(self.tmpdir, "agent.sock")
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.bind(self.path)
+        self.sock.listen(5)
+        t = threading.Thread(target=self._accept)
+        t.daemon = True
+        t.start()
+
+    def close(self):
+        self.sock.close()
+        shutil.rmtree(self.tmpdir)
+
+    def _accept(self):
+        while True:
+            try:
+                conn, _ = self.sock.accept()
+            except (socket.error, OSError):
+                return
+            self.num_connections += 1
+            t = threading.Thread(target=self._serve, args=(conn,))
+            t.daemon = True
+            t.start()
+
+    def _recv(self, conn, n):
+        data = b''
+        while len(data) < n:
+            chunk = conn.recv(n - len(data))
+            if not chunk:
+                raise EOFError()
+            data += chunk
+        return data
+
+    def _serve(self, conn):
+        num_requests = 0
+        try:
+            while self.max_requests is None or num_requests < self.max_requests:
+                size = struct.unpack('>I', self._recv(conn, 4))[0]
+                response = self._handle(Message(self._recv(conn, size)))
+                conn.sendall(struct.pack('>I', len(response)) + response)
+                num_requests += 1
+        except EOFError:
+            pass
+        finally:
+            conn.close()
+
+    def _handle(self, msg):
+        res = Message()
+        kind = struct.unpack('B', msg.get_byte())[0]
+        if kind == 11:  # SSH2_AGENTC_REQUEST_IDENTITIES
+            res.add_byte(struct.pack('B', 12))
+            res.add_int(len(self.keys))
+            for blob, _ in self.keys:
+                res.add_string(blob)
+                res.add_string("test key")
+        elif kind == 13:  # SSH2_AGENTC_SIGN_REQUEST
+            blob = msg.get_binary()
+            data = msg.get_binary()
+            priv = dict(self.keys)[blob]
+            sig = Message()
+            if isinstance(priv, ec.EllipticCurvePrivateKey):
+                r, s = decode_dss_signature(priv.sign(data, ec.ECDSA(SHA256())))
+                rs = Message()
+                rs.add_mpint(r)
+                rs.add_mpint(s)
+                sig.add_string("ecdsa-sha2-nistp256")
+                sig.add_string(rs.asbytes())
+            else:
+                sig.add_string("ssh-rsa")
+                sig.add_string(priv.sign(data, padding.PKCS1v15(), SHA1()))
+            res.add_byte(struct.pack('B', 14))
+            res.add_string(sig.asbytes())
+        else:
+            res.add_byte(struct.pack('B', 5))  # SSH_AGENT_FAILURE
+        return res.asbytes()
+
+
+def _verify(self, key_name, message, signed):
+    """Verify a `Signer.sign()` result."""
+    key = KEYS[key_name]
+    self.assertEqual(signed[0], key["sighash"])
+    with open(key["file"], 'rb') as f:
+        vkey = serialization.load_pem_private_key(
+            f.read(), password=None, backend=default_backend()).public_key()
+    signature = base64.b64decode(signed[2])
+    hash_class = get_hash_class_from_algorithm(signed[0])
+    if key["type"] == "RSA":
+        vkey.verify(signature, message, padding.PKCS1v15(), hash_class())
+    else:
+        vkey.verify(signature, message, ec.ECDSA(hash_class()))
+
 #---- Test cases
 
 class PrivateKeyTestCase(unittest.TestCase):
@@ -168,4 +289,149 @@ class PrivateKeyTestCase(unittest.TestCase):
         _sign_message(self, "ECDSA-SHA256", message=b'signme')
 
 
-## TODO: add test cases for SSHAgentSigner and CLISigner.
+class SSHAgentTestCase(unittest.TestCase):
+    def setUp(self):
+        self.agent = FakeSSHAgent([KEYS["RSA-MD5"]["file"],
+                                   KEYS["ECDSA-MD5"]["file"]])
+
+    def tearDown(self):
+        self.agent.close()
+
+    def test_sign_and_verify(self):
+        client = manta.auth.SSHAgentClient(self.agent.path)
+        for key_name in ("RSA-MD5", "ECDSA-SHA256"):
+            signer = manta.SSHAgentSigner(KEYS[key_name]["fp"], agent=client)
+            _verify(self, key_name, b'signme', signer.sign('signme'))
+
+    def test_persistent_pipelined(self):
+        client = manta.auth.SSHAgentClient(self.agent.path)
+        signer = manta.SSHAgentSigner(KEYS["RSA-MD5"]["fp"], agent=client)
+        results = []
+
+        def sign(i):
+            message = ('message %d' % i).encode('utf-8')
+            results.append((message, signer.sign(message)))
+
+        threads = [threading.Thread(target=sign, args=(i,))
+                   for i in range(20)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(len(results), 20)
+        for message, signed in results:
+            _verify(self, "RSA-MD5", message, signed)
+        self.assertEqual(self.agent.num_connections, 1)
+
+    def test_reconnect(self):
+        self.agent.max_requests = 2
+        client = manta.auth.SSHAgentClient(self.agent.path)
+        signer = manta.SSHAgentSigner(KEYS["ECDSA-MD5"]["fp"], agent=client)
+        for i in range(5):
+            _verify(self, "ECDSA-MD5", b'signme', signer.sign(b'signme'))
+        self.assertTrue(self.agent.num_connections > 1)
+
+    def test_reset_while_reading(self):
+        client = manta.auth.SSHAgentClient(self.agent.path)
+        signer = manta.SSHAgentSigner(KEYS["RSA-MD5"]["fp"], agent=client)
+        signer.sign(b'warm up')  # load the key info
+
+        # Hold the first reader after it has read a response.
+        reading = threading.Event()
+        go = threading.Event()
+        recv_exactly = client._recv_exactly
+
+        def slow_recv_exactly(sock, n):
+            data = recv_exactly(sock, n)
+            if n > 4 and not reading.is_set():
+                reading.set()
+                go.wait(5)
+            return data
+        client._recv_exactly = slow_recv_exactly
+
+        results = {}
+
+        def sign(message):
+            results[message] = signer.sign(message)
+
+        t1 = threading.Thread(target=sign, args=(b'one',))
+        t1.start()
+        reading.wait(5)
+        # Reset the connection mid-read, then queue a request on a new one.
+        client.close()
+        t2 = threading.Thread(target=sign, args=(b'two',))
+        t2.start()
+        while not client._pending:
+            time.sleep(0.01)
+        go.set()
+        t1.join(5)
+        t2.join(5)
+        for message in (b'one', b'two'):
+            _verify(self, "RSA-MD5", message, results[message])
+
+    def test_no_agent(self):
+        client = manta.auth.SSHAgentClient(self.agent.path + '.nope')
+        signer = manta.SSHAgentSigner(KEYS["RSA-MD5"]["fp"], agent=client)
+        self.assertRaises(manta.MantaError, signer.sign, b'signme')
+
+
+class KeyIndexTestCase(unittest.TestCase):
+    """Test the "~/.ssh/*.pub" fingerprint index used by `load_ssh_key`."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.ssh_dir = join(self.tmpdir, ".ssh")
+        os.makedirs(self.ssh_dir)
+        for key_name in ("RSA-MD5", "ECDSA-MD5", "ECDSA-384-MD5"):
+            path = KEYS[key_name]["file"]
+            for ext in ("", ".pub"):
+                shutil.copy(path + ext, self.ssh_dir)
+        self.orig_home = os.environ.get("HOME")
+        os.environ["HOME"] = self.tmpdir
+        self.orig_index_path = manta.auth.KEY_INDEX_PATH
+        manta.auth.KEY_INDEX_PATH = join(self.tmpdir, "cache", "index.json")
+
+        # Count pub key reads.
+        self.fingerprinted = []
+        self.orig_fp = manta.auth.fingerprint_from_ssh_pub_key
+
+        def counting_fp(data):
+            self.fingerprinted.append(data)
+            return self.orig_fp(data)
+        manta.auth.fingerprint_from_ssh_pub_key = counting_fp
+
+    def tearDown(self):
+        manta.auth.fingerprint_from_ssh_pub_key = self.orig_fp
+        manta.auth.KEY_INDEX_PATH = self.orig_index_path
+        if self.orig_home is None:
+            del os.environ["HOME"]
+        else:
+            os.environ["HOME"] = self.orig_home
+        shutil.rmtree(self.tmpdir)
+
+    def test_index(self):
+        fp = KEYS["ECDSA-384-MD5"]["fp"]
+        info = manta.auth.load_ssh_key(fp)
+        self.assertEqual(info["priv_key_path"],
+                         join(self.ssh_dir, "id_ecdsa_384"))
+        self.assertEqual(info["algorithm"], "ecdsa-sha384")
+        self.assertTrue(os.path.exists(manta.auth.KEY_INDEX_PATH))
+
+        # Warm index: no pub keys are read.
+        self.fingerprinted = []
+        info2 = manta.auth.load_ssh_key(fp)
+        self.assertEqual(info2, info)
+        self.assertEqual(self.fingerprinted, [])
+
+    def test_invalidate_on_change(self):
+        fp = KEYS["RSA-MD5"]["fp"]
+        manta.auth.load_ssh_key(fp)
+        # Swap the RSA key's files with the ECDSA key's.
+        for ext in ("", ".pub"):
+            shutil.copy(join(self.ssh_dir, "id_ecdsa" + ext),
+                        join(self.ssh_dir, "id_rsa" + ext))
+        os.utime(join(self.ssh_dir, "id_rsa.pub"), (0, 0))
+        self.assertRaises(manta.MantaError, manta.auth.load_ssh_key, fp)
+
+
+## TODO: add test cases for CLISigner.
@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+# Copyright (c) 2019 Joyent, Inc.  All rights reserved.
+
+"""Test the python-manta metadata cache."""
+
+from __future__ import absolute_import
+
+import time
+import unittest
+
+from manta.cache import MetadataCache
+
+
+#---- Test cases
+
+class MetadataCacheTestCase(unittest.TestCase):
+    def test_get_set(self):
+        cache = MetadataCache()
+        self.assertEqual(cache.get("a"), None)
+        cache.set("a", None)
+        self.assertEqual(cache.get("a", "missing"), None)
+        cache.invalidate("a")
+        self.assertEqual(cache.get("a", "missing"), "missing")
+        stats = cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 2))
+        self.assertEqual(stats["invalidations"], 1)
+
+    def test_lru(self):
+        cache = MetadataCache(maxsize=10)
+        cache.set("a", 1, size=4)
+        cache.set("b", 2, size=4)
+        cache.get("a")
+        cache.set("c", 3, size=4)
+        self.assertEqual(cache.get("b"), None)
+        self.assertEqual((cache.get("a"), cache.get("c")), (1, 3))
+        cache.set("d", 4, size=11)
+        self.assertEqual(cache.get("d"), None)
+        stats = cache.stats()
+        self.assertEqual((stats["entries"], stats["size"]), (2, 8))
+        self.assertEqual(stats["evictions"], 1)
+
+    def test_ttl(self):
+        cache = MetadataCache(ttl=0.05)
+        cache.set("a", 1)
+        self.assertEqual(cache.get("a"), 1)
+        time.sleep(0.1)
+        self.assertEqual(cache.get("a"), None)
+        self.assertEqual(cache.stats()["expirations"], 1)
+
+    def test_invalidate_matching(self):
+        cache = MetadataCache()
+        for key in ["/a", "/a/b", "/ab"]:
+            cache.set(key, 1)
+        cache.invalidate_matching(lambda k: k == "/a" or k.startswith("/a/"))
+        self.assertEqual(cache.stats()["entries"], 1)
+        self.assertEqual(cache.get("/ab"), 1)
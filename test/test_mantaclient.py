@@ -5,18 +5,316 @@
 from __future__ import absolute_import
 from __future__ import print_function
 
+import base64
+import hashlib
+import io
+import json
+import os
 import re
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from operator import itemgetter
 from posixpath import dirname as udirname, basename as ubasename, join as ujoin
 
+from concurrent.futures import ThreadPoolExecutor, wait
+
 from common import *
 import manta
 
+try:
+    from urllib.parse import unquote
+except ImportError:
+    from urllib import unquote
+
 #---- globals
 
 TDIR = "tmp/test_mantaclient"
 
 #---- internal support stuff
 
+
+class FakeResponse(dict):
+    def __init__(self, status, headers=None):
+        dict.__init__(self, headers or {})
+        self.status = status
+        self["status"] = str(status)
+
+
+class FakeTransport(manta.transport.Transport):
+    """A transport that records requests and answers each with the
+    next of the given `(status, headers, content)` responses (or an empty
+    204 when they run out). Lets us test the client without a Manta.
+    """
+
+    def __init__(self, responses=None):
+        self.responses = list(responses or [])
+        self.requests = []
+
+    def request(self, url, method="GET", body=None, headers=None):
+        if body is not None and not isinstance(body, (bytes, str)):
+            body = b"".join(body)
+        self.requests.append((url, method, body, dict(headers or {})))
+        if self.responses:
+            status, res_headers, content = self.responses.pop(0)
+        else:
+            status, res_headers, content = 204, {}, b""
+        return FakeResponse(status, res_headers), content
+
+    def stream(self, url, method="GET", body=None, headers=None):
+        res, content = self.request(url, method, body, headers)
+        return res, manta.transport.ResponseBody(io.BytesIO(content))
+
+
+class ObjectTransport(FakeTransport):
+    """A fake transport serving a single object, with "Range" support."""
+
+    def __init__(self, data, etag="etag-1"):
+        FakeTransport.__init__(self)
+        self.data = data
+        self.etag = etag
+        self.fail_after = None  # Set to break off response bodies.
+
+    def stream(self, url, method="GET", body=None, headers=None):
+        res, content = self.request(url, method, body, headers)
+        content_fp = io.BytesIO(content)
+        if self.fail_after is None:
+            return res, manta.transport.ResponseBody(content_fp)
+        fail_after = self.fail_after
+
+        class BrokenIO(object):
+            def read(self, size=-1):
+                data = content_fp.read(
+                    min(size, fail_after - content_fp.tell()))
+                if not data:
+                    raise IOError("connection reset")
+                return data
+        return res, manta.transport.ResponseBody(BrokenIO())
+
+    def request(self, url, method="GET", body=None, headers=None):
+        self.requests.append((url, method, body, dict(headers or {})))
+        res_headers = {
+            "content-md5": base64.b64encode(
+                hashlib.md5(self.data).digest()).decode("utf-8"),
+            "content-length": str(len(self.data)),
+        }
+        if self.etag is not None:
+            res_headers["etag"] = self.etag
+        if headers.get("If-Match", self.etag) != self.etag:
+            return FakeResponse(412, {"content-type": "text/plain"}), b"x"
+        if method == "HEAD":
+            return FakeResponse(200, res_headers), b""
+        if "Range" in headers:
+            start, end = headers["Range"].split("=")[1].split("-")
+            end = int(end) if end else len(self.data) - 1
+            content = self.data[int(start):end + 1]
+            res_headers["content-length"] = str(len(content))
+            return FakeResponse(206, res_headers), content
+        return FakeResponse(200, res_headers), self.data
+
+
+class MemTransport(FakeTransport):
+    """A fake transport for an in-memory Manta, shared by the tree tests.
+
+    It handles listings, HEADs, GetObject, PutDirectory, PutObject,
+    PutSnapLink and deletes of the given `dirs` and `objects` (a dict
+    mapping path to content). The parents of these are added as dirs.
+    Successful deletes are recorded in `deleted`. Requests for a path in
+    `fail` get the next of its list of error statuses, until they run out.
+    """
+
+    codes = {403: "AuthorizationFailed", 500: "InternalError",
+             503: "ServiceUnavailable"}
+
+    def __init__(self, dirs=(), objects=None, fail=None):
+        FakeTransport.__init__(self)
+        self.dirs = set(dirs)
+        self.objects = dict(objects or {})
+        for path in list(self.dirs) + list(self.objects):
+            while udirname(path) != "/":
+                path = udirname(path)
+                self.dirs.add(path)
+        self.fail = dict(fail or {})
+        self.deleted = []
+        self.lock = threading.Lock()
+
+    def error(self, status, code=None):
+        code = code or self.codes[status]
+        return FakeResponse(status, {"content-type": "application/json"}), (
+            json.dumps({"code": code, "message": code}).encode("utf-8"))
+
+    def request(self, url, method="GET", body=None, headers=None):
+        path = unquote(url.split("?")[0][len("https://manta.example.com"):])
+        headers = dict(headers or {})
+        with self.lock:
+            self.requests.append((url, method, body, headers))
+            statuses = self.fail.get(path)
+            if statuses:
+                return self.error(statuses.pop(0))
+            if method == "PUT" and udirname(path) not in self.dirs:
+                return self.error(404, "DirectoryDoesNotExist")
+
+            if method == "GET" and path in self.dirs:
+                names = sorted(ubasename(p) for p in self.dirs
+                               if udirname(p) == path and p != path)
+                entries = [{"name": n, "type": "directory"} for n in names]
+                entries += [{"name": ubasename(p), "type": "object",
+                             "size": len(self.objects[p])}
+                            for p in sorted(self.objects)
+                            if udirname(p) == path]
+                content = b"".join(json.dumps(e).encode("utf-8") + b"\n"
+                                   for e in entries)
+                return FakeResponse(200, {
+                    "result-set-size": str(len(entries))
+                }), content
+            elif method == "HEAD" and path in self.dirs:
+                return FakeResponse(200, {
+                    "content-type": "application/x-json-stream; type=directory"
+                }), b""
+            elif method in ("GET", "HEAD") and path in self.objects:
+                data = self.objects[path]
+                return FakeResponse(200, {
+                    "content-type": "application/octet-stream",
+                    "content-length": str(len(data)),
+                    "content-md5": base64.b64encode(
+                        hashlib.md5(data).digest()).decode("utf-8"),
+                }), b"" if method == "HEAD" else data
+            elif method == "PUT" and "type=directory" in headers.get(
+                    "Content-Type", ""):
+                self.dirs.add(path)
+                return FakeResponse(204), b""
+            elif method == "PUT" and "type=link" in headers.get(
+                    "Content-Type", ""):
+                if headers["Location"] not in self.objects:
+                    return self.error(404, "SourceObjectNotFound")
+                self.objects[path] = self.objects[headers["Location"]]
+                return FakeResponse(204), b""
+            elif method == "PUT":
+                if not isinstance(body, bytes):
+                    body = b"".join(body)
+                self.objects[path] = body
+                return FakeResponse(204, {
+                    "computed-md5": base64.b64encode(
+                        hashlib.md5(body).digest()).decode("utf-8")
+                }), b""
+            elif method == "DELETE" and path in self.objects:
+                del self.objects[path]
+                self.deleted.append(path)
+                return FakeResponse(204), b""
+            elif method == "DELETE" and path in self.dirs:
+                if [p for p in list(self.dirs) + list(self.objects)
+                        if udirname(p) == path and p != path]:
+                    return self.error(400, "DirectoryNotEmpty")
+                self.dirs.remove(path)
+                self.deleted.append(path)
+                return FakeResponse(204), b""
+            return self.error(404, "ResourceNotFound")
+
+
+def mem_tree(top, depth, num_dirs, num_objects):
+    """Return the dirs and objects of a tree for `MemTransport`, with
+    `num_dirs` subdirs ("d0", ...) and `num_objects` objects ("obj0", ...)
+    in each dir, `depth` levels below `top`.
+    """
+    dirs = [top]
+    objects = {}
+    level = [top]
+    for i in range(depth + 1):
+        next_level = []
+        for d in level:
+            for j in range(num_objects):
+                objects["%s/obj%d" % (d, j)] = b""
+            if i < depth:
+                next_level += ["%s/d%d" % (d, j) for j in range(num_dirs)]
+        dirs += next_level
+        level = next_level
+    return dirs, objects
+
+
+class JobsTransport(FakeTransport):
+    """A fake transport for the status of jobs. Job `job_id` is done once
+    time `done_at[job_id]` has passed. Responses for GetJob of a job in
+    `fail` are popped from its list first. `outputs[job_id]` is a list of
+    (<time>, <key>) for the job's outputs, each appearing at its time, with
+    the key as content. Created jobs ("job0", "job1", ...) run for the
+    next of the given `durations`. Jobs in `queued` are not listed as
+    running.
+    """
+
+    def __init__(self, done_at, fail=None, outputs=None, durations=None):
+        FakeTransport.__init__(self)
+        self.done_at = done_at
+        self.fail = fail or {}
+        self.outputs = outputs or {}
+        self.durations = list(durations or [])
+        self.cancelled = []
+        self.queued = set()
+        self.lock = threading.Lock()
+
+    def request(self, url, method="GET", body=None, headers=None):
+        path = unquote(url.split("?")[0][len("https://manta.example.com"):])
+        with self.lock:
+            self.requests.append((url, method, body, dict(headers or {})))
+            if method == "POST":
+                if path == "/trent/jobs":
+                    job_id = "job%d" % len(self.done_at)
+                    self.done_at[job_id] = time.time() + self.durations.pop(0)
+                    return FakeResponse(201, {
+                        "location": "/trent/jobs/" + job_id
+                    }), b""
+                job_id = path.split("/")[3]
+                if path.endswith("/live/cancel"):
+                    self.cancelled.append(job_id)
+                    self.done_at[job_id] = time.time()
+                return FakeResponse(202 if path.endswith("/end") else 204), b""
+            if path.endswith(("/live/fail", "/live/err")):
+                return FakeResponse(200), b""
+            if "/stor/" in path:
+                return FakeResponse(200), path.encode("utf-8")
+            if path.endswith("/live/out"):
+                content = "".join(
+                    key + "\n"
+                    for t, key in self.outputs.get(path.split("/")[3], [])
+                    if t <= time.time())
+                return FakeResponse(200), content.encode("utf-8")
+            if path == "/trent/jobs":
+                content = "".join(
+                    json.dumps({"name": j, "type": "directory"}) + "\n"
+                    for j, t in sorted(self.done_at.items())
+                    if t > time.time() and j not in self.queued)
+                return FakeResponse(200), content.encode("utf-8")
+            job_id = path.split("/")[3]
+            if self.fail.get(job_id):
+                status, code = self.fail[job_id].pop(0)
+                return FakeResponse(status, {
+                    "content-type": "application/json"
+                }), json.dumps({"code": code, "message": code}).encode("utf-8")
+            done = self.done_at[job_id] <= time.time()
+        return FakeResponse(200), json.dumps({
+            "id": job_id, "state": "done" if done else "running"
+        }).encode("utf-8")
+
+
+class CountingSigner(manta.auth.Signer):
+    def __init__(self):
+        self.calls = []
+
+    def sign(self, s):
+        self.calls.append(s)
+        return ("rsa-sha1", "aa:bb", b"c2lnbmF0dXJl")
+
+    def get_algorithm_and_fingerprint(self):
+        return ("rsa-sha1", "aa:bb")
+
+
+def get_fake_client(responses=None, signer=None):
+    return manta.MantaClient("https://manta.example.com",
+                             "trent",
+                             signer=signer,
+                             transport=FakeTransport(responses))
+
 #---- Test cases
 #
 # We need to run these tests in order. We'll be creating a test area:
@@ -33,6 +331,7 @@ class MiscTestCase(MantaTestCase):
         self.assertTrue(manta.PrivateKeySigner)
         self.assertTrue(manta.SSHAgentSigner)
         self.assertTrue(manta.CLISigner)
+        self.assertTrue(manta.HTTPTransport)
         self.assertTrue(manta.MantaError)
         self.assertTrue(manta.MantaAPIError)
 
@@ -42,6 +341,1163 @@ class MiscTestCase(MantaTestCase):
         self.assertTrue(VERSION_RE.search(manta.__version__))
 
 
+class AuthCacheTestCase(unittest.TestCase):
+    """Offline tests for the Authorization header cache."""
+
+    def test_same_date_signed_once(self):
+        signer = CountingSigner()
+        client = get_fake_client(signer=signer)
+        date = "Thu, 01 Jan 2015 00:00:00 GMT"
+        for i in range(3):
+            client._request("/trent/stor/foo", headers={"Date": date})
+        self.assertEqual(signer.calls, [b"date: " + date.encode("utf-8")])
+        auths = set(r[3]["Authorization"] for r in client.transport.requests)
+        self.assertEqual(auths, set([
+            'Signature keyId="/trent/keys/aa:bb",algorithm="rsa-sha1",'
+            'signature="c2lnbmF0dXJl"']))
+
+    def test_new_date_signed_again(self):
+        signer = CountingSigner()
+        client = get_fake_client(signer=signer)
+        client._request("/trent/stor/foo", headers={"Date": "date 1"})
+        client._request("/trent/stor/foo", headers={"Date": "date 2"})
+        client.subuser = "bob"
+        client._request("/trent/stor/foo", headers={"Date": "date 2"})
+        self.assertEqual(len(signer.calls), 3)
+
+
+class SignURLTestCase(unittest.TestCase):
+    """Offline tests for `MantaClient.sign_url`."""
+
+    def test_sign_url(self):
+        signer = CountingSigner()
+        client = get_fake_client(signer=signer)
+        url = client.sign_url("/trent/stor/a b.txt", expires=1500000000)
+        self.assertEqual(
+            url, "https://manta.example.com/trent/stor/a%20b.txt"
+            "?algorithm=RSA-SHA1&expires=1500000000"
+            "&keyId=%2Ftrent%2Fkeys%2Faa%3Abb&signature=c2lnbmF0dXJl")
+        self.assertEqual(signer.calls, [
+            b"GET\nmanta.example.com\n/trent/stor/a%20b.txt\n"
+            b"algorithm=RSA-SHA1&expires=1500000000"
+            b"&keyId=%2Ftrent%2Fkeys%2Faa%3Abb"])
+        # Signing makes no requests.
+        self.assertEqual(client.transport.requests, [])
+
+    def test_method_and_role(self):
+        signer = CountingSigner()
+        client = get_fake_client(signer=signer)
+        client.role = "ops"
+        url = client.sign_url("/trent/stor/foo", method="put",
+                              expires=1500000000)
+        self.assertTrue(url.endswith("&role=ops&signature=c2lnbmF0dXJl"))
+        self.assertTrue(signer.calls[0].startswith(b"PUT\n"))
+
+    def test_default_expires(self):
+        client = get_fake_client(signer=CountingSigner())
+        url = client.sign_url("/trent/stor/foo")
+        expires = int(url.split("expires=")[1].split("&")[0])
+        self.assertTrue(expires > time.time() + 3000)
+
+
+class StreamingPutTestCase(unittest.TestCase):
+    """Offline tests for streaming `put_object` of a path or file."""
+
+    data = b"0123456789" * 20000
+    md5 = base64.b64encode(hashlib.md5(data).digest())
+
+    def test_seekable_file(self):
+        client = get_fake_client()
+        f = io.BytesIO(b"xx" + self.data)
+        f.seek(2)
+        client.put_object("/trent/stor/foo", file=f)
+        _, method, body, headers = client.transport.requests[0]
+        self.assertEqual(body, self.data)
+        self.assertEqual(headers["Content-Length"], str(len(self.data)))
+        self.assertEqual(headers["Content-MD5"], self.md5)
+
+    def test_content_length(self):
+        client = get_fake_client()
+        client.put_object("/trent/stor/foo", file=io.BytesIO(self.data),
+                          content_length=100)
+        _, method, body, headers = client.transport.requests[0]
+        self.assertEqual(body, self.data[:100])
+        self.assertEqual(headers["Content-Length"], "100")
+        self.assertEqual(
+            headers["Content-MD5"],
+            base64.b64encode(hashlib.md5(self.data[:100]).digest()))
+
+        self.assertRaises(manta.MantaError, client.put_object,
+                          "/trent/stor/foo", file=io.BytesIO(b"abc"),
+                          content_length=100)
+
+    def test_unseekable_file(self):
+        class Pipe(object):
+            def __init__(self, data):
+                self.f = io.BytesIO(data)
+
+            def read(self, size):
+                return self.f.read(size)
+
+        client = get_fake_client([
+            (204, {"computed-md5": self.md5.decode("utf-8")}, b""),
+            (204, {"computed-md5": "bogus"}, b"")])
+        client.put_object("/trent/stor/foo", file=Pipe(self.data))
+        _, method, body, headers = client.transport.requests[0]
+        self.assertEqual(body, self.data)
+        self.assertTrue("Content-Length" not in headers)
+        self.assertTrue("Content-MD5" not in headers)
+
+        self.assertRaises(manta.MantaError, client.put_object,
+                          "/trent/stor/foo", file=Pipe(self.data))
+
+
+class StreamingGetTestCase(unittest.TestCase):
+    """Offline tests for `get_object_stream`."""
+
+    data = b"0123456789" * 20000
+    md5 = base64.b64encode(hashlib.md5(data).digest()).decode("utf-8")
+
+    def get_client(self, content, headers=None):
+        res_headers = {"content-length": str(len(self.data)),
+                       "content-md5": self.md5}
+        res_headers.update(headers or {})
+        return get_fake_client([(200, res_headers, content)])
+
+    def test_stream(self):
+        client = self.get_client(self.data)
+        with client.get_object_stream("/trent/stor/foo") as stream:
+            self.assertEqual(stream.read(10), self.data[:10])
+            self.assertEqual(b"".join(stream), self.data[10:])
+            self.assertEqual(stream.bytes_read, len(self.data))
+
+    def test_length_mismatch(self):
+        client = self.get_client(self.data[:-1])
+        stream = client.get_object_stream("/trent/stor/foo")
+        self.assertRaises(manta.MantaError, stream.read)
+
+    def test_md5_mismatch(self):
+        client = self.get_client(self.data[:-1] + b"x")
+        stream = client.get_object_stream("/trent/stor/foo")
+        self.assertRaises(manta.MantaError, b"".join, stream)
+
+    def test_partial(self):
+        # The content-md5 of a 206 is for the whole object.
+        client = get_fake_client([(206, {"content-length": "5",
+                                         "content-md5": self.md5},
+                                   self.data[:5])])
+        stream = client.get_object_stream("/trent/stor/foo",
+                                          headers={"Range": "bytes=0-4"})
+        self.assertEqual(stream.read(), self.data[:5])
+        self.assertEqual(client.transport.requests[0][3]["Range"],
+                         "bytes=0-4")
+
+    def test_get_object_path(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmpdir, "foo")
+            client = self.get_client(self.data)
+            res, content = client.get_object2("/trent/stor/foo", path=path)
+            self.assertEqual(content, None)
+            with open(path, "rb") as f:
+                self.assertEqual(f.read(), self.data)
+
+            # A failed download leaves no file behind.
+            os.remove(path)
+            client = self.get_client(self.data[:-1] + b"x")
+            self.assertRaises(manta.MantaError, client.get_object,
+                              "/trent/stor/foo", path=path)
+            self.assertFalse(os.path.exists(path))
+        finally:
+            shutil.rmtree(tmpdir)
+
+
+class ParallelGetTestCase(unittest.TestCase):
+    """Offline tests for `MantaClient.get(..., parallel=N)`."""
+
+    data = os.urandom(100000)
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, "foo")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_ranges(self):
+        client = manta.MantaClient("https://manta.example.com", "trent",
+                                   transport=ObjectTransport(self.data))
+        client._get_object_ranges("/trent/stor/foo", self.path, 4,
+                                  part_size=7000)
+        with open(self.path, "rb") as f:
+            self.assertEqual(f.read(), self.data)
+        gets = [r for r in client.transport.requests if r[1] == "GET"]
+        self.assertEqual(len(gets), 15)
+        self.assertTrue(all(r[3]["If-Match"] == "etag-1" for r in gets))
+
+    def test_accept(self):
+        client = manta.MantaClient("https://manta.example.com", "trent",
+                                   transport=ObjectTransport(self.data))
+        client._get_object_ranges("/trent/stor/foo", self.path, 4,
+                                  part_size=7000, accept="text/plain")
+        gets = [r for r in client.transport.requests if r[1] == "GET"]
+        self.assertTrue(all(r[3]["Accept"] == "text/plain" for r in gets))
+
+    def test_no_etag(self):
+        client = manta.MantaClient(
+            "https://manta.example.com", "trent",
+            transport=ObjectTransport(self.data, etag=None))
+        client._get_object_ranges("/trent/stor/foo", self.path, 4,
+                                  part_size=7000)
+        with open(self.path, "rb") as f:
+            self.assertEqual(f.read(), self.data)
+        self.assertEqual([r[1] for r in client.transport.requests],
+                         ["HEAD", "GET"])
+        self.assertFalse("Range" in client.transport.requests[1][3])
+
+    def test_small(self):
+        client = manta.MantaClient("https://manta.example.com", "trent",
+                                   transport=ObjectTransport(b"abc"))
+        client.get("/trent/stor/foo", self.path, parallel=4)
+        with open(self.path, "rb") as f:
+            self.assertEqual(f.read(), b"abc")
+        self.assertEqual([r[1] for r in client.transport.requests],
+                         ["HEAD", "GET"])
+
+    def test_changed_object(self):
+        transport = ObjectTransport(self.data)
+        client = manta.MantaClient("https://manta.example.com", "trent",
+                                   transport=transport)
+        orig_head_object = client.head_object
+
+        def head_object(mpath):
+            res = orig_head_object(mpath)
+            transport.etag = "etag-2"
+            return res
+        client.head_object = head_object
+        self.assertRaises(manta.MantaAPIError, client._get_object_ranges,
+                          "/trent/stor/foo", self.path, 4, part_size=7000)
+        self.assertFalse(os.path.exists(self.path))
+
+
+class ResumeGetTestCase(unittest.TestCase):
+    """Offline tests for `MantaClient.get(..., resume=True)`."""
+
+    data = os.urandom(100000)
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, "foo")
+        self.transport = ObjectTransport(self.data)
+        self.client = manta.MantaClient("https://manta.example.com",
+                                        "trent",
+                                        transport=self.transport)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def interrupted_get(self):
+        self.transport.fail_after = 30000
+        self.assertRaises(IOError, self.client.get, "/trent/stor/foo",
+                          self.path, resume=True)
+        self.assertEqual(os.path.getsize(self.path + ".part"), 30000)
+        self.assertFalse(os.path.exists(self.path))
+        self.transport.fail_after = None
+
+    def test_resume(self):
+        self.interrupted_get()
+        self.client.get("/trent/stor/foo", self.path, resume=True)
+        with open(self.path, "rb") as f:
+            self.assertEqual(f.read(), self.data)
+        self.assertEqual(os.listdir(self.tmpdir), ["foo"])
+        headers = self.transport.requests[-1][3]
+        self.assertEqual(headers["Range"], "bytes=30000-")
+        self.assertEqual(headers["If-Match"], "etag-1")
+
+    def test_accept(self):
+        self.interrupted_get()
+        self.client.get("/trent/stor/foo", self.path, accept="text/plain",
+                        resume=True)
+        self.assertEqual(self.transport.requests[-1][3]["Accept"],
+                         "text/plain")
+
+    def test_changed_object(self):
+        self.interrupted_get()
+        self.transport.data = data = os.urandom(1000)
+        self.transport.etag = "etag-2"
+        self.client.get("/trent/stor/foo", self.path, resume=True)
+        with open(self.path, "rb") as f:
+            self.assertEqual(f.read(), data)
+        self.assertEqual(os.listdir(self.tmpdir), ["foo"])
+
+
+def dirents_page(names, result_set_size):
+    content = b"".join(
+        json.dumps({"name": n, "type": "object"}).encode("utf-8") + b"\n"
+        for n in names)
+    return (200, {"result-set-size": str(result_set_size)}, content)
+
+
+class APIErrorTestCase(unittest.TestCase):
+    def test_code(self):
+        ex = manta.MantaAPIError(FakeResponse(404, {
+            "content-type": "application/json"
+        }), b'{"code": "ResourceNotFound", "message": "nope"}')
+        self.assertEqual(ex.code, "ResourceNotFound")
+        self.assertEqual(str(ex), "(ResourceNotFound) nope")
+
+    def test_no_code(self):
+        # E.g. the response to a HEAD, or from a proxy.
+        ex = manta.MantaAPIError(FakeResponse(503), b"")
+        self.assertEqual(ex.code, None)
+        ex = manta.MantaAPIError(FakeResponse(502, {
+            "content-type": "text/html"
+        }), b"<html>Bad Gateway</html>")
+        self.assertEqual(ex.code, None)
+
+
+class NDJSONTestCase(unittest.TestCase):
+    """Test the incremental NDJSON decoding of listings."""
+
+    def test_chunks(self):
+        content = (u'{"name": "caf\u00e9", "type": "object"}\n\n'
+                   u'{"name": "b", "type": "object"}').encode("utf-8")
+        # Split mid-line and mid-character.
+        chunks = [content[i:i + 5] for i in range(0, len(content), 5)]
+        objs = list(manta.client._iter_ndjson(chunks, intern=True))
+        self.assertEqual(objs, [{"name": u"caf\u00e9", "type": "object"},
+                                {"name": "b", "type": "object"}])
+        self.assertTrue(objs[0]["type"] is objs[1]["type"])
+        self.assertTrue(list(objs[0])[0] is list(objs[1])[0])
+
+    def test_invalid(self):
+        self.assertRaises(manta.MantaError, list,
+                          manta.client._iter_ndjson([b'{"a": 1}\n{"b"\n']))
+
+    def test_lines(self):
+        content = u"/trent/stor/caf\u00e9\r\n\r\n/trent/stor/b".encode("utf-8")
+        chunks = [content[i:i + 3] for i in range(0, len(content), 3)]
+        self.assertEqual(list(manta.client._iter_lines(chunks)),
+                         [u"/trent/stor/caf\u00e9", u"/trent/stor/b"])
+
+
+class IterLsTestCase(unittest.TestCase):
+    """Offline tests for `MantaClient.iter_ls`."""
+
+    def test_pages(self):
+        client = get_fake_client([
+            dirents_page(["a", "b"], 4),
+            dirents_page(["b", "c", "d"], 4),
+            dirents_page(["d"], 4),
+        ])
+        names = [d["name"] for d in client.iter_ls("/trent/stor/dir")]
+        self.assertEqual(names, ["a", "b", "c", "d"])
+        urls = [r[0] for r in client.transport.requests]
+        self.assertEqual(urls, [
+            "https://manta.example.com/trent/stor/dir",
+            "https://manta.example.com/trent/stor/dir?marker=b",
+            "https://manta.example.com/trent/stor/dir?marker=d",
+        ])
+
+    def test_one_page(self):
+        client = get_fake_client([dirents_page(["a", "b"], 2)])
+        names = [d["name"] for d in client.iter_ls("/trent/stor/dir")]
+        self.assertEqual(names, ["a", "b"])
+        self.assertEqual(len(client.transport.requests), 1)
+
+    def test_marker_removed(self):
+        # E.g. "b" deleted while listing: "c" must not be dropped.
+        client = get_fake_client([
+            dirents_page(["a", "b"], 3),
+            dirents_page(["c"], 2),
+            dirents_page(["c"], 2),
+        ])
+        names = [d["name"] for d in client.iter_ls("/trent/stor/dir")]
+        self.assertEqual(names, ["a", "b", "c"])
+
+    def test_resume(self):
+        client = get_fake_client([
+            dirents_page(["b", "c"], 3),
+            dirents_page(["c"], 3),
+        ])
+        names = [d["name"] for d in client.iter_ls("/trent/stor/dir",
+                                                   marker="b")]
+        self.assertEqual(names, ["c"])
+        self.assertTrue(client.transport.requests[0][0].endswith(
+            "?marker=b"))
+
+    def test_lazy(self):
+        client = get_fake_client([
+            dirents_page(["a", "b"], 4),
+            dirents_page(["b", "c", "d"], 4),
+        ])
+        it = client.iter_ls("/trent/stor/dir")
+        next(it)
+        self.assertEqual(len(client.transport.requests), 1)
+
+
+class ConcurrentWalkTestCase(unittest.TestCase):
+    """Offline tests for `MantaClient.walk` with `concurrency`."""
+
+    def setUp(self):
+        # A tree 3 levels deep, 4 dirs wide, with an object in each dir.
+        dirs, objects = mem_tree("/trent/stor/top", 3, 4, 1)
+        self.client = manta.MantaClient("https://manta.example.com", "trent",
+                                        transport=MemTransport(dirs, objects))
+
+    def paths(self, walk):
+        return [dirpath for dirpath, dirents, objents in walk]
+
+    def test_ordered(self):
+        expected = self.paths(self.client.walk("/trent/stor/top"))
+        self.assertEqual(len(expected), 1 + 4 + 16 + 64)
+        got = self.paths(self.client.walk("/trent/stor/top", concurrency=4))
+        self.assertEqual(got, expected)
+
+    def test_unordered(self):
+        expected = self.paths(self.client.walk("/trent/stor/top"))
+        got = self.paths(self.client.walk("/trent/stor/top", concurrency=4,
+                                          ordered=False))
+        self.assertEqual(sorted(got), sorted(expected))
+        # Parents still come before their children.
+        for path in got[1:]:
+            self.assertTrue(got.index(udirname(path)) < got.index(path))
+
+    def test_max_depth_and_prune(self):
+        for concurrency in (None, 4):
+            got = self.paths(self.client.walk(
+                "/trent/stor/top", concurrency=concurrency, max_depth=1,
+                prune=lambda dirpath, dirent: dirent["name"] == "d0"))
+            self.assertEqual(got, ["/trent/stor/top", "/trent/stor/top/d1",
+                                   "/trent/stor/top/d2", "/trent/stor/top/d3"])
+
+    def test_caller_prunes(self):
+        got = []
+        for dirpath, dirents, objents in self.client.walk("/trent/stor/top",
+                                                          concurrency=4):
+            got.append(dirpath)
+            dirents[:] = [d for d in dirents if d["name"] == "d1"]
+        self.assertEqual(got, ["/trent/stor/top", "/trent/stor/top/d1",
+                               "/trent/stor/top/d1/d1",
+                               "/trent/stor/top/d1/d1/d1"])
+
+    def test_back_pressure(self):
+        futures = []
+
+        class Executor(ThreadPoolExecutor):
+            def submit(self, *args, **kwargs):
+                future = ThreadPoolExecutor.submit(self, *args, **kwargs)
+                futures.append(future)
+                return future
+
+        saved = manta.client.ThreadPoolExecutor
+        manta.client.ThreadPoolExecutor = Executor
+        try:
+            walk = self.client.walk("/trent/stor/top", concurrency=2)
+            for i in range(3):
+                next(walk)
+        finally:
+            manta.client.ThreadPoolExecutor = saved
+        # Only the walk submits listings, so wait for those in flight.
+        wait(futures, timeout=5)
+        # Top, its 4 subdirs, then one more: 2 * concurrency listings are
+        # kept ahead of the caller.
+        self.assertEqual(len(futures), 3 + 3)
+        self.assertEqual(len(self.client.transport.requests), 6)
+        walk.close()
+
+
+class StatTestCase(unittest.TestCase):
+    """Offline tests for the HEAD-based `MantaClient.stat`."""
+
+    def test_object(self):
+        client = get_fake_client([(200, {
+            "content-type": "text/plain",
+            "content-length": "42",
+            "etag": "abc",
+            "last-modified": "Thu, 01 Jan 2015 01:02:03 GMT",
+            "durability-level": "3",
+        }, b"")])
+        self.assertEqual(client.stat("/trent/stor/foo.txt"), {
+            "name": "foo.txt",
+            "type": "object",
+            "size": 42,
+            "etag": "abc",
+            "mtime": "2015-01-01T01:02:03.000Z",
+            "durability": 3,
+            "contentType": "text/plain",
+        })
+        self.assertEqual(client.transport.requests[0][1], "HEAD")
+
+    def test_directory(self):
+        client = get_fake_client([(200, {
+            "content-type": "application/x-json-stream; type=directory",
+            "last-modified": "Thu, 01 Jan 2015 01:02:03 GMT",
+        }, b"")])
+        self.assertEqual(client.type("/trent/stor/dir"), "directory")
+
+    def test_not_found(self):
+        client = get_fake_client([(404, {"content-type": "application/json"},
+                                   b"")] * 2)
+        self.assertRaises(manta.MantaResourceNotFoundError, client.stat,
+                          "/trent/stor/nope")
+        self.assertEqual(client.type("/trent/stor/nope"), None)
+        # No fallback listing, and "not found" is cached.
+        self.assertEqual([r[1] for r in client.transport.requests], ["HEAD"])
+
+    def test_fallback(self):
+        client = get_fake_client([
+            (405, {"content-type": "application/json"}, b""),
+            dirents_page(["a", "foo"], 2),
+        ])
+        self.assertEqual(client.stat("/trent/stor/foo"),
+                         {"name": "foo", "type": "object"})
+        self.assertEqual([r[1] for r in client.transport.requests],
+                         ["HEAD", "GET"])
+
+
+class MetadataCacheTestCase(unittest.TestCase):
+    """Offline tests for `MantaClient.metadata_cache`."""
+
+    def setUp(self):
+        self.transport = MemTransport(["/trent/stor/d/sub"],
+                                      {"/trent/stor/d/a": b""})
+        self.client = manta.MantaClient("https://manta.example.com", "trent",
+                                        transport=self.transport)
+
+    def test_ls(self):
+        dirents = self.client.ls("/trent/stor/d")
+        dirents["a"]["size"] = 42  # Callers get a copy.
+        self.assertEqual(self.client.ls("/trent/stor/d")["a"],
+                         {"name": "a", "type": "object", "size": 0})
+        self.assertEqual(len(self.client.transport.requests), 1)
+        stats = self.client.metadata_cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 1))
+
+    def test_stat_from_listing(self):
+        self.client.ls("/trent/stor/d")
+        self.assertEqual(self.client.type("/trent/stor/d/sub"), "directory")
+        self.assertEqual(self.client.type("/trent/stor/d/nope"), None)
+        self.assertEqual(len(self.client.transport.requests), 1)
+
+    def test_invalidation(self):
+        self.client.ls("/trent/stor/d")
+        self.client.ls("/trent/stor/d/sub")
+        self.client.put("/trent/stor/d/c", b"foo")
+        self.client.ls("/trent/stor/d")
+        self.assertEqual(len(self.client.transport.requests), 4)
+
+        self.client.delete_directory("/trent/stor/d/sub")
+        self.client.ls("/trent/stor/d")
+        self.assertRaises(manta.MantaError, self.client.ls,
+                          "/trent/stor/d/sub")
+        self.assertEqual(len(self.client.transport.requests), 7)
+
+    def test_disabled(self):
+        client = manta.MantaClient("https://manta.example.com", "trent",
+                                   transport=self.transport,
+                                   metadata_cache=False)
+        client.ls("/trent/stor/d")
+        client.ls("/trent/stor/d")
+        self.assertEqual(len(client.transport.requests), 2)
+        self.assertEqual(client.metadata_cache, None)
+
+
+class MkdirsTestCase(unittest.TestCase):
+    """Offline tests for `mkdir(..., parents=True)` and `mkdirs`."""
+
+    def setUp(self):
+        self.client = manta.MantaClient(
+            "https://manta.example.com", "trent",
+            transport=MemTransport(["/trent/stor"]))
+
+    def puts(self):
+        return [unquote(r[0])[len("https://manta.example.com"):]
+                for r in self.client.transport.requests if r[1] == "PUT"]
+
+    def test_known_dirs(self):
+        self.client.mkdirp("/trent/stor/a/b/c")
+        n = len(self.puts())
+        self.client.mkdirp("/trent/stor/a/b/c")
+        self.client.mkdirp("/trent/stor/a/b")
+        self.assertEqual(len(self.puts()), n)
+        self.client.mkdirp("/trent/stor/a/b/c/d")
+        self.assertEqual(self.puts()[n:], ["/trent/stor/a/b/c/d"])
+
+        self.client.delete_directory("/trent/stor/a/b/c/d")
+        self.client.mkdirp("/trent/stor/a/b/c/d")
+        self.assertEqual(self.puts()[n + 1:], ["/trent/stor/a/b/c/d"])
+
+    def test_forget_missing(self):
+        client = get_fake_client([
+            (204, {}, b""),
+            (404, {"content-type": "application/json"},
+             b'{"code": "DirectoryDoesNotExist", "message": "nope"}'),
+            (204, {}, b""),
+            (204, {}, b""),
+        ])
+        client.mkdir("/trent/stor/a")
+        client.mkdirp("/trent/stor/a")
+        self.assertEqual(len(client.transport.requests), 1)
+        self.assertRaises(manta.MantaAPIError, client.put,
+                          "/trent/stor/a/obj", b"x")
+        client.mkdirp("/trent/stor/a")
+        self.assertEqual(len(client.transport.requests), 3)
+
+    def test_mkdirs(self):
+        self.client.mkdirp("/trent/stor/a")
+        self.client.mkdirs(["/trent/stor/a/b/c", "/trent/stor/a/b/d",
+                            "/trent/stor/e/"], concurrency=3)
+        self.assertEqual(self.puts()[0], "/trent/stor/a")
+        puts = self.puts()[1:]
+        self.assertEqual(sorted(puts[:2]),
+                         ["/trent/stor/a/b", "/trent/stor/e"])
+        self.assertEqual(sorted(puts[2:]), ["/trent/stor/a/b/c",
+                                            "/trent/stor/a/b/d"])
+
+
+class RmrTestCase(unittest.TestCase):
+    """Offline tests for `MantaClient.rmr`."""
+
+    def setUp(self):
+        self.retry_delay = manta.client.RETRY_DELAY
+        manta.client.RETRY_DELAY = 0
+
+    def tearDown(self):
+        manta.client.RETRY_DELAY = self.retry_delay
+
+    def rmr(self, fail=None):
+        dirs, objects = mem_tree("/trent/stor/top", 2, 3, 5)
+        client = manta.MantaClient("https://manta.example.com", "trent",
+                                   transport=MemTransport(dirs, objects, fail))
+        removed = []
+        failures = client.rmr("/trent/stor/top", concurrency=4,
+                              callback=lambda p, ex: removed.append(p))
+        return client.transport.deleted, removed, failures
+
+    def test_rmr(self):
+        deleted, removed, failures = self.rmr()
+        self.assertEqual(failures, [])
+        self.assertEqual(sorted(deleted), sorted(removed))
+        self.assertEqual(len(deleted), 1 + 13 * 5 + 3 + 9)
+        self.assertEqual(len(set(deleted)), len(deleted))
+        # Directories are deleted after everything in them.
+        for i, path in enumerate(deleted):
+            self.assertFalse([p for p in deleted[i:]
+                              if p.startswith(path + "/")])
+        self.assertEqual(deleted[-1], "/trent/stor/top")
+
+    def test_failures(self):
+        deleted, removed, failures = self.rmr({
+            "/trent/stor/top/d1/d0/obj1": [403],
+            "/trent/stor/top/d2/obj0": [503, 500],
+        })
+        self.assertEqual(
+            [(p, ex.code) for p, ex in failures],
+            [("/trent/stor/top/d1/d0/obj1", "AuthorizationFailed")])
+        self.assertEqual(len(deleted), 1 + 13 * 5 + 3 + 9 - 4)
+        for path in ["/trent/stor/top", "/trent/stor/top/d1",
+                     "/trent/stor/top/d1/d0", "/trent/stor/top/d1/d0/obj1"]:
+            self.assertFalse(path in deleted)
+        self.assertTrue("/trent/stor/top/d2/obj0" in deleted)
+        self.assertTrue("/trent/stor/top/d1/d0/obj1" in removed)
+
+
+class CopyTreeTestCase(unittest.TestCase):
+    """Offline tests for `MantaClient.cpr` and `mv`."""
+
+    def setUp(self):
+        dirs = ["/trent", "/trent/stor", "/trent/stor/a"]
+        objects = {}
+        for d in ["/trent/stor/a", "/trent/stor/a/b", "/trent/stor/a/c",
+                  "/trent/stor/a/b/d"]:
+            dirs.append(d)
+            for i in range(4):
+                objects["%s/obj%d" % (d, i)] = d.encode("utf-8")
+        self.transport = MemTransport(dirs, objects)
+        self.client = manta.MantaClient("https://manta.example.com", "trent",
+                                        transport=self.transport)
+
+    def test_cpr(self):
+        copied = []
+        failures = self.client.cpr(
+            "/trent/stor/a", "/trent/stor/x/y", concurrency=4,
+            callback=lambda a, b, ex: copied.append(b))
+        self.assertEqual(failures, [])
+        self.assertEqual(len(copied), 4 + 16)
+        for d in ["", "/b", "/c", "/b/d"]:
+            self.assertTrue("/trent/stor/x/y" + d in self.transport.dirs)
+            for i in range(4):
+                self.assertEqual(
+                    self.transport.objects["/trent/stor/x/y%s/obj%d" % (d, i)],
+                    ("/trent/stor/a" + d).encode("utf-8"))
+        self.assertEqual(len(self.transport.objects), 32)
+
+    def test_list_failure(self):
+        self.transport.fail["/trent/stor/a/b"] = [403]
+        failures = self.client.cpr("/trent/stor/a", "/trent/stor/x",
+                                   concurrency=4)
+        self.assertEqual([(a, ex.code) for a, ex in failures],
+                         [("/trent/stor/a/b", "AuthorizationFailed")])
+        # Nothing under the unlisted dir is copied.
+        self.assertEqual(
+            sorted(p for p in self.transport.objects
+                   if p.startswith("/trent/stor/x/")),
+            ["/trent/stor/x/c/obj%d" % i for i in range(4)] +
+            ["/trent/stor/x/obj%d" % i for i in range(4)])
+
+    def test_mv(self):
+        self.transport.fail["/trent/stor/x/b/obj2"] = [403]
+        failures = self.client.mv("/trent/stor/a", "/trent/stor/x",
+                                  concurrency=4)
+        self.assertEqual([(a, ex.code) for a, ex in failures],
+                         [("/trent/stor/a/b/obj2", "AuthorizationFailed")])
+        # Only the failed object, and its dirs, are left.
+        self.assertEqual(
+            sorted(p for p in self.transport.objects
+                   if p.startswith("/trent/stor/a/")),
+            ["/trent/stor/a/b/obj2"])
+        self.assertEqual(
+            sorted(p for p in self.transport.dirs
+                   if p.startswith("/trent/stor/a")),
+            ["/trent/stor/a", "/trent/stor/a/b"])
+        self.assertEqual(len(self.transport.objects), 16)
+
+        # Re-running it completes the move.
+        self.transport.fail.clear()
+        self.assertEqual(self.client.mv("/trent/stor/a", "/trent/stor/x"), [])
+        self.assertFalse("/trent/stor/a" in self.transport.dirs)
+        self.assertEqual(len(self.transport.objects), 16)
+
+
+class PutTreeTestCase(unittest.TestCase):
+    """Offline tests for `MantaClient.put_tree`."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.files = {"a.txt": b"a" * 3, "b.bin": b"b" * 1,
+                      os.path.join("sub", "c.txt"): b"c" * 4,
+                      os.path.join("sub", "deeper", "d.txt"): b"d" * 2}
+        os.makedirs(os.path.join(self.tmpdir, "sub", "deeper"))
+        os.mkdir(os.path.join(self.tmpdir, "empty"))
+        for name, data in self.files.items():
+            with open(os.path.join(self.tmpdir, name), "wb") as f:
+                f.write(data)
+        self.transport = MemTransport(["/trent", "/trent/stor"])
+        self.client = manta.MantaClient("https://manta.example.com", "trent",
+                                        transport=self.transport)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def put_tree(self, **kwargs):
+        progress = []
+        failures = self.client.put_tree(
+            self.tmpdir, "/trent/stor/x/y",
+            callback=lambda p, m, ex, stats: progress.append((m, stats)),
+            **kwargs)
+        return failures, progress
+
+    def test_put_tree(self):
+        failures, progress = self.put_tree(concurrency=4)
+        self.assertEqual(failures, [])
+        for name, data in self.files.items():
+            mpath = "/trent/stor/x/y/" + name.replace(os.sep, "/")
+            self.assertEqual(self.transport.objects[mpath], data)
+        for mdir in ["/trent/stor/x/y/empty", "/trent/stor/x/y/sub/deeper"]:
+            self.assertTrue(mdir in self.transport.dirs)
+        stats = max((s for m, s in progress), key=itemgetter("files_done"))
+        self.assertEqual((stats["files_done"], stats["files_total"]), (4, 4))
+        self.assertEqual((stats["bytes_done"], stats["bytes_total"]), (10, 10))
+
+    def test_order(self):
+        failures, progress = self.put_tree(concurrency=1)
+        self.assertEqual([ubasename(m) for m, s in progress],
+                         ["c.txt", "a.txt", "d.txt", "b.bin"])
+        failures, progress = self.put_tree(concurrency=1, order="interleave")
+        self.assertEqual([ubasename(m) for m, s in progress],
+                         ["c.txt", "b.bin", "a.txt", "d.txt"])
+
+    def test_max_bytes_in_flight(self):
+        in_flight = [0, 0]  # current and max total size of the uploads
+        lock = threading.Lock()
+        put_object = self.client.put_object
+
+        def slow_put_object(mpath, path=None, **kwargs):
+            size = os.path.getsize(path)
+            with lock:
+                in_flight[0] += size
+                in_flight[1] = max(in_flight)
+            time.sleep(0.05)
+            try:
+                return put_object(mpath, path=path, **kwargs)
+            finally:
+                with lock:
+                    in_flight[0] -= size
+        self.client.put_object = slow_put_object
+
+        failures, progress = self.put_tree(concurrency=4,
+                                           max_bytes_in_flight=4)
+        self.assertEqual(failures, [])
+        self.assertEqual(in_flight[1], 4)
+
+    def test_failure(self):
+        self.transport.fail["/trent/stor/x/y/a.txt"] = [403]
+        failures, progress = self.put_tree()
+        self.assertEqual([(ubasename(p), ex.code) for p, ex in failures],
+                         [("a.txt", "AuthorizationFailed")])
+        self.assertEqual(len(self.transport.objects), 3)
+
+
+class GetTreeTestCase(unittest.TestCase):
+    """Offline tests for `MantaClient.get_tree`."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        objects = {}
+        for d in ["/trent/stor/a", "/trent/stor/a/b", "/trent/stor/a/b/c"]:
+            for i in range(3):
+                objects["%s/obj%d" % (d, i)] = b"x" * (i + 1)
+        self.transport = MemTransport(
+            ["/trent", "/trent/stor", "/trent/stor/a", "/trent/stor/a/b",
+             "/trent/stor/a/b/c", "/trent/stor/a/empty"], objects)
+        self.client = manta.MantaClient("https://manta.example.com", "trent",
+                                        transport=self.transport)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_get_tree(self):
+        progress = []
+        dst = os.path.join(self.tmpdir, "dst")
+        failures = self.client.get_tree(
+            "/trent/stor/a", dst, concurrency=4, max_bytes_in_flight=4,
+            callback=lambda m, p, ex, stats: progress.append(stats))
+        self.assertEqual(failures, [])
+        for d in ["", "b", os.path.join("b", "c")]:
+            for i in range(3):
+                with open(os.path.join(dst, d, "obj%d" % i), "rb") as f:
+                    self.assertEqual(f.read(), b"x" * (i + 1))
+        self.assertTrue(os.path.isdir(os.path.join(dst, "empty")))
+        stats = max(progress, key=itemgetter("files_done"))
+        self.assertEqual((stats["files_done"], stats["bytes_done"]), (9, 18))
+
+    def test_list_failure(self):
+        self.retry_delay = manta.client.RETRY_DELAY
+        manta.client.RETRY_DELAY = 0
+        try:
+            # A transient failure is retried.
+            self.transport.fail["/trent/stor/a/b"] = [503]
+            dst = os.path.join(self.tmpdir, "dst")
+            self.assertEqual(self.client.get_tree("/trent/stor/a", dst,
+                                                  concurrency=2), [])
+            self.assertTrue(os.path.exists(
+                os.path.join(dst, "b", "c", "obj0")))
+
+            self.transport.fail["/trent/stor/a/b"] = [503, 403]
+            errs = []
+            dst = os.path.join(self.tmpdir, "dst2")
+            failures = self.client.get_tree(
+                "/trent/stor/a", dst, concurrency=2, retries=1,
+                callback=lambda m, p, ex, stats: ex and errs.append(m))
+        finally:
+            manta.client.RETRY_DELAY = self.retry_delay
+        self.assertEqual([(m, ex.code) for m, ex in failures],
+                         [("/trent/stor/a/b", "AuthorizationFailed")])
+        self.assertEqual(errs, ["/trent/stor/a/b"])
+        self.assertTrue(os.path.exists(os.path.join(dst, "obj0")))
+        self.assertFalse(os.path.exists(os.path.join(dst, "b")))
+
+    def test_failure(self):
+        self.transport.fail["/trent/stor/a/b/obj1"] = [403]
+        failures = self.client.get_tree("/trent/stor/a", self.tmpdir)
+        self.assertEqual([(m, ex.code) for m, ex in failures],
+                         [("/trent/stor/a/b/obj1", "AuthorizationFailed")])
+        self.assertFalse(os.path.exists(
+            os.path.join(self.tmpdir, "b", "obj1")))
+        self.assertTrue(os.path.exists(
+            os.path.join(self.tmpdir, "b", "obj2")))
+
+    def test_byte_budget(self):
+        budget = manta.client._ByteBudget(10)
+        budget.acquire(8)
+        got = []
+        t = threading.Thread(target=lambda: got.append(budget.acquire(5)))
+        t.start()
+        time.sleep(0.05)
+        self.assertEqual(got, [])
+        budget.release(8)
+        t.join(5)
+        self.assertEqual(got, [None])
+        # More than the whole budget is allowed on its own.
+        budget.release(5)
+        budget.acquire(20)
+
+
+class JobInputsTestCase(unittest.TestCase):
+    """Offline tests for `MantaClient.add_job_inputs_from`."""
+
+    def setUp(self):
+        self.retry_delay = manta.client.RETRY_DELAY
+        manta.client.RETRY_DELAY = 0
+
+    def tearDown(self):
+        manta.client.RETRY_DELAY = self.retry_delay
+
+    def test_batches(self):
+        client = get_fake_client([(204, {}, b"")] * 3 + [(202, {}, b"")])
+
+        def gen_keys():
+            for i in range(2500):
+                if i == 1500:
+                    # The first batch is sent while keys are produced.
+                    for _ in range(100):
+                        if client.transport.requests:
+                            break
+                        time.sleep(0.01)
+                    self.assertEqual(len(client.transport.requests), 1)
+                yield "/trent/stor/obj%d" % i
+
+        self.assertEqual(client.add_job_inputs_from("job1", gen_keys(),
+                                                    end=True), 2500)
+        requests = client.transport.requests
+        self.assertEqual([r[0].rsplit("/", 2)[-2:] for r in requests],
+                         [["live", "in"]] * 3 + [["in", "end"]])
+        keys = "".join(r[2] for r in requests[:3]).split("\r\n")
+        self.assertEqual(keys[:-1],
+                         ["/trent/stor/obj%d" % i for i in range(2500)])
+        self.assertEqual([r[2].count("\r\n") for r in requests[:3]],
+                         [1000, 1000, 500])
+
+    def test_retry(self):
+        client = get_fake_client([
+            (503, {"content-type": "application/json"},
+             b'{"code": "ServiceUnavailable", "message": "busy"}'),
+            (204, {}, b""),
+            (403, {"content-type": "application/json"},
+             b'{"code": "NotAllowed", "message": "nope"}'),
+        ])
+        keys = ["/trent/stor/obj%d" % i for i in range(30)]
+        self.assertRaises(manta.MantaAPIError, client.add_job_inputs_from,
+                          "job1", keys, batch_size=10)
+        # The first batch was retried, and the third not sent.
+        self.assertEqual(len(client.transport.requests), 3)
+
+
+class WaitForJobsTestCase(unittest.TestCase):
+    """Offline tests for `MantaClient.wait_for_job(s)`."""
+
+    def setUp(self):
+        self.saved = (manta.client.JOB_POLL_MIN, manta.client.JOB_POLL_MAX,
+                      manta.client.RETRY_DELAY)
+        manta.client.JOB_POLL_MIN = 0.01
+        manta.client.JOB_POLL_MAX = 0.05
+        manta.client.RETRY_DELAY = 0
+
+    def tearDown(self):
+        (manta.client.JOB_POLL_MIN, manta.client.JOB_POLL_MAX,
+         manta.client.RETRY_DELAY) = self.saved
+
+    def get_client(self, done_after, fail=None):
+        now = time.time()
+        done_at = dict((j, now + t) for j, t in done_after.items())
+        return manta.MantaClient("https://manta.example.com", "trent",
+                                 transport=JobsTransport(done_at, fail))
+
+    def test_wait_for_job(self):
+        client = self.get_client({"a": 0.1}, fail={
+            "a": [(503, "ServiceUnavailable")]})
+        start = time.time()
+        self.assertEqual(client.wait_for_job("a"),
+                         {"id": "a", "state": "done"})
+        # Done promptly, without polling every JOB_POLL_MIN.
+        self.assertTrue(time.time() - start < 0.1 + 0.06)
+        self.assertTrue(len(client.transport.requests) < 10)
+
+    def test_wait_for_jobs(self):
+        client = self.get_client({"a": 0.3, "b": 0, "c": 0.1, "d": 0.3})
+        got = [job["id"] for job in client.wait_for_jobs("abcd")]
+        self.assertEqual(got[:2], ["b", "c"])
+        self.assertEqual(sorted(got[2:]), ["a", "d"])
+        # Jobs listed as running aren't checked one by one.
+        self.assertTrue([r for r in client.transport.requests
+                         if "state=running" in r[0]])
+        gets = [r for r in client.transport.requests
+                if r[0].endswith("/live/status")]
+        self.assertEqual(len(gets), 4)
+
+    def test_wait_for_queued_job(self):
+        jobs = ["r%d" % i for i in range(20)] + ["q"]
+        client = self.get_client(dict((j, 0.4) for j in jobs))
+        client.transport.queued = set(["q"])
+        self.assertEqual(sorted(j["id"] for j in client.wait_for_jobs(jobs)),
+                         sorted(jobs))
+        # A job that isn't listed as running is still only checked when
+        # it is due (at most 15 times in 0.4s), not whenever one of
+        # the running jobs is.
+        gets = [r for r in client.transport.requests
+                if r[0].endswith("/q/live/status")]
+        self.assertTrue(len(gets) <= 15, len(gets))
+
+    def test_timeout(self):
+        client = self.get_client({"a": 60})
+        self.assertRaises(manta.MantaError, client.wait_for_job, "a",
+                          timeout=0.1)
+
+    def test_tail_job_output(self):
+        now = time.time()
+        outputs = [(now + t, "/trent/stor/out%d" % i)
+                   for i, t in enumerate([0, 0, 0.05, 0.1, 0.2])]
+        client = manta.MantaClient(
+            "https://manta.example.com", "trent",
+            transport=JobsTransport({"a": now + 0.2}, outputs={"a": outputs}))
+        got = []
+        for key, content in client.tail_job_output("a", concurrency=2):
+            got.append((key, content, time.time() < now + 0.2))
+        self.assertEqual([g[:2] for g in got],
+                         [(k, k.encode("utf-8")) for _, k in outputs])
+        # The first outputs were generated while the job was running.
+        self.assertTrue(got[0][2])
+
+    def test_tail_job_output_repeated_key(self):
+        # New outputs are found by their position in the output list, so an
+        # output key listed again later is generated again.
+        now = time.time()
+        outputs = [(now + t, "/trent/stor/out%d" % i)
+                   for i, t in [(0, 0), (1, 0.05), (0, 0.1)]]
+        client = manta.MantaClient(
+            "https://manta.example.com", "trent",
+            transport=JobsTransport({"a": now + 0.15}, outputs={"a": outputs}))
+        self.assertEqual(
+            [key for key, _ in client.tail_job_output("a", fetch=False)],
+            [k for _, k in outputs])
+
+    def test_tail_job_output_timeout(self):
+        client = self.get_client({"a": 60})
+        client.transport.outputs = {"a": []}
+        tail = client.tail_job_output("a", fetch=False, timeout=0.1)
+        self.assertRaises(manta.MantaError, list, tail)
+
+
+class JobManagerTestCase(unittest.TestCase):
+    """Offline tests for `manta.JobManager`."""
+
+    def setUp(self):
+        self.saved = (manta.client.JOB_POLL_MIN, manta.client.JOB_POLL_MAX)
+        manta.client.JOB_POLL_MIN = 0.01
+        manta.client.JOB_POLL_MAX = 0.05
+
+    def tearDown(self):
+        manta.client.JOB_POLL_MIN, manta.client.JOB_POLL_MAX = self.saved
+
+    def get_client(self, durations):
+        return manta.MantaClient(
+            "https://manta.example.com", "trent",
+            transport=JobsTransport({}, durations=durations))
+
+    def specs(self, n):
+        for i in range(n):
+            yield {"phases": [{"exec": "wc"}], "name": "j%d" % i,
+                   "inputs": ["/trent/stor/in%d" % i]}
+
+    def test_run(self):
+        client = self.get_client([0.5, 0.05, 0.05, 0])
+        manager = manta.JobManager(client, max_jobs=2)
+        results = list(manager.run(self.specs(4)))
+        self.assertEqual([r["name"] for r in results],
+                         ["j1", "j2", "j3", "j0"])
+        self.assertEqual(results[0]["job"], {"id": "job1", "state": "done"})
+        self.assertEqual(results[0]["outputs"], [])
+        self.assertEqual(results[0]["errors"], [])
+        self.assertEqual(manager.running, {})
+        self.assertEqual(client.transport.cancelled, [])
+        # Inputs were added and ended.
+        posts = [r[0].split("/jobs/")[-1] for r in client.transport.requests
+                 if r[1] == "POST" and "/live/in" in r[0]]
+        self.assertEqual(posts[:2], ["job0/live/in", "job0/live/in/end"])
+
+    def test_one_waiter(self):
+        waiters = []
+
+        class Waiter(manta.client._JobWaiter):
+            def __init__(self, *args, **kwargs):
+                manta.client._JobWaiter.__init__(self, *args, **kwargs)
+                waiters.append(self)
+
+        client = self.get_client([0.3, 0.05, 0.05, 0])
+        manager = manta.JobManager(client, max_jobs=2, gather=False)
+        saved = manta.jobs._JobWaiter
+        manta.jobs._JobWaiter = Waiter
+        try:
+            results = manager.run(self.specs(4))
+            self.assertEqual(next(results)["name"], "j1")
+            interval = waiters[0].pending["job0"][1]
+            self.assertTrue(interval > manta.client.JOB_POLL_MIN)
+            # Starting the next job doesn't reset the running one's backoff.
+            self.assertEqual(next(results)["name"], "j2")
+            self.assertTrue(waiters[0].pending["job0"][1] >= interval)
+            self.assertEqual([r["name"] for r in results], ["j3", "j0"])
+        finally:
+            manta.jobs._JobWaiter = saved
+        self.assertEqual(len(waiters), 1)
+
+    def test_reentry(self):
+        client = self.get_client([0, 0, 0])
+        manager = manta.JobManager(client, max_jobs=1, gather=False)
+        results = manager.run(self.specs(2))
+        self.assertEqual(next(results)["name"], "j0")
+        self.assertRaises(manta.MantaError, list, manager.run(self.specs(1)))
+        self.assertEqual([r["name"] for r in results], ["j1"])
+        # Once done, the manager can run more jobs.
+        self.assertEqual([r["id"] for r in manager.run(self.specs(1))],
+                         ["job2"])
+
+    def test_interrupted(self):
+        client = self.get_client([60, 60, 60])
+        manager = manta.JobManager(client, max_jobs=2, gather=False)
+
+        def interrupt(*args, **kwargs):
+            raise KeyboardInterrupt()
+
+        # ^C while polling the jobs.
+        client.list_jobs = interrupt
+        self.assertRaises(KeyboardInterrupt, list,
+                          manager.run(self.specs(3)))
+        self.assertEqual(sorted(client.transport.cancelled),
+                         ["job0", "job1"])
+        self.assertEqual(manager.running, {})
+
+
+class JobListsTestCase(unittest.TestCase):
+    """Offline tests for streaming a job's inputs, outputs and errors."""
+
+    def test_live(self):
+        client = get_fake_client([(200, {}, b"/trent/stor/a\r\n"
+                                   b"/trent/stor/b\r\n")])
+        self.assertEqual(list(client.iter_job_input("job1")),
+                         ["/trent/stor/a", "/trent/stor/b"])
+        self.assertTrue(
+            client.transport.requests[0][0].endswith("/jobs/job1/live/in"))
+
+    def test_archived(self):
+        client = get_fake_client([(404, {}, b""),
+                                  (200, {}, b"/trent/stor/a\n")])
+        self.assertEqual(client.get_job_output("job1"), ["/trent/stor/a"])
+        self.assertTrue(
+            client.transport.requests[1][0].endswith("/jobs/job1/out.txt"))
+
+    def test_errors(self):
+        content = b"".join(json.dumps({"code": c}).encode("utf-8") + b"\n"
+                           for c in ["TaskError", "UserTaskError"])
+        client = get_fake_client([(200, {}, content), (404, {}, b""),
+                                  (200, {}, content)])
+        errs = [{"code": "TaskError"}, {"code": "UserTaskError"}]
+        self.assertEqual(list(client.iter_job_errors("job1")), errs)
+        self.assertEqual(client.get_job_errors("job1"), errs)
+        self.assertTrue(
+            client.transport.requests[2][0].endswith("/jobs/job1/err.txt"))
+
+
 class CleanTestAreaTestCase(MantaTestCase):
     def test_clean(self):
         client = self.get_client()
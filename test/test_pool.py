@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+# Copyright (c) 2019 Joyent, Inc.  All rights reserved.
+
+"""Test the python-manta connection pool."""
+
+from __future__ import absolute_import
+
+import threading
+import time
+import unittest
+
+from manta.errors import MantaError
+from manta.pool import ConnectionPool
+
+
+#---- internal support stuff
+
+class FakeConn(object):
+    def __init__(self, n):
+        self.n = n
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class Factory(object):
+    def __init__(self):
+        self.made = []
+
+    def __call__(self):
+        conn = FakeConn(len(self.made))
+        self.made.append(conn)
+        return conn
+
+
+#---- Test cases
+
+class ConnectionPoolTestCase(unittest.TestCase):
+    def test_reuse(self):
+        factory = Factory()
+        pool = ConnectionPool(factory, maxsize=2)
+        conn = pool.get()
+        pool.put(conn)
+        self.assertTrue(pool.get() is conn)
+        self.assertEqual(len(factory.made), 1)
+
+    def test_discard(self):
+        factory = Factory()
+        pool = ConnectionPool(factory, maxsize=2)
+        try:
+            with pool.connection() as conn:
+                raise ValueError("boom")
+        except ValueError:
+            pass
+        self.assertTrue(conn.closed)
+        self.assertTrue(pool.get() is not conn)
+
+    def test_bounded(self):
+        pool = ConnectionPool(Factory(), maxsize=2)
+        a = pool.get()
+        b = pool.get()
+        self.assertRaises(MantaError, pool.get, timeout=0.05)
+
+        # A waiting `get()` gets the connection when one is returned.
+        got = []
+        t = threading.Thread(target=lambda: got.append(pool.get()))
+        t.start()
+        pool.put(a)
+        t.join(5)
+        self.assertEqual(got, [a])
+
+    def test_idle_eviction(self):
+        factory = Factory()
+        pool = ConnectionPool(factory, max_idle=0.05)
+        conn = pool.get()
+        pool.put(conn)
+        time.sleep(0.2)
+        self.assertTrue(pool.get() is not conn)
+        self.assertTrue(conn.closed)
+
+    def test_health_check(self):
+        factory = Factory()
+        pool = ConnectionPool(factory, check=lambda c: c.n != 0)
+        conn = pool.get()
+        pool.put(conn)
+        self.assertEqual(pool.get().n, 1)
+        self.assertTrue(conn.closed)
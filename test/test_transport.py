@@ -0,0 +1,191 @@
+#!/usr/bin/env python
+# Copyright (c) 2019 Joyent, Inc.  All rights reserved.
+
+"""Test the python-manta HTTP transports against a local HTTP server."""
+
+from __future__ import absolute_import
+
+import io
+import threading
+import unittest
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+
+import manta
+from manta.transport import HTTPTransport
+
+
+#---- internal support stuff
+
+class EchoHandler(BaseHTTPRequestHandler):
+    """Respond with the request body (de-chunked), plus the request's
+    transfer-encoding in a header.
+    """
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_PUT(self):
+        te = self.headers.get("Transfer-Encoding", "")
+        if te == "chunked":
+            body = b""
+            while True:
+                size = int(self.rfile.readline().strip(), 16)
+                if size == 0:
+                    self.rfile.readline()
+                    break
+                body += self.rfile.read(size)
+                self.rfile.readline()
+        else:
+            body = self.rfile.read(int(self.headers["Content-Length"]))
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("X-Transfer-Encoding", te or "none")
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class StreamingHandler(BaseHTTPRequestHandler):
+    """Accept a chunked PUT, setting the server's `got_data` event once
+    the first chunk has arrived (i.e. before the rest is sent). Respond to
+    a GET with a chunked list of two keys, sending the second only once
+    the server's `got_key` event is set (or after 5s, noting in
+    `buffered` that the client didn't get the first before the end).
+    """
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_PUT(self):
+        length = 0
+        while True:
+            size = int(self.rfile.readline().strip(), 16)
+            if size == 0:
+                self.rfile.readline()
+                break
+            length += len(self.rfile.read(size))
+            self.rfile.readline()
+            self.server.got_data.set()
+        self.send_response(204)
+        self.send_header("X-Received-Length", str(length))
+        self.end_headers()
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for key in [b"/trent/stor/a\n", b"/trent/stor/b\n"]:
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(key), key))
+            self.wfile.flush()
+            if key.endswith(b"a\n"):
+                self.server.buffered = not self.server.got_key.wait(5)
+        self.wfile.write(b"0\r\n\r\n")
+
+
+class BlockingReader(object):
+    """A non-seekable file whose second read waits for the server to have
+    received the first: it can only be sent if it is streamed.
+    """
+
+    def __init__(self, got_data):
+        self.got_data = got_data
+        self.num_reads = 0
+
+    def read(self, size=-1):
+        self.num_reads += 1
+        if self.num_reads == 2 and not self.got_data.wait(5):
+            raise IOError("the upload was buffered")
+        return b"x" * 1000 if self.num_reads <= 3 else b""
+
+
+#---- Test cases
+
+class HTTPTransportTestCase(unittest.TestCase):
+    def setUp(self):
+        self.server = HTTPServer(("127.0.0.1", 0), EchoHandler)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        self.url = "http://127.0.0.1:%d/obj" % self.server.server_address[1]
+        self.transport = HTTPTransport()
+
+    def tearDown(self):
+        self.transport.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_bytes(self):
+        res, content = self.transport.request(self.url, "PUT", b"abc")
+        self.assertEqual(res.status, 200)
+        self.assertEqual(res["status"], "200")
+        self.assertEqual(res["x-transfer-encoding"], "none")
+        self.assertEqual(content, b"abc")
+
+    def test_chunked_file_body(self):
+        body = io.BytesIO(b"x" * 100000)
+        res, content = self.transport.request(self.url, "PUT", body)
+        self.assertEqual(res["x-transfer-encoding"], "chunked")
+        self.assertEqual(content, b"x" * 100000)
+
+    def test_stream(self):
+        res, body = self.transport.stream(self.url, "PUT", [b"ab", b"cd"],
+                                          {"Content-Length": "4"})
+        self.assertEqual(res["x-transfer-encoding"], "none")
+        self.assertEqual(b"".join(body), b"abcd")
+
+        # The connection was released for reuse.
+        res, content = self.transport.request(self.url, "PUT", b"e")
+        self.assertEqual(content, b"e")
+
+
+class DefaultTransportTestCase(unittest.TestCase):
+    def setUp(self):
+        self.server = HTTPServer(("127.0.0.1", 0), StreamingHandler)
+        self.server.got_data = threading.Event()
+        self.server.got_key = threading.Event()
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        self.client = manta.MantaClient(
+            "http://127.0.0.1:%d" % self.server.server_address[1], "trent")
+
+    def tearDown(self):
+        self.client.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_upload_is_streamed(self):
+        self.assertTrue(isinstance(self.client.transport, HTTPTransport))
+        self.client.put_object("/trent/stor/obj",
+                               file=BlockingReader(self.server.got_data))
+        self.assertTrue(self.server.got_data.is_set())
+
+    def test_job_list_is_streamed(self):
+        keys = []
+        for key in self.client.iter_job_output("job1"):
+            keys.append(key)
+            self.server.got_key.set()
+        self.assertEqual(keys, ["/trent/stor/a", "/trent/stor/b"])
+        self.assertFalse(self.server.buffered)
+
+    def test_unstarted_list_releases_connection(self):
+        self.server.got_key.set()
+        url = "http://127.0.0.1:%d" % self.server.server_address[1]
+        client = manta.MantaClient(url, "trent", pool_size=1)
+        pool = client.transport._pools.pool_for_url(url)
+        try:
+            client.iter_job_output("job1").close()
+            self.assertEqual(pool._num_out, 0)
+            res, dirents = client._list_directory_stream("/trent/stor")
+            del dirents
+            self.assertEqual(pool._num_out, 0)
+            self.assertEqual(list(client.iter_job_output("job1")),
+                             ["/trent/stor/a", "/trent/stor/b"])
+            self.assertEqual(pool._num_out, 0)
+        finally:
+            client.close()